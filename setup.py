@@ -26,6 +26,11 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/yourusername/woof",
     packages=find_packages(),
+    py_modules=[
+        "woof_format", "woof_codec", "woof_png", "woof_raw", "woof_extract",
+        "woof_catalog", "woof_batch", "woof_cache", "woof_async", "woof_metrics",
+        "woof_detect", "woof_cli", "woof_gui",
+    ],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -44,9 +49,13 @@ setup(
     ],
     python_requires=">=3.6",
     install_requires=read_requirements(),
+    extras_require={
+        "onnx": ["onnxruntime"],
+        "opencv": ["opencv-python-headless"],
+    },
     entry_points={
         "console_scripts": [
-            "woof=woof_format:main",
+            "woof=woof_cli:main",
             "woof-gui=woof_gui:main",
         ],
     },
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+WOOF Asyncio API
+Non-blocking WOOF conversion and extraction for asyncio-based services
+"""
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from woof_format import WOOFFormat
+
+
+class WOOFBusyError(RuntimeError):
+    """Raised when a request is rejected because too many are already waiting"""
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+def _write_file(path: str, data: bytes):
+    with open(path, 'wb') as fh:
+        fh.write(data)
+
+
+class AsyncWOOF:
+    """Asyncio front end for WOOFFormat
+
+    File reads and writes run on the event loop's default executor, while
+    decoding, analysis and embedding run on a bounded worker pool, so the
+    event loop is never blocked. Backpressure is applied in two steps: at
+    most max_concurrency jobs use the pool at once, and when max_waiting is
+    set, requests beyond that many queued callers fail fast with
+    WOOFBusyError instead of piling up.
+    """
+
+    def __init__(self, woof: Optional[WOOFFormat] = None, max_workers: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, max_waiting: Optional[int] = None):
+        self.woof = woof or WOOFFormat()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='woof')
+        self.max_concurrency = max_concurrency or self.max_workers
+        self._slots = None  # Created on first use, inside the running loop
+        self._waiting = 0
+
+    async def extract(self, input_path: str) -> Optional[Dict[str, Any]]:
+        """Extract metadata from a WOOF file, or None if it has none"""
+        if self.woof.metadata_cache is not None:
+            # The cache validates against the file itself, so let it do the I/O
+            return await self._run(self.woof._extract_cached, input_path)
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, _read_file, input_path)
+        return await self._run(self.woof.extract_bytes, data)
+
+    async def convert(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        """Convert an image file to WOOF and return the embedded metadata
+
+        Unlike WOOFFormat.convert_to_woof, errors are raised to the caller.
+        """
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, _read_file, input_path)
+        woof_bytes, metadata = await self._run(self.woof.convert_bytes, data)
+        await loop.run_in_executor(None, _write_file, output_path, woof_bytes)
+        return metadata
+
+    async def close(self):
+        """Wait for running jobs and shut the worker pool down"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self, func, *args):
+        """Run func on the worker pool once a concurrency slot is free"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self.max_waiting is not None and self._slots.locked() and self._waiting >= self.max_waiting:
+            raise WOOFBusyError(f"{self._waiting} WOOF requests already waiting")
+
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
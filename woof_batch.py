@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+WOOF Batch Conversion
+Convert many images to WOOF format over a pool of worker processes
+"""
+
+import io
+import os
+import glob
+import json
+import time
+from contextlib import redirect_stdout
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+from woof_format import WOOFFormat, ImageContext
+from woof_raw import RawImage
+
+# Per-process converter, created once by the pool initializer
+_worker_woof = None
+
+
+def _worker_init(woof_options: Optional[Dict[str, Any]] = None):
+    """Create the converter once per worker process"""
+    global _worker_woof
+    _worker_woof = WOOFFormat(**(woof_options or {}))
+
+
+def _convert_job(job: Tuple[str, str], image=None, detections=None) -> Dict[str, Any]:
+    """Convert a single (input, output) pair, capturing its console output
+
+    image and detections are passed on to convert_to_woof. With a
+    conversion cache, the result also says whether the input was a
+    duplicate and how many seconds that saved.
+    """
+    if _worker_woof is None:
+        _worker_init()
+
+    input_path, output_path = job
+    cache = _worker_woof.conversion_cache
+    if cache is not None:
+        hits, seconds_saved = cache.hits, cache.seconds_saved
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with redirect_stdout(log):
+            success = _worker_woof.convert_to_woof(input_path, output_path, image, detections)
+        error = None if success else log.getvalue().strip()
+    except Exception as e:
+        success, error = False, str(e)
+    result = _job_result(job, success, error, time.perf_counter() - start)
+    if cache is not None:
+        result["dedup_hit"] = cache.hits > hits
+        result["seconds_saved"] = cache.seconds_saved - seconds_saved
+    return result
+
+
+def _job_result(job: Tuple[str, str], success: bool, error: Optional[str], seconds: float) -> Dict[str, Any]:
+    """Result record of one job"""
+    input_path, output_path = job
+    return {
+        "input": input_path,
+        "output": output_path,
+        "success": success,
+        "error": error,
+        "seconds": seconds,
+        "input_bytes": os.path.getsize(input_path) if os.path.exists(input_path) else 0,
+        "worker": os.getpid(),
+    }
+
+
+def _convert_chunk(jobs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Convert several jobs in one worker call, running the detector on
+    all of them as one inference batch
+
+    Each input is decoded once to compute its pixel statistics and small
+    detector input, then dropped, and decoded again for its conversion,
+    so a worker holds one decoded image at a time whatever the batch size.
+    Memory-mapped inputs are kept, as they cost no memory. Without a
+    detector the jobs are converted one by one.
+    """
+    if _worker_woof is None:
+        _worker_init()
+    if _worker_woof.detector is None or len(jobs) == 1:
+        return [_convert_job(job) for job in jobs]
+
+    results = [None] * len(jobs)
+    opened = []
+    prepared = []
+    for index, (input_path, _) in enumerate(jobs):
+        start = time.perf_counter()
+        try:
+            context = ImageContext(_worker_woof.decode_image(_worker_woof.open_image(input_path)))
+            prepared.append(_worker_woof.prepare_detection(context, release=True))
+            context.release(image=not isinstance(context.image, RawImage))
+            opened.append((index, context, time.perf_counter() - start))
+        except Exception as e:
+            results[index] = _job_result(jobs[index], False, str(e), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        detections = _worker_woof.run_detection(prepared)
+    except Exception as e:
+        for index, _, seconds in opened:
+            results[index] = _job_result(jobs[index], False, f"Detection failed: {e}", seconds)
+        return results
+    share = (time.perf_counter() - start) / max(len(opened), 1)
+
+    for (index, context, seconds), found in zip(opened, detections):
+        start = time.perf_counter()
+        try:
+            if context.image is None:
+                context.image = _worker_woof.decode_image(_worker_woof.open_image(jobs[index][0]))
+        except Exception as e:
+            results[index] = _job_result(jobs[index], False, str(e),
+                                         seconds + share + time.perf_counter() - start)
+            continue
+        seconds += share + time.perf_counter() - start
+        result = _convert_job(jobs[index], context, found)
+        result["seconds"] += seconds
+        results[index] = result
+    return results
+
+
+def _failed_chunk(jobs: List[Tuple[str, str]], error: str) -> List[Dict[str, Any]]:
+    """Failure results for every job of a chunk whose worker was lost"""
+    return [_job_result(job, False, error, 0.0) for job in jobs]
+
+
+def _glob_base(pattern: str) -> str:
+    """The directory part of a glob pattern before its first wildcard"""
+    parts = []
+    for part in pattern.replace(os.sep, '/').split('/')[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return '/'.join(parts) or ('/' if pattern.startswith('/') else '.')
+
+
+def _unique_names(pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Rename relative names whose outputs would collide
+
+    Inputs that differ only in their extension (a.png, a.jpg) keep it in
+    the output name (a.png.woof, a.jpg.woof); any names still taken get a
+    numeric suffix (a-2.png.woof).
+    """
+    def output_key(relative):
+        return os.path.normcase(os.path.splitext(relative)[0]).lower()
+
+    counts = {}
+    for _, relative in pairs:
+        counts[output_key(relative)] = counts.get(output_key(relative), 0) + 1
+
+    taken = set()
+    unique = []
+    for path, relative in pairs:
+        if counts[output_key(relative)] > 1:
+            relative += '.woof'
+        stem, ext = os.path.splitext(relative)
+        name, number = relative, 1
+        while output_key(name) in taken:
+            number += 1
+            name = f"{os.path.splitext(stem)[0]}-{number}{os.path.splitext(stem)[1]}{ext}"
+        taken.add(output_key(name))
+        unique.append((path, name))
+    return unique
+
+
+def collect_inputs(sources: Iterable[str], manifest: Optional[str] = None,
+                   extensions: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """Resolve directories, glob patterns and a manifest file into
+    (input_path, relative_output_name) pairs, without duplicates
+
+    Directory inputs keep their path below the directory, glob matches
+    their path below the pattern's first wildcard, and files their base
+    name. Names that would map to the same output are made unique (see
+    _unique_names).
+    """
+    extensions = [ext.lower() for ext in (extensions or WOOFFormat().supported_formats)]
+    sources = list(sources)
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as fh:
+            sources.extend(line.strip() for line in fh
+                           if line.strip() and not line.lstrip().startswith('#'))
+
+    def is_image(path):
+        return os.path.splitext(path)[1].lower() in extensions
+
+    pairs = []
+    seen = set()
+
+    def add(path, relative):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            pairs.append((path, relative))
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if is_image(path):
+                        add(path, os.path.relpath(path, source))
+        elif glob.has_magic(source):
+            base = _glob_base(source)
+            for path in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(path) and is_image(path):
+                    add(path, os.path.relpath(path, base))
+        else:
+            add(source, os.path.basename(source))
+
+    return _unique_names(pairs)
+
+
+class BatchConverter:
+    """Fan convert_to_woof out over a process pool with resumable checkpoints"""
+
+    def __init__(self, output_dir: str, workers: Optional[int] = None,
+                 checkpoint_path: Optional[str] = None, quiet: bool = False,
+                 woof_options: Optional[Dict[str, Any]] = None):
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_path = checkpoint_path
+        self.quiet = quiet
+        self.woof_options = woof_options or {}
+
+    def output_path_for(self, relative: str) -> str:
+        """Map a relative input name to its .woof path under output_dir
+
+        Names that already end in .woof (see collect_inputs) are kept.
+        """
+        if os.path.splitext(relative)[1].lower() != '.woof':
+            relative = os.path.splitext(relative)[0] + '.woof'
+        return os.path.join(self.output_dir, relative)
+
+    def load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest successful checkpoint record of each input path
+        converted by a previous run"""
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partial line from an interrupted run
+                    if record.get("success"):
+                        done[record["input"]] = record
+        return done
+
+    @staticmethod
+    def _input_signature(path: str) -> Optional[Tuple[int, int]]:
+        """(size, mtime_ns) of an input, or None if it cannot be read"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _is_done(record: Optional[Dict[str, Any]], output_path: str,
+                 signature: Optional[Tuple[int, int]], settings: str) -> bool:
+        """Whether a checkpoint record still covers an input: the same file
+        (size and mtime) converted with the same settings to an output that
+        still exists"""
+        return (record is not None and signature is not None
+                and record.get("output") == output_path and os.path.exists(output_path)
+                and (record.get("input_size"), record.get("input_mtime_ns")) == signature
+                and record.get("settings") == settings)
+
+    def run(self, inputs: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Convert all inputs and return an aggregate summary
+
+        Inputs recorded in the checkpoint are skipped only if neither they
+        nor the converter settings changed since, and their output exists.
+        """
+        done = self.load_checkpoint()
+        settings = WOOFFormat(**self.woof_options).settings_digest()
+        signatures = {}
+        jobs = []
+        collisions = []
+        outputs = {}
+        for path, relative in inputs:
+            output_path = self.output_path_for(relative)
+            key = os.path.normcase(os.path.abspath(output_path)).lower()
+            if key in outputs:
+                # Never let two inputs overwrite each other's output
+                collisions.append(_job_result((path, output_path), False,
+                                              f"Output {output_path} is also written for {outputs[key]}", 0.0))
+                continue
+            outputs[key] = path
+            signatures[path] = self._input_signature(path)
+            if not self._is_done(done.get(path), output_path, signatures[path], settings):
+                jobs.append((path, output_path))
+        skipped = len(inputs) - len(jobs) - len(collisions)
+
+        checkpoint = open(self.checkpoint_path, 'a', encoding='utf-8') if self.checkpoint_path else None
+        summary = {
+            "total": len(inputs),
+            "skipped": skipped,
+            "succeeded": 0,
+            "failed": 0,
+            "failures": [],
+            "input_bytes": 0,
+            "per_worker": {},
+            "dedup": None,
+        }
+        if self.woof_options.get("conversion_cache") is not None:
+            summary["dedup"] = {"lookups": 0, "hits": 0, "seconds_saved": 0.0}
+        start = time.perf_counter()
+        for result in collisions:
+            self._record(result, summary, len(jobs) + len(collisions))
+        try:
+            for result in self._results(jobs):
+                self._record(result, summary, len(jobs) + len(collisions))
+                if checkpoint:
+                    # Taken before the conversion, so an input modified
+                    # meanwhile is converted again next time
+                    size, mtime_ns = signatures[result["input"]] or (None, None)
+                    record = dict(result, input_size=size, input_mtime_ns=mtime_ns, settings=settings)
+                    checkpoint.write(json.dumps(record) + '\n')
+                    checkpoint.flush()
+        finally:
+            if checkpoint:
+                checkpoint.close()
+
+        summary["elapsed"] = time.perf_counter() - start
+        return summary
+
+    def _results(self, jobs: List[Tuple[str, str]]):
+        """Yield job results as they complete, keeping a bounded number in flight
+
+        With a detector, jobs go to the workers in chunks of its batch_size,
+        each converted by one _convert_chunk call.
+        """
+        detector = self.woof_options.get("detector")
+        chunk_size = detector.batch_size if detector is not None else 1
+        chunks = [jobs[start:start + chunk_size] for start in range(0, len(jobs), chunk_size)]
+        if self.workers <= 1:
+            _worker_init(self.woof_options)
+            for chunk in chunks:
+                yield from _convert_chunk(chunk)
+            return
+
+        # A worker that dies (out of memory, a crash in a decoder) breaks the
+        # whole pool. The chunks that were in flight are then retried one at
+        # a time on a new pool, so only a chunk that kills a worker on its
+        # own is recorded as failed.
+        max_in_flight = max(self.workers, self.workers * 4 // chunk_size)
+        waiting = deque(chunks)
+        suspects = deque()
+        while waiting or suspects:
+            yield from self._pool_results(waiting, suspects, max_in_flight)
+
+    def _pool_results(self, waiting: deque, suspects: deque, max_in_flight: int):
+        """Yield results of chunks run on one new process pool until all are
+        done or the pool breaks, leaving the unfinished chunks in suspects"""
+        pending = {}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_worker_init,
+                                 initargs=(self.woof_options,)) as pool:
+            while suspects:
+                chunk = suspects.popleft()
+                try:
+                    results = pool.submit(_convert_chunk, chunk).result()
+                except BrokenProcessPool as e:
+                    yield from _failed_chunk(chunk, f"Worker process died: {e}")
+                    return
+                yield from results
+
+            while waiting or pending:
+                while waiting and len(pending) < max_in_flight:
+                    chunk = waiting.popleft()
+                    try:
+                        pending[pool.submit(_convert_chunk, chunk)] = chunk
+                    except BrokenProcessPool:
+                        waiting.appendleft(chunk)
+                        suspects.extend(pending.values())
+                        return
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        results = future.result()
+                    except BrokenProcessPool:
+                        suspects.extend(pending.values())
+                        return
+                    del pending[future]
+                    yield from results
+
+    def _record(self, result: Dict[str, Any], summary: Dict[str, Any], total_jobs: int):
+        """Fold one result into the summary and report progress"""
+        worker = summary["per_worker"].setdefault(
+            result["worker"], {"converted": 0, "failed": 0, "seconds": 0.0})
+        worker["seconds"] += result["seconds"]
+        summary["input_bytes"] += result["input_bytes"]
+        if "dedup_hit" in result:
+            summary["dedup"]["lookups"] += 1
+            summary["dedup"]["hits"] += result["dedup_hit"]
+            summary["dedup"]["seconds_saved"] += result["seconds_saved"]
+
+        if result["success"]:
+            summary["succeeded"] += 1
+            worker["converted"] += 1
+        else:
+            summary["failed"] += 1
+            worker["failed"] += 1
+            summary["failures"].append({"input": result["input"], "error": result["error"]})
+
+        if not self.quiet:
+            count = summary["succeeded"] + summary["failed"]
+            status = "✅" if result["success"] else "❌"
+            print(f"[{count}/{total_jobs}] worker {result['worker']} "
+                  f"({worker['converted'] + worker['failed']} done): "
+                  f"{status} {result['input']} ({result['seconds']:.2f}s)")
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print the aggregate throughput summary of a batch run"""
+    elapsed = summary["elapsed"]
+    processed = summary["succeeded"] + summary["failed"]
+    print()
+    print("📦 Batch conversion summary")
+    print(f"   Inputs:     {summary['total']:,} ({summary['skipped']:,} already done)")
+    print(f"   Converted:  {summary['succeeded']:,}")
+    print(f"   Failed:     {summary['failed']:,}")
+    print(f"   Elapsed:    {elapsed:.2f}s")
+    if elapsed > 0:
+        print(f"   Throughput: {processed / elapsed:.1f} images/s, "
+              f"{summary['input_bytes'] / elapsed / 1e6:.2f} MB/s")
+    dedup = summary.get("dedup")
+    if dedup is not None:
+        rate = dedup["hits"] / dedup["lookups"] if dedup["lookups"] else 0.0
+        print(f"   Dedup:      {dedup['hits']:,}/{dedup['lookups']:,} duplicates ({rate:.0%}), "
+              f"~{dedup['seconds_saved']:.2f}s of conversion saved")
+    for pid, stats in sorted(summary["per_worker"].items()):
+        print(f"   Worker {pid}: {stats['converted']} converted, {stats['failed']} failed, "
+              f"{stats['seconds']:.2f}s busy")
+    for failure in summary["failures"]:
+        print(f"   ❌ {failure['input']}: {failure['error']}")
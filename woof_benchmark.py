@@ -0,0 +1,1279 @@
+#!/usr/bin/env python3
+"""
+WOOF Format Benchmarks
+Timing comparisons for the WOOF steganographic pipeline
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import hashlib
+import argparse
+import contextlib
+import platform
+import shutil
+import tempfile
+import subprocess
+from typing import Optional
+import numpy as np
+from PIL import Image, ImageDraw
+from woof_format import WOOFFormat, ImageContext
+
+IMAGE_SIZES = [(64, 64), (400, 300), (1920, 1080), (4000, 3000)]
+STAGE_SIZES = [(64, 64), (640, 480), (1920, 1080), (3840, 2160), (7680, 4320)]
+
+
+def create_benchmark_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Create a reproducible noisy RGBA image of the given size"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+    pixels[:, :, 3] = 255
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def create_structured_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Create a reproducible image with gradients, texture and noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 128 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0) + 40 * (x / width - y / height)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    for c, offset in enumerate((20, 0, -20)):
+        channel = base + offset + rng.normal(0, 12, size=(height, width)).astype(np.float32)
+        pixels[:, :, c] = np.clip(channel, 0, 255)
+    pixels[:, :, 3] = 255
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def create_synthetic_image(width: int, height: int) -> Image.Image:
+    """Create a puppy-portrait test image in the style of create_demo_image,
+    scaled to the requested size"""
+    image = Image.new('RGBA', (width, height), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    sx, sy = width / 400, height / 300
+    outline = max(1, round(2 * min(sx, sy)))
+
+    def box(x1, y1, x2, y2):
+        return [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+    draw.ellipse(box(100, 150, 300, 250), fill=(139, 69, 19), outline=(101, 67, 33), width=outline)
+    draw.ellipse(box(150, 80, 250, 180), fill=(160, 82, 45), outline=(101, 67, 33), width=outline)
+    draw.ellipse(box(130, 60, 170, 100), fill=(139, 69, 19), outline=(101, 67, 33), width=outline)
+    draw.ellipse(box(230, 60, 270, 100), fill=(139, 69, 19), outline=(101, 67, 33), width=outline)
+    draw.ellipse(box(170, 110, 190, 130), fill=(255, 255, 255), outline=(0, 0, 0), width=outline)
+    draw.ellipse(box(210, 110, 230, 130), fill=(255, 255, 255), outline=(0, 0, 0), width=outline)
+    draw.ellipse(box(175, 115, 185, 125), fill=(0, 0, 0))
+    draw.ellipse(box(215, 115, 225, 125), fill=(0, 0, 0))
+    draw.ellipse(box(195, 140, 205, 150), fill=(0, 0, 0))
+    draw.arc(box(180, 150, 220, 170), 0, 180, fill=(0, 0, 0), width=outline)
+    draw.text((10 * sx, 10 * sy), "WOOF Benchmark Image", fill=(0, 0, 0))
+    return image
+
+
+def time_call(func, *args, repeat: int = 3):
+    """Return (best wall time in seconds, last result) over repeat calls"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_embed_data(woof: WOOFFormat, image: Image.Image, metadata: dict) -> Image.Image:
+    """Reference per-pixel embed loop used before vectorization"""
+    metadata_json = json.dumps(metadata, separators=(',', ':'))
+    compressed_data = zlib.compress(metadata_json.encode('utf-8'), level=9)
+    full_data = woof.WOOF_HEADER + len(compressed_data).to_bytes(4, 'big') + compressed_data
+    data_bits = ''.join(format(byte, '08b') for byte in full_data)
+
+    img_array = np.array(image)
+    height, width = img_array.shape[:2]
+    bit_index = 0
+    for y in range(height):
+        for x in range(width):
+            for c in range(3):
+                if bit_index < len(data_bits):
+                    img_array[y, x, c] = (img_array[y, x, c] & 0xFE) | int(data_bits[bit_index])
+                    bit_index += 1
+                else:
+                    break
+            if bit_index >= len(data_bits):
+                break
+        if bit_index >= len(data_bits):
+            break
+
+    return Image.fromarray(img_array)
+
+
+def benchmark_embed(sizes=IMAGE_SIZES, payload_kb: int = 64):
+    """Compare the vectorized embed engine against the legacy loop"""
+    print("⏱️  embed_data: vectorized vs legacy loop")
+    print(f"   {'size':>11}  {'payload':>9}  {'legacy':>9}  {'vectorized':>10}  {'speedup':>7}")
+
+    woof = WOOFFormat()
+    rng = np.random.default_rng(1)
+    for width, height in sizes:
+        image = create_benchmark_image(width, height)
+        # Incompressible filler so the payload size is predictable
+        filler_bytes = min(payload_kb * 1024, width * height * 3 // 8 // 3)
+        filler = rng.integers(0, 256, size=filler_bytes // 2, dtype=np.uint8).tobytes().hex()
+        metadata = {"version": woof.VERSION, "filler": filler}
+        payload = len(zlib.compress(json.dumps(metadata, separators=(',', ':')).encode('utf-8'), level=9))
+
+        legacy_time, legacy_image = time_call(legacy_embed_data, woof, image, metadata, repeat=1)
+        fast_time, fast_image = time_call(woof.embed_data, image, metadata)
+
+        if legacy_image.tobytes() != fast_image.tobytes():
+            raise AssertionError(f"Vectorized output differs from legacy output at {width}x{height}")
+
+        print(f"   {width:>5}x{height:<5}  {payload:>7} B  {legacy_time:>8.4f}s  "
+              f"{fast_time:>9.4f}s  {legacy_time / fast_time:>6.1f}x")
+    print()
+
+
+def legacy_extract_data(woof: WOOFFormat, image: Image.Image):
+    """Reference full-image extract loop used before header-first decoding"""
+    img_array = np.array(image)
+    height, width = img_array.shape[:2]
+    extracted_bits = ""
+    for y in range(height):
+        for x in range(width):
+            for c in range(3):
+                extracted_bits += str(img_array[y, x, c] & 1)
+
+    extracted_bytes = bytearray()
+    for i in range(0, len(extracted_bits) - 7, 8):
+        extracted_bytes.append(int(extracted_bits[i:i+8], 2))
+
+    if extracted_bytes[:len(woof.WOOF_HEADER)] != woof.WOOF_HEADER:
+        return None
+    size_start = len(woof.WOOF_HEADER)
+    data_size = int.from_bytes(extracted_bytes[size_start:size_start+4], 'big')
+    compressed_data = extracted_bytes[size_start+4:size_start+4+data_size]
+    try:
+        return json.loads(zlib.decompress(bytes(compressed_data)).decode('utf-8'))
+    except (zlib.error, json.JSONDecodeError):
+        return None
+
+
+def benchmark_extract(sizes=IMAGE_SIZES, legacy_max_pixels: int = 400 * 300):
+    """Compare header-first extraction against the legacy full-image loop"""
+    print("⏱️  extract_data: header-first vs legacy loop")
+    print(f"   {'size':>11}  {'input':>8}  {'legacy':>9}  {'header-first':>12}")
+
+    woof = WOOFFormat()
+    metadata = {"version": woof.VERSION, "filler": "woof" * 256}
+    for width, height in sizes:
+        plain_image = create_benchmark_image(width, height)
+        woof_image = woof.embed_data(plain_image, metadata)
+
+        for label, image in (("plain", plain_image), ("woof", woof_image)):
+            fast_time, result = time_call(woof.extract_data, image)
+            if (result is not None) != (label == "woof"):
+                raise AssertionError(f"Unexpected extract result for {label} image at {width}x{height}")
+
+            if width * height <= legacy_max_pixels:
+                legacy_time, legacy_result = time_call(legacy_extract_data, woof, image, repeat=1)
+                if legacy_result != result:
+                    raise AssertionError(f"Header-first result differs from legacy at {width}x{height}")
+                legacy_column = f"{legacy_time:>8.4f}s"
+            else:
+                legacy_column = f"{'skipped':>9}"
+
+            print(f"   {width:>5}x{height:<5}  {label:>8}  {legacy_column}  {fast_time:>11.5f}s")
+    print()
+
+
+def _current_rss() -> int:
+    """Current resident set size in bytes (Linux), or 0 when unavailable"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _peak_rss() -> int:
+    """Peak resident set size in bytes since the last reset (Linux), or 0"""
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def measure_peak_memory(func, *args):
+    """Run func once and return (peak RSS growth in bytes or None, result)
+
+    Uses the resettable Linux high-water mark, so allocations made by PIL and
+    NumPy are both counted. Returns None for the peak on other platforms.
+    """
+    baseline = _current_rss()
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+    except OSError:
+        baseline = 0
+    result = func(*args)
+    peak = _peak_rss() if baseline else 0
+    return (max(peak - baseline, 0) if baseline and peak else None), result
+
+
+def _embed_memory_probe(path: str, variant: str):
+    """Run one embed variant on a PNG and print its peak memory overhead as JSON"""
+    import resource
+
+    woof = WOOFFormat()
+    image = Image.open(path)
+    image.load()
+    metadata = {"version": woof.VERSION, "filler": "woof" * 4096}
+    baseline = _current_rss()
+    try:
+        # Reset the peak RSS so decode buffers are not counted against embedding
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+    except OSError:
+        pass
+
+    if variant == 'legacy':
+        woof_image = legacy_embed_data(woof, image, metadata)
+    else:
+        woof_image = woof.embed_data(image, metadata, in_place=(variant == 'in-place'))
+
+    peak = _peak_rss() or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"overhead": peak - baseline, "baseline": baseline}))
+
+
+def benchmark_embed_memory(sizes=((2000, 2000), (4000, 3000), (8000, 6000))):
+    """Measure peak memory of embedding beyond the decoded image, per variant"""
+    if not _current_rss():
+        print("⏱️  embed memory: skipped (needs /proc/self/statm)\n")
+        return
+
+    print("⏱️  embed memory: peak overhead beyond the decoded image")
+    print(f"   {'size':>11}  {'raw image':>10}  {'variant':>8}  {'overhead':>10}  {'x image':>7}")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in sizes:
+            # Cheap, compressible gradient so the source PNG is quick to write
+            x = np.arange(width, dtype=np.uint8)[np.newaxis, :, np.newaxis]
+            y = np.arange(height, dtype=np.uint8)[:, np.newaxis, np.newaxis]
+            pixels = np.broadcast_to(x ^ y, (height, width, 4)).copy()
+            pixels[:, :, 3] = 255
+            path = os.path.join(tmp, f"{width}x{height}.png")
+            Image.fromarray(pixels).save(path, 'PNG', compress_level=1)
+            raw_bytes = pixels.nbytes
+            del pixels
+
+            for variant in ('legacy', 'copy', 'in-place'):
+                probe = (f"import woof_benchmark; "
+                         f"woof_benchmark._embed_memory_probe({path!r}, {variant!r})")
+                output = subprocess.run([sys.executable, '-c', probe], cwd=here,
+                                        capture_output=True, text=True, check=True).stdout
+                overhead = max(json.loads(output)["overhead"], 0)
+                print(f"   {width:>5}x{height:<5}  {raw_bytes / 1e6:>8.1f}MB  {variant:>8}  "
+                      f"{overhead / 1e6:>8.1f}MB  {overhead / raw_bytes:>6.2f}x")
+    print()
+
+
+def legacy_pixel_features(image: Image.Image) -> dict:
+    """Reference multi-pass feature computation used before the shared kernel"""
+    # analyze_image_features
+    img_array = np.array(image)
+    mean_rgb = np.mean(img_array[:, :, :3], axis=(0, 1))
+    brightness = np.mean(img_array[:, :, :3])
+    contrast = np.std(img_array[:, :, :3])
+    gray = np.mean(img_array[:, :, :3], axis=2)
+    edges = np.abs(np.diff(gray, axis=0))[:, :-1] + np.abs(np.diff(gray, axis=1))[:-1, :]
+    edge_density = np.mean(edges)
+
+    # _generate_attention_map
+    gray = np.mean(img_array[:, :, :3], axis=2)
+    attention = np.abs(gray - np.mean(gray)) / 255.0
+    threshold = np.percentile(attention, 90)
+    focus_regions = np.where(attention > threshold)
+
+    # generate_ai_annotations / _detect_objects_simulation
+    img_array = np.array(image)
+    red_mean = np.mean(img_array[:, :, 0])
+    std_all = np.std(img_array)
+
+    return {
+        "mean_rgb": mean_rgb,
+        "brightness": float(brightness),
+        "contrast": float(contrast),
+        "std_all": float(std_all),
+        "edge_density": float(edge_density),
+        "avg_attention": float(np.mean(attention)),
+        "max_attention": float(np.max(attention)),
+        "attention_peaks": len(focus_regions[0]),
+        "red_mean": float(red_mean),
+    }
+
+
+def benchmark_analysis(sizes=IMAGE_SIZES):
+    """Compare the single-pass analysis kernel against the legacy multi-pass path"""
+    print("⏱️  pixel analysis: single-pass kernel vs legacy passes")
+    print(f"   {'size':>11}  {'legacy':>9}  {'kernel':>9}  {'speedup':>7}  {'max rel err':>11}")
+
+    woof = WOOFFormat()
+    for width, height in sizes:
+        image = create_benchmark_image(width, height)
+        legacy_time, legacy = time_call(legacy_pixel_features, image)
+        kernel_time, stats = time_call(woof.compute_pixel_stats, image)
+
+        errors = [abs(stats[key] - legacy[key]) / max(abs(legacy[key]), 1e-12)
+                  for key in ("brightness", "contrast", "std_all", "edge_density",
+                              "avg_attention", "max_attention")]
+        errors.extend(np.abs(stats["mean_rgb"] - legacy["mean_rgb"]) / legacy["mean_rgb"])
+        print(f"   {width:>5}x{height:<5}  {legacy_time:>8.4f}s  {kernel_time:>8.4f}s  "
+              f"{legacy_time / kernel_time:>6.1f}x  {max(errors):>11.2e}")
+    print()
+
+
+def create_gradient_image(width: int, height: int) -> Image.Image:
+    """Create a top-to-bottom black-to-white gradient, which exposes any
+    sampling bias towards the top or bottom of each stride"""
+    level = (np.arange(height) * 255 // max(height - 1, 1)).astype(np.uint8)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[:, :, :3] = level[:, np.newaxis, np.newaxis]
+    pixels[:, :, 3] = 255
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def benchmark_approximate(sizes=((1920, 1080), (4000, 3000), (7680, 4320)),
+                          budgets=(1_000_000, 250_000, 100_000, 20_000, 5_000),
+                          max_errors: float = 3.0):
+    """Show error bounds and throughput of approximate analysis against exact mode
+
+    Fails if more pixels than the budget are sampled, or if brightness,
+    contrast or edge density is further from exact mode than max_errors
+    times its recorded standard error.
+    """
+    print("⏱️  approximate analysis: error and speed against exact mode")
+    print(f"   {'image':>17}  {'budget':>9}  {'time':>8}  {'speedup':>7}  {'pixels':>9}  "
+          f"{'brightness':>15}  {'contrast':>15}  {'edges':>17}  {'attention':>9}")
+
+    images = [(f"{width}x{height}", create_structured_image(width, height)) for width, height in sizes]
+    images.append(("gradient 3000x2000", create_gradient_image(3000, 2000)))
+    for label, image in images:
+        exact_time, exact = time_call(WOOFFormat().compute_pixel_stats, image)
+        print(f"   {label:>17}  {'exact':>9}  {exact_time:>7.3f}s")
+
+        for budget in budgets:
+            woof = WOOFFormat(analysis_budget=budget)
+            approx_time, approx = time_call(woof.compute_pixel_stats, image)
+            approximate = approx["stride"] > 1
+            if approximate and approx["sampled_pixels"] > budget:
+                raise AssertionError(f"{approx['sampled_pixels']} pixels sampled for a budget of {budget} "
+                                     f"on the {label} image")
+
+            columns = []
+            for key, width in (("brightness", 7), ("contrast", 7), ("edge_density", 8)):
+                error = approx[key] - exact[key]
+                stderr = approx[f"{key}_stderr"]
+                if abs(error) > max_errors * stderr + 1e-9:
+                    raise AssertionError(f"{key} is off by {error:.4g} with a recorded standard error of "
+                                         f"{stderr:.4g} at budget {budget} on the {label} image")
+                columns.append(f"{error:>+{width}.3f}±{stderr:<{width}.3f}")
+            attention = abs(approx["avg_attention"] - exact["avg_attention"]) / exact["avg_attention"]
+
+            print(f"   {'':>17}  {budget:>9,}  {approx_time:>7.3f}s  {exact_time / approx_time:>6.1f}x  "
+                  f"{approx['sampled_pixels'] if approximate else 'all':>9}  "
+                  f"{'  '.join(columns)}  {attention:>9.2e}")
+    print(f"   (errors against exact mode ± the recorded standard error, checked to within {max_errors:g}x;")
+    print("   attention has no recorded error bound and shows the relative error)")
+    print()
+
+
+def benchmark_cache(sizes=((400, 300), (1920, 1080), (4000, 3000)), lookups: int = 200):
+    """Compare repeated extract_from_woof calls with and without the metadata cache"""
+    from contextlib import redirect_stdout
+    from io import StringIO
+    from woof_cache import MetadataCache
+
+    print("⏱️  extract_from_woof: uncached vs metadata cache")
+    print(f"   {'size':>11}  {'uncached':>10}  {'memory hit':>10}  {'sqlite hit':>10}  {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'cache.db')
+        for width, height in sizes:
+            path = os.path.join(tmp, f"{width}x{height}.woof")
+            woof = WOOFFormat()
+            woof.embed_data(create_benchmark_image(width, height), {"version": woof.VERSION}).save(path, 'PNG')
+
+            with redirect_stdout(StringIO()):
+                uncached_time, expected = time_call(woof.extract_from_woof, path)
+
+                cached = WOOFFormat(metadata_cache=MetadataCache(db_path))
+                cached.extract_from_woof(path)  # Populate both levels
+                start = time.perf_counter()
+                for _ in range(lookups):
+                    result = cached.extract_from_woof(path)
+                memory_time = (time.perf_counter() - start) / lookups
+
+                # Fresh in-process LRU over the same on-disk index
+                disk_only = WOOFFormat(metadata_cache=MetadataCache(db_path, max_entries=0))
+                disk_time, disk_result = time_call(disk_only.extract_from_woof, path)
+
+            if result != expected or disk_result != expected:
+                raise AssertionError(f"Cached metadata differs at {width}x{height}")
+            print(f"   {width:>5}x{height:<5}  {uncached_time * 1e3:>8.2f}ms  {memory_time * 1e3:>8.3f}ms  "
+                  f"{disk_time * 1e3:>8.3f}ms  {uncached_time / memory_time:>7.0f}x")
+    print()
+
+
+def benchmark_storage(sizes=((400, 300), (1920, 1080), (4000, 3000))):
+    """Compare extraction latency and file size of LSB (V2) and chunk (V3) storage"""
+    print("⏱️  storage modes: extraction latency from disk and file size")
+    print(f"   {'size':>11}  {'storage':>7}  {'extract':>10}  {'file size':>12}")
+
+    woof = WOOFFormat()
+    metadata = {"version": woof.VERSION, "filler": "woof" * 256}
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in sizes:
+            image = create_benchmark_image(width, height)
+            for storage in WOOFFormat.STORAGE_MODES:
+                path = os.path.join(tmp, f"{width}x{height}-{storage}.woof")
+                writer = WOOFFormat(storage=storage)
+                writer.save_woof(image, metadata, path)
+
+                def extract():
+                    return writer.extract_data(Image.open(path))
+
+                extract_time, result = time_call(extract)
+                if result != metadata:
+                    raise AssertionError(f"{storage} storage did not round-trip at {width}x{height}")
+                print(f"   {width:>5}x{height:<5}  {storage:>7}  {extract_time * 1e3:>8.3f}ms  "
+                      f"{os.path.getsize(path):>10,} B")
+    print()
+
+
+def benchmark_layouts(size=(1920, 1080), payload_kb: int = 96):
+    """Measure embed throughput, touched pixels and PNG size per LSB layout"""
+    width, height = size
+    image = create_structured_image(width, height)
+    rng = np.random.default_rng(2)
+    filler = rng.integers(0, 256, size=payload_kb * 1024 // 2, dtype=np.uint8).tobytes().hex()
+    metadata = {"version": WOOFFormat.VERSION, "filler": filler}
+
+    plain = io.BytesIO()
+    image.save(plain, 'PNG')
+    plain_size = plain.tell()
+
+    print(f"⏱️  LSB layouts: {width}x{height}, ~{payload_kb} KB payload, plain PNG {plain_size:,} B")
+    print(f"   {'bits':>4}  {'alpha':>5}  {'embed':>9}  {'MB/s':>7}  {'rows':>5}  {'PNG size':>12}  {'overhead':>8}")
+
+    payload_bytes = len(WOOFFormat()._compress_metadata(metadata))
+    for use_alpha in (False, True):
+        for bits in (1, 2, 3, 4):
+            woof = WOOFFormat(bits_per_channel=bits, use_alpha=use_alpha)
+            embed_time, woof_image = time_call(woof.embed_data, image, metadata)
+            if woof.extract_data(woof_image) != metadata:
+                raise AssertionError(f"Layout bits={bits} alpha={use_alpha} did not round-trip")
+
+            slots = -(-payload_bytes * 8 // bits)
+            rows = -(-(woof.LAYOUT_PAYLOAD_PIXEL + -(-slots // (4 if use_alpha else 3))) // width)
+            encoded = io.BytesIO()
+            woof_image.save(encoded, 'PNG')
+            print(f"   {bits:>4}  {str(use_alpha):>5}  {embed_time * 1e3:>7.2f}ms  "
+                  f"{payload_bytes / embed_time / 1e6:>7.1f}  {rows:>5}  {encoded.tell():>10,} B  "
+                  f"{(encoded.tell() - plain_size) / plain_size * 100:>7.2f}%")
+    print()
+
+
+def benchmark_codecs(sizes=((400, 300), (1920, 1080)), repeat: int = 50):
+    """Compare payload size and encode/decode time per codec for create_metadata output"""
+    import woof_codec
+
+    variants = [("json", "zlib", level) for level in (1, 6, 9)]
+    variants += [("json", "lzma", None), ("json", "bz2", None)]
+    variants += [("binary", "zlib", level) for level in (1, 6, 9)]
+    variants += [("binary", "lzma", None), ("binary", "bz2", None)]
+
+    for width, height in sizes:
+        metadata = WOOFFormat().create_metadata(create_synthetic_image(width, height))
+        raw_size = len(json.dumps(metadata, separators=(',', ':')))
+        print(f"⏱️  payload codecs: create_metadata output for {width}x{height}, {raw_size:,} B of JSON")
+        print(f"   {'encoding':>8}  {'codec':>5}  {'level':>5}  {'size':>7}  {'ratio':>6}  "
+              f"{'encode':>9}  {'decode':>9}  {'LSB pixels':>10}")
+        for encoding, codec, level in variants:
+            woof = WOOFFormat(codec=codec, compression_level=level, encoding=encoding)
+            encode_time, payload = time_call(woof._compress_metadata, metadata, repeat=repeat)
+            decode_time, decoded = time_call(woof._decompress_metadata, payload, repeat=repeat)
+            if decoded != metadata:
+                raise AssertionError(f"{encoding}/{codec} did not round-trip")
+            level = woof_codec.CODECS[codec][1] if level is None else level
+            pixels = -(-(len(woof.WOOF_HEADER) + 4 + len(payload)) * 8 // 3)
+            print(f"   {encoding:>8}  {codec:>5}  {level:>5}  {len(payload):>5} B  "
+                  f"{len(payload) / raw_size:>6.2f}  {encode_time * 1e6:>7.1f}us  "
+                  f"{decode_time * 1e6:>7.1f}us  {pixels:>10,}")
+        print()
+
+
+def benchmark_update(size=(1920, 1080), files: int = 8):
+    """Compare per-file cost of a tag edit across an archive against a plain copy"""
+    width, height = size
+    patch = {"ai_annotations": {"llm_context": {"suggested_tags": ["puppy", "archive", "edited"]}}}
+    print(f"⏱️  metadata update: {files} files of {width}x{height}, one tag edit each")
+    print(f"   {'method':>22}  {'per file':>10}  {'vs copy':>8}")
+
+    variants = [
+        ("reconvert", None),
+        ("update lsb (full)", WOOFFormat()),
+        ("update lsb (reserved)", WOOFFormat(reserve_bytes=1024)),
+        ("update chunk", WOOFFormat(storage='chunk')),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = []
+        for index in range(files):
+            path = os.path.join(tmp, f"src{index}.png")
+            create_structured_image(width, height, seed=index).save(path)
+            sources.append(path)
+
+        def run(func):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for index, source in enumerate(sources):
+                    func(index, source)
+            return (time.perf_counter() - start) / files
+
+        def woof_path(label, index):
+            return os.path.join(tmp, f"{label}-{index}.woof")
+
+        writer = WOOFFormat(reserve_bytes=1024)
+        run(lambda index, source: writer.convert_to_woof(source, woof_path("copy", index)))
+        copy_time = run(lambda index, source: shutil.copyfile(
+            woof_path("copy", index), woof_path("copied", index)))
+        print(f"   {'copy':>22}  {copy_time * 1e3:>8.2f}ms  {1:>7.1f}x")
+
+        for label, woof in variants:
+            if woof is None:
+                reconvert = WOOFFormat()
+                elapsed = run(lambda index, source: reconvert.convert_to_woof(source, woof_path(label, index)))
+            else:
+                run(lambda index, source: woof.convert_to_woof(source, woof_path(label, index)))
+                elapsed = run(lambda index, source: woof.update_woof(woof_path(label, index), patch))
+            for index in range(files):
+                metadata = WOOFFormat().extract_data(Image.open(woof_path(label, index)))
+                if woof is not None and metadata["ai_annotations"]["llm_context"]["suggested_tags"][-1] != "edited":
+                    raise AssertionError(f"{label} did not apply the patch")
+            print(f"   {label:>22}  {elapsed * 1e3:>8.2f}ms  {elapsed / copy_time:>7.1f}x")
+    print()
+
+
+def legacy_focus_regions(attention: np.ndarray):
+    """Reference focus-region selection used before strip thresholding"""
+    threshold = np.percentile(attention, 90)
+    focus_regions = np.where(attention > threshold)
+    return len(focus_regions[0]), [[int(focus_regions[1][i]), int(focus_regions[0][i])]
+                                   for i in range(min(10, len(focus_regions[0])))]
+
+
+def benchmark_focus(sizes=((1920, 1080), (4000, 3000), (7680, 4320))):
+    """Compare time and allocation of focus-region selection on the attention plane"""
+    import tracemalloc
+
+    print("⏱️  focus regions: selection from the attention plane (k=10)")
+    print(f"   {'size':>11}  {'method':>7}  {'time':>9}  {'allocated':>10}")
+    for width, height in sizes:
+        image = create_structured_image(width, height)
+        gray = np.asarray(image, dtype=np.float32)[:, :, :3].mean(axis=2)
+        attention = np.abs(gray - gray.mean()) / 255.0
+        del gray, image
+        scratch = np.empty_like(attention)
+
+        def select(woof):
+            np.copyto(scratch, attention)
+            threshold = np.percentile(scratch.reshape(-1), 90, overwrite_input=True)
+            return woof._select_focus_regions(attention, threshold)
+
+        variants = [
+            ("legacy", lambda: legacy_focus_regions(attention)),
+            ("raster", lambda: select(WOOFFormat())),
+            ("peaks", lambda: select(WOOFFormat(focus_mode='peaks'))),
+        ]
+        results = {}
+        for label, func in variants:
+            elapsed, results[label] = time_call(func)
+            tracemalloc.start()
+            func()
+            allocated = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"   {width:>5}x{height:<5}  {label:>7}  {elapsed * 1e3:>7.2f}ms  {allocated / 1e6:>7.2f} MB")
+        if results["raster"] != results["legacy"]:
+            raise AssertionError(f"Raster focus regions differ from the legacy selection at {width}x{height}")
+    print()
+
+
+def _anon_rss() -> int:
+    """Resident anonymous memory in bytes (Linux), excluding mapped file pages, or 0"""
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _raw_memory_probe(path: str, output: str, memory_map: bool):
+    """Convert one file and print its time and peak anonymous memory growth as JSON
+
+    Memory is sampled from a background thread, since the kernel keeps no
+    high-water mark for anonymous memory alone and VmHWM counts the mapped
+    source pages.
+    """
+    import threading
+
+    woof = WOOFFormat(memory_map=memory_map)
+    baseline = _anon_rss()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.002):
+            peak[0] = max(peak[0], _anon_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ok = woof.convert_to_woof(path, output)
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    peak[0] = max(peak[0], _anon_rss())
+    print(json.dumps({"ok": ok, "seconds": elapsed, "overhead": peak[0] - baseline}))
+
+
+def benchmark_raw(sizes=((4000, 3000), (7680, 4320))):
+    """Compare converting uncompressed BMP and NPY sources through PIL and np.memmap"""
+    if not _anon_rss():
+        print("⏱️  raw input: skipped (needs RssAnon in /proc/self/status)\n")
+        return
+
+    print("⏱️  raw input: convert_to_woof time and peak anonymous memory growth")
+    print(f"   {'size':>11}  {'source':>6}  {'frame':>8}  {'path':>6}  {'time':>8}  {'memory':>9}  {'x frame':>7}")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in sizes:
+            pixels = np.asarray(create_structured_image(width, height).convert('RGB'))
+            sources = {'bmp': os.path.join(tmp, 'frame.bmp'), 'npy': os.path.join(tmp, 'frame.npy')}
+            Image.fromarray(pixels).save(sources['bmp'])
+            np.save(sources['npy'], pixels)
+            frame_bytes = pixels.nbytes
+            del pixels
+
+            for source, path in sources.items():
+                outputs = {}
+                for label, memory_map in (('pil', False), ('mmap', True)):
+                    if source == 'npy' and not memory_map:
+                        # PIL cannot read .npy; the BMP holds the same pixels
+                        path = sources['bmp']
+                    outputs[label] = os.path.join(tmp, f"{source}-{label}.png")
+                    probe = (f"import woof_benchmark; woof_benchmark._raw_memory_probe("
+                             f"{path!r}, {outputs[label]!r}, {memory_map!r})")
+                    result = json.loads(subprocess.run([sys.executable, '-c', probe], cwd=here,
+                                                       capture_output=True, text=True,
+                                                       check=True).stdout)
+                    if not result["ok"]:
+                        raise AssertionError(f"Converting {path} failed")
+                    overhead = max(result["overhead"], 0)
+                    print(f"   {width:>5}x{height:<5}  {source:>6}  {frame_bytes / 1e6:>6.1f}MB  {label:>6}  "
+                          f"{result['seconds']:>7.3f}s  {overhead / 1e6:>7.1f}MB  {overhead / frame_bytes:>6.2f}x")
+                with Image.open(outputs['pil']) as a, Image.open(outputs['mmap']) as b:
+                    if a.tobytes() != b.tobytes():
+                        raise AssertionError(f"Memory-mapped {source} output differs at {width}x{height}")
+    print()
+
+
+def benchmark_threads(sizes=((1920, 1080), (4000, 3000), (7680, 4320)), max_threads: Optional[int] = None):
+    """Scale compute_pixel_stats over 1..N analysis threads and check the results match"""
+    max_threads = max_threads or os.cpu_count() or 1
+    counts = sorted({1, max_threads} | {n for n in (2, 4, 8, 16, 32) if n < max_threads})
+    print(f"⏱️  analysis threads: compute_pixel_stats on 1..{max_threads} threads")
+    print(f"   {'size':>11}  {'threads':>7}  {'time':>9}  {'speedup':>7}")
+    for width, height in sizes:
+        image = create_structured_image(width, height)
+        serial_time = None
+        serial = None
+        for threads in counts:
+            woof = WOOFFormat(analysis_threads=threads)
+            elapsed, stats = time_call(woof.compute_pixel_stats, image)
+            if serial is None:
+                serial_time, serial = elapsed, stats
+            elif any(not np.array_equal(stats[key], serial[key]) for key in serial):
+                raise AssertionError(f"{threads}-thread statistics differ from serial at {width}x{height}")
+            print(f"   {width:>5}x{height:<5}  {threads:>7}  {elapsed * 1e3:>7.1f}ms  {serial_time / elapsed:>6.2f}x")
+    print()
+
+
+def benchmark_png_profiles(sizes=((400, 300), (1920, 1080), (4000, 3000))):
+    """Compare encode time and file size of the PNG profiles, checking the payload round-trips"""
+    print("⏱️  PNG profiles: save_woof time and output size per profile")
+    print(f"   {'size':>11}  {'profile':>8}  {'writer':>9}  {'time':>9}  {'size':>9}  {'x balanced':>10}")
+    for width, height in sizes:
+        image = create_structured_image(width, height)
+        metadata = WOOFFormat().create_metadata(image)
+        for writer, options in (('pil', {}), ('segmented', {'reserve_bytes': 1024})):
+            rows = []
+            for profile in WOOFFormat.PNG_PROFILES:
+                woof = WOOFFormat(png_profile=profile, **options)
+                outputs = []
+
+                def save():
+                    output = io.BytesIO()
+                    woof.save_woof(image.copy(), metadata, output, in_place=True)
+                    outputs.append(output)
+
+                elapsed, _ = time_call(save)
+                data = outputs[-1].getvalue()
+                if woof.extract_data(Image.open(io.BytesIO(data))) != metadata:
+                    raise AssertionError(f"Payload did not round-trip with the {profile} profile")
+                rows.append((profile, elapsed, len(data)))
+            balanced = dict((profile, size) for profile, _, size in rows)['balanced']
+            for profile, elapsed, size in rows:
+                print(f"   {width:>5}x{height:<5}  {profile:>8}  {writer:>9}  {elapsed * 1e3:>7.1f}ms  "
+                      f"{size / 1e3:>7.0f}KB  {size / balanced:>9.3f}x")
+    print()
+
+
+def benchmark_bytes(sizes=((400, 300), (1920, 1080), (4000, 3000))):
+    """Compare the in-memory API with the temp-file round trip it replaces"""
+    print("⏱️  bytes API: convert and extract from memory vs through temp files")
+    print(f"   {'size':>11}  {'operation':>9}  {'temp files':>10}  {'bytes':>9}  {'speedup':>7}")
+    woof = WOOFFormat()
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in sizes:
+            source = io.BytesIO()
+            create_structured_image(width, height).convert('RGB').save(source, 'JPEG', quality=90)
+            source = source.getvalue()
+            woof_bytes, metadata = woof.convert_bytes(source)
+
+            def convert_files():
+                input_path, output_path = os.path.join(tmp, 'in.jpg'), os.path.join(tmp, 'out.woof')
+                with open(input_path, 'wb') as fh:
+                    fh.write(source)
+                woof.convert_to_woof(input_path, output_path)
+                with open(output_path, 'rb') as fh:
+                    return fh.read()
+
+            def extract_files():
+                path = os.path.join(tmp, 'in.woof')
+                with open(path, 'wb') as fh:
+                    fh.write(woof_bytes)
+                return woof.extract_from_woof(path)
+
+            for operation, file_func, bytes_func in (
+                    ('convert', convert_files, lambda: woof.convert_bytes(source)[0]),
+                    ('extract', extract_files, lambda: woof.extract_bytes(woof_bytes))):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    file_time, file_result = time_call(file_func)
+                bytes_time, bytes_result = time_call(bytes_func)
+                if file_result != bytes_result:
+                    raise AssertionError(f"{operation} results differ at {width}x{height}")
+                print(f"   {width:>5}x{height:<5}  {operation:>9}  {file_time * 1e3:>8.1f}ms  "
+                      f"{bytes_time * 1e3:>7.1f}ms  {file_time / bytes_time:>6.1f}x")
+            if metadata != woof.extract_bytes(woof_bytes):
+                raise AssertionError(f"Payload did not round-trip at {width}x{height}")
+    print()
+
+
+def benchmark_catalog(counts=(100, 400), size=(640, 480)):
+    """Compare collecting extract_from_woof results in a list with streaming iter_metadata"""
+    import tracemalloc
+    from woof_catalog import iter_metadata
+
+    print(f"⏱️  catalog: metadata of a directory tree of {size[0]}x{size[1]} WOOF files")
+    print(f"   {'files':>5}  {'method':>18}  {'time':>8}  {'files/s':>8}  {'peak memory':>11}")
+    woof = WOOFFormat()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = io.BytesIO()
+        create_structured_image(*size).save(source, 'PNG')
+        woof_bytes, metadata = woof.convert_bytes(source.getvalue())
+        written = 0
+        for count in counts:
+            for index in range(written, count):
+                directory = os.path.join(tmp, f"d{index % 10}")
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, f"{index:05d}.woof"), 'wb') as fh:
+                    fh.write(woof_bytes)
+            written = count
+
+            def collect():
+                records = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for root, dirs, files in os.walk(tmp):
+                        dirs.sort()
+                        for name in sorted(files):
+                            path = os.path.join(root, name)
+                            records.append((path, woof.extract_from_woof(path)))
+                return records
+
+            def stream(prefetch, workers):
+                found = 0
+                for _, record in iter_metadata([tmp], woof, prefetch=prefetch, workers=workers):
+                    found += record == metadata
+                return found
+
+            for label, func in (("list (legacy)", collect),
+                                ("stream prefetch=1", lambda: stream(1, 1)),
+                                ("stream prefetch=8", lambda: stream(8, 4))):
+                tracemalloc.start()
+                start = time.perf_counter()
+                result = func()
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                found = result if isinstance(result, int) else sum(record == metadata for _, record in result)
+                if found != count:
+                    raise AssertionError(f"{label} found {found} of {count} records")
+                print(f"   {count:>5}  {label:>18}  {elapsed:>7.2f}s  {count / elapsed:>8.0f}  {peak / 1e6:>9.2f}MB")
+    print()
+
+
+def benchmark_startup(sizes=((64, 64), (1920, 1080)), repeat: int = 5):
+    """Compare fresh-process import and `--extract` times of woof_format and the lightweight path"""
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run(args):
+        """Best wall time of a fresh interpreter running args, and its output"""
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable] + args, cwd=here, capture_output=True, check=True)
+            best = min(best, time.perf_counter() - start)
+        return best, result.stdout
+
+    def import_time(module):
+        """Cumulative import time of module as reported by -X importtime, and the modules it loads"""
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=here, capture_output=True, text=True, check=True)
+        loaded, cumulative = set(), 0
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[0].startswith('import time:') and fields[1].strip().isdigit():
+                name = fields[2].strip()
+                loaded.add(name.split('.')[0])
+                if name == module:
+                    cumulative = int(fields[1])
+        return cumulative / 1e6, loaded
+
+    print(f"⏱️  startup: fresh interpreter, best of {repeat}")
+    print(f"   {'command':>34}  {'time':>8}  {'speedup':>7}")
+    baseline, _ = run(['-c', 'pass'])
+    print(f"   {'python (empty)':>34}  {baseline * 1000:>6.0f}ms")
+    full, _ = run(['-c', 'import woof_format'])
+    light, _ = run(['-c', 'import woof_extract'])
+    print(f"   {'import woof_format':>34}  {full * 1000:>6.0f}ms")
+    print(f"   {'import woof_extract':>34}  {light * 1000:>6.0f}ms  {full / light:>6.2f}x")
+    for module in ('woof_format', 'woof_extract'):
+        seconds, loaded = import_time(module)
+        heavy = ', '.join(sorted(loaded & {'numpy', 'PIL', 'argparse', 'tkinter'})) or 'none'
+        print(f"   {f'-X importtime {module}':>34}  {seconds * 1000:>6.0f}ms  (loads {heavy})")
+
+    woof = WOOFFormat()
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in sizes:
+            source = io.BytesIO()
+            create_structured_image(width, height).save(source, 'PNG')
+            path = os.path.join(tmp, f"{width}x{height}.woof")
+            with open(path, 'wb') as fh:
+                fh.write(woof.convert_bytes(source.getvalue())[0])
+            full, expected = run(['woof_format.py', path, '--extract'])
+            light, output = run(['woof_cli.py', path, '--extract'])
+            if output != expected:
+                raise AssertionError(f"woof_cli output differs from woof_format for {width}x{height}")
+            print(f"   {f'woof_format.py --extract {width}x{height}':>34}  {full * 1000:>6.0f}ms")
+            print(f"   {f'woof_cli.py --extract {width}x{height}':>34}  {light * 1000:>6.0f}ms  {full / light:>6.2f}x")
+    print()
+
+
+def benchmark_context(sizes=((1920, 1080), (4000, 3000)), repeat: int = 3):
+    """Measure the pixel copy of a conversion: np.asarray vs the shared ImageContext"""
+    import tracemalloc
+
+    print(f"⏱️  image context: pixel array copies per conversion, best of {repeat}")
+    print(f"   {'size':>11}  {'step':>26}  {'time':>8}  {'peak memory':>11}  {'frames':>6}")
+    for width, height in sizes:
+        image = create_benchmark_image(width, height)
+        frame = width * height * 4
+        woof = WOOFFormat()
+        events = []
+        woof.add_stage_hook(lambda event: events.append(event))
+
+        def traced(func):
+            best, peak = float('inf'), 0
+            for _ in range(repeat):
+                tracemalloc.start()
+                start = time.perf_counter()
+                result = func()
+                best = min(best, time.perf_counter() - start)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                del result
+            return best, peak
+
+        context = ImageContext(image)
+        woof.create_metadata(context)
+        rows = [
+            ("np.asarray(image)", lambda: np.asarray(image)),
+            ("ImageContext.array", lambda: ImageContext(image).array),
+            ("create_metadata", lambda: woof.create_metadata(ImageContext(image))),
+            ("create_metadata (cached)", lambda: woof.create_metadata(context)),
+            ("convert_image", lambda: woof.convert_image(image.copy(), io.BytesIO())),
+        ]
+        for label, func in rows:
+            elapsed, peak = traced(func)
+            print(f"   {width:>5}x{height:<5}  {label:>26}  {elapsed:>7.3f}s  {peak / 1e6:>9.1f}MB  "
+                  f"{peak / frame:>5.2f}x")
+        allocated = [event["allocated_bytes"] for event in events if "allocated_bytes" in event][-1]
+        print(f"   {width:>5}x{height:<5}  {'allocated per conversion':>26}  {'':>8}  "
+              f"{allocated / 1e6:>9.1f}MB  {allocated / frame:>5.2f}x")
+    print()
+
+
+class SyntheticDetector:
+    """Stand-in for a CPU detection model: a small patch network in NumPy
+
+    Built on first use so the class can be imported without woof_detect.
+    """
+
+    def __new__(cls, **options):
+        from woof_detect import Detector, resize_rgb
+
+        class _SyntheticDetector(Detector):
+            input_size = (64, 64)
+            model_seconds = 0.0
+
+            def load(self):
+                rng = np.random.default_rng(0)
+                return (rng.standard_normal((48, 64), dtype=np.float32) / 7,
+                        rng.standard_normal((64, 64), dtype=np.float32) / 8,
+                        rng.standard_normal((64, 6), dtype=np.float32) / 8)
+
+            def preprocess(self, pixels):
+                return resize_rgb(pixels, self.input_size).astype(np.float32) / 255
+
+            def infer(self, model, inputs):
+                start = time.perf_counter()
+                try:
+                    return self._forward(model, inputs)
+                finally:
+                    self.model_seconds += time.perf_counter() - start
+
+            def _forward(self, model, inputs):
+                w1, w2, w3 = model
+                batch = np.stack(inputs)
+                n, h, w, _ = batch.shape
+                patches = batch.reshape(n, h // 4, 4, w // 4, 4, 3).transpose(0, 1, 3, 2, 4, 5).reshape(n, -1, 48)
+                hidden = np.maximum(np.maximum(patches @ w1, 0) @ w2, 0)
+                scores = 1 / (1 + np.exp(-(hidden.mean(axis=1) @ w3)))
+                return [[(0, float(row[0]), (0.1, 0.1, 0.6, 0.7)), (1, float(row[1]), (0.4, 0.2, 0.9, 0.8))]
+                        for row in scores]
+
+        return _SyntheticDetector(score_threshold=0.0, **options)
+
+
+def benchmark_detect(count: int = 48, unique: int = 24, size=(640, 480), batch_sizes=(1, 8, 16)):
+    """Compare detector calls per image, batched calls, and the pixel-hash result cache"""
+    print(f"⏱️  detector: {count} images of {size[0]}x{size[1]}, {unique} distinct")
+    print(f"   {'batch':>5}  {'cache':>5}  {'total':>8}  {'model':>8}  {'images/s':>8}  "
+          f"{'model calls':>11}  {'inferred':>8}")
+    images = [create_structured_image(*size, seed=index % unique).convert('RGBA') for index in range(count)]
+    expected = SyntheticDetector().detect_batch([np.asarray(images[0])])[0]
+    for batch_size in batch_sizes:
+        for cached in (False, True):
+            detector = SyntheticDetector(batch_size=batch_size)
+            detector.model  # Load outside the timing
+            if not cached:
+                detector.cache.max_entries = 0
+            woof = WOOFFormat(detector=detector)
+            start = time.perf_counter()
+            results = []
+            for first in range(0, count, batch_size):
+                results.extend(woof.detect_objects(images[first:first + batch_size]))
+            elapsed = time.perf_counter() - start
+            if results[0] != expected or results[unique] != expected:
+                raise AssertionError("detections differ between calls")
+            print(f"   {batch_size:>5}  {'on' if cached else 'off':>5}  {elapsed:>7.3f}s  "
+                  f"{detector.model_seconds:>7.3f}s  {count / elapsed:>8.1f}  "
+                  f"{detector.inferences:>11}  {detector.inferred_images:>8}")
+    print()
+
+
+def benchmark_dedup(count: int = 24, size=(1280, 720), duplicate_rates=(0.0, 0.5, 0.75)):
+    """Convert corpora with duplicate images without and with the conversion cache"""
+    from woof_cache import ConversionCache
+
+    width, height = size
+    print(f"⏱️  dedup: {count} images of {width}x{height}")
+    print(f"   {'duplicates':>10}  {'cache':>8}  {'total':>8}  {'images/s':>8}  {'hits':>4}  {'saved':>8}")
+    variants = [
+        ("off", None),
+        ("metadata", {"max_output_bytes": 0}),
+        ("output", {}),
+    ]
+    for rate in duplicate_rates:
+        unique = max(1, round(count * (1 - rate)))
+        images = [create_structured_image(width, height, seed=index % unique) for index in range(count)]
+        expected = None
+        for label, options in variants:
+            cache = ConversionCache(**options) if options is not None else None
+            woof = WOOFFormat(conversion_cache=cache)
+            start = time.perf_counter()
+            outputs = []
+            for image in images:
+                output = io.BytesIO()
+                woof.convert_image(image.copy(), output)
+                outputs.append(hashlib.md5(output.getvalue()).digest())
+            elapsed = time.perf_counter() - start
+            expected = expected or outputs
+            if outputs != expected:
+                raise AssertionError("Deduplicated output differs")
+            stats = cache.stats() if cache is not None else {"hits": 0, "seconds_saved": 0.0}
+            print(f"   {rate:>10.0%}  {label:>8}  {elapsed:>7.3f}s  {count / elapsed:>8.1f}  "
+                  f"{stats['hits']:>4}  {stats['seconds_saved']:>7.3f}s")
+    print()
+
+
+def benchmark_hooks(size=(400, 300), repeat: int = 20):
+    """Measure convert_image overhead of stage hooks: none, a no-op hook, each exporter"""
+    import logging
+    from woof_metrics import PrometheusExporter, StructuredLogExporter
+
+    width, height = size
+    image = create_synthetic_image(width, height)
+    logging.getLogger('woof.stages').addHandler(logging.NullHandler())
+    logging.getLogger('woof.stages').propagate = False
+    variants = [
+        ("disabled", []),
+        ("no-op hook", [lambda event: None]),
+        ("prometheus", [PrometheusExporter()]),
+        ("json log", [StructuredLogExporter()]),
+    ]
+
+    print(f"⏱️  stage hooks: convert_image on {width}x{height}, best of {repeat}")
+    print(f"   {'hooks':>10}  {'convert':>10}  {'overhead':>8}")
+    baseline = None
+    for label, hooks in variants:
+        woof = WOOFFormat(stage_hooks=hooks)
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, _ = time_call(lambda: woof.convert_image(image.copy(), io.BytesIO()), repeat=repeat)
+        baseline = baseline or elapsed
+        print(f"   {label:>10}  {elapsed * 1e3:>8.3f}ms  {(elapsed - baseline) / baseline * 100:>7.2f}%")
+    print()
+
+
+def benchmark_async(size=(1920, 1080), files: int = 8, requests: int = 100, concurrency: int = 25):
+    """Load-test concurrent extraction: blocking calls in coroutines vs AsyncWOOF"""
+    import asyncio
+    from woof_async import AsyncWOOF
+
+    width, height = size
+    print(f"⏱️  async extraction: {requests} requests, {concurrency} concurrent, {width}x{height} files")
+    print(f"   {'mode':>10}  {'total':>8}  {'p50':>9}  {'p99':>9}  {'max loop lag':>12}")
+
+    async def load_test(extract, paths):
+        lags = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            # Measures how late the loop wakes a 1 ms sleeper
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with gate:
+                start = time.perf_counter()
+                result = await extract(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - start)
+                if result is None:
+                    raise AssertionError("Async extraction lost metadata")
+
+        ticker = asyncio.ensure_future(heartbeat())
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        total = time.perf_counter() - start
+        stop.set()
+        await ticker
+        return total, np.percentile(latencies, 50), np.percentile(latencies, 99), max(lags or [0])
+
+    woof = WOOFFormat()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tmp, f"{i}.woof")
+            woof.save_woof(create_benchmark_image(width, height, seed=i), {"version": woof.VERSION, "id": i}, path)
+            paths.append(path)
+
+        async def blocking_extract(path):
+            return woof.extract_data(Image.open(path))
+
+        async def run_async():
+            async with AsyncWOOF(woof) as api:
+                return await load_test(api.extract, paths)
+
+        for mode, runner in (("blocking", lambda: load_test(blocking_extract, paths)),
+                             ("AsyncWOOF", run_async)):
+            total, p50, p99, lag = asyncio.run(runner())
+            print(f"   {mode:>10}  {total:>7.2f}s  {p50 * 1e3:>7.1f}ms  {p99 * 1e3:>7.1f}ms  "
+                  f"{lag * 1e3:>10.1f}ms")
+    print()
+
+
+def benchmark_stages(sizes=STAGE_SIZES):
+    """Time each conversion stage separately, with peak memory, per image size"""
+    print("⏱️  pipeline stages: best wall time (peak memory growth)")
+    stage_names = ("analyze_image_features", "generate_ai_annotations", "embed_data",
+                   "png_encode", "extract_data")
+    print(f"   {'size':>11}  " + "  ".join(f"{name:>24}" for name in stage_names))
+
+    woof = WOOFFormat()
+    records = []
+    for width, height in sizes:
+        image = create_synthetic_image(width, height)
+        repeat = 3 if width * height < 4_000_000 else 1
+        metadata = woof.create_metadata(image)
+        woof_image = woof.embed_data(image, metadata)
+        encoded = io.BytesIO()
+        woof_image.save(encoded, 'PNG')
+        png_bytes = encoded.getvalue()
+
+        def png_encode():
+            woof_image.save(io.BytesIO(), 'PNG')
+
+        def extract():
+            return woof.extract_data(Image.open(io.BytesIO(png_bytes)))
+
+        stages = {
+            "analyze_image_features": (woof.analyze_image_features, image),
+            "generate_ai_annotations": (woof.generate_ai_annotations, image),
+            "embed_data": (woof.embed_data, image, metadata),
+            "png_encode": (png_encode,),
+            "extract_data": (extract,),
+        }
+        record = {"width": width, "height": height, "stages": {}}
+        cells = []
+        for name in stage_names:
+            func, *args = stages[name]
+            seconds, _ = time_call(func, *args, repeat=repeat)
+            peak, _ = measure_peak_memory(func, *args)
+            record["stages"][name] = {"seconds": seconds, "peak_memory_bytes": peak}
+            memory = f"{peak / 1e6:.1f}MB" if peak is not None else "n/a"
+            cells.append(f"{seconds * 1e3:>12.2f}ms ({memory:>7})")
+        records.append(record)
+        print(f"   {width:>5}x{height:<5}  " + "  ".join(f"{cell:>24}" for cell in cells))
+    print()
+    return records
+
+
+def compare_results(baseline: dict, results: dict, threshold: float = 1.1):
+    """Print per-stage time ratios against a baseline JSON results file"""
+    print(f"📈 Comparison with {baseline.get('commit') or 'baseline'} (ratio = new / old)")
+    old_stages = {(r["width"], r["height"]): r["stages"]
+                  for r in baseline.get("results", {}).get("stages", [])}
+    for record in results.get("stages", []):
+        old = old_stages.get((record["width"], record["height"]))
+        if not old:
+            continue
+        for name, stage in record["stages"].items():
+            if name not in old or not old[name]["seconds"]:
+                continue
+            ratio = stage["seconds"] / old[name]["seconds"]
+            flag = "  ⚠️ regression" if ratio > threshold else ""
+            print(f"   {record['width']:>5}x{record['height']:<5}  {name:>24}  {ratio:>6.2f}x{flag}")
+    print()
+
+
+def _git_commit() -> Optional[str]:
+    """Current git commit of the benchmarked tree, if available"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+BENCHMARKS = {
+    'stages': benchmark_stages,
+    'embed': benchmark_embed,
+    'extract': benchmark_extract,
+    'embed-memory': benchmark_embed_memory,
+    'analysis': benchmark_analysis,
+    'approximate': benchmark_approximate,
+    'cache': benchmark_cache,
+    'storage': benchmark_storage,
+    'layouts': benchmark_layouts,
+    'async': benchmark_async,
+    'hooks': benchmark_hooks,
+    'codecs': benchmark_codecs,
+    'update': benchmark_update,
+    'focus': benchmark_focus,
+    'raw': benchmark_raw,
+    'threads': benchmark_threads,
+    'png': benchmark_png_profiles,
+    'bytes': benchmark_bytes,
+    'catalog': benchmark_catalog,
+    'context': benchmark_context,
+    'detect': benchmark_detect,
+    'dedup': benchmark_dedup,
+    'startup': benchmark_startup,
+}
+
+
+def main():
+    """Run the requested benchmarks"""
+    parser = argparse.ArgumentParser(description='WOOF Format Benchmarks')
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--json', metavar='PATH', help='Write machine-readable results to PATH')
+    parser.add_argument('--compare', metavar='PATH', help='Compare stage timings with a previous --json file')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in args.benchmarks or list(BENCHMARKS):
+        records = BENCHMARKS[name]()
+        if records is not None:
+            results[name] = records
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            compare_results(json.load(fh), results)
+
+    if args.json:
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Wrote results to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+WOOF Metadata Cache
+Persistent index of decoded WOOF payloads so repeated extractions skip pixel
+decoding, and a conversion cache so duplicate inputs skip analysis
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+def content_hash(data: bytes) -> str:
+    """Hash in-memory file contents with BLAKE2b"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def pixel_hash(pixels, chunk_size: int = 1 << 22, as_rgba: bool = False) -> str:
+    """Hash a decoded pixel array with BLAKE2b, a strip of rows at a time
+
+    Works on any NumPy array, including views and memory maps, without a
+    full-size copy. The shape and dtype are hashed too. With as_rgba an
+    (H, W, 3) array is hashed as (H, W, 4) with an opaque alpha channel, so
+    RGB pixels and the same pixels converted to RGBA give the same digest.
+    """
+    add_alpha = as_rgba and pixels.ndim == 3 and pixels.shape[2] == 3
+    if add_alpha:
+        import numpy as np
+    shape = pixels.shape[:2] + (4,) if add_alpha else pixels.shape
+    digest = hashlib.blake2b(repr((shape, pixels.dtype.str)).encode(), digest_size=16)
+    row_bytes = pixels[0].nbytes if len(pixels) else 1
+    rows = max(1, chunk_size // max(row_bytes, 1))
+    for top in range(0, len(pixels), rows):
+        strip = pixels[top:top + rows]
+        if add_alpha:
+            rgba = np.full(strip.shape[:2] + (4,), 255, dtype=strip.dtype)
+            rgba[:, :, :3] = strip
+            strip = rgba
+        digest.update(strip.data if strip.flags.c_contiguous else strip.tobytes())
+    return digest.hexdigest()
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash the file contents with BLAKE2b, reading in chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BoundedCache:
+    """Thread-safe LRU bounded by entry count and bytes, optionally backed by SQLite
+
+    The shared machinery of the WOOF caches. Entries are tuples of the
+    values of COLUMNS, stored under a string key in the LRU and, with
+    db_path, in the SQLite table TABLE, which is opened on first use.
+    Subclasses provide the public get/put methods, taking the lock around
+    the helpers below, and _entry_size. max_bytes=None bounds the entry
+    count only. Pickling keeps only the settings, so a cache can be handed
+    to worker processes.
+    """
+
+    TABLE = 'entries'
+    KEY_COLUMN = 'key'
+    COLUMNS = ()  # Value columns with their SQLite types, e.g. "payload TEXT"
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        self._lru = OrderedDict()
+        self._lru_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    def __getstate__(self):
+        return {"max_entries": self.max_entries, "max_bytes": self.max_bytes, "db_path": self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and in-memory usage"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._lru),
+            "bytes": self._lru_bytes,
+        }
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._lru.clear()
+            self._lru_bytes = 0
+            if self.db_path:
+                db = self._connect()
+                db.execute(f"DELETE FROM {self.TABLE}")
+                db.commit()
+
+    def close(self):
+        """Close the on-disk store"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        """The entry for key from the LRU or else the store, or None (lock held)"""
+        entry = self._lru.get(key)
+        if entry is not None:
+            self._lru.move_to_end(key)
+        elif self.db_path:
+            columns = ', '.join(column.split()[0] for column in self.COLUMNS)
+            row = self._connect().execute(
+                f"SELECT {columns} FROM {self.TABLE} WHERE {self.KEY_COLUMN} = ?", (key,)).fetchone()
+            if row is not None:
+                entry = tuple(row)
+                self._remember(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: tuple):
+        """Write an entry to the LRU and the store (lock held)"""
+        self._remember(key, entry)
+        if self.db_path:
+            db = self._connect()
+            db.execute(f"INSERT OR REPLACE INTO {self.TABLE} VALUES ({', '.join('?' * (len(entry) + 1))})",
+                       (key,) + entry)
+            db.commit()
+
+    def _forget(self, key: str):
+        """Remove an entry from the LRU and the store (lock held)"""
+        self._drop_lru(key)
+        if self.db_path:
+            db = self._connect()
+            db.execute(f"DELETE FROM {self.TABLE} WHERE {self.KEY_COLUMN} = ?", (key,))
+            db.commit()
+
+    def _remember(self, key: str, entry: tuple):
+        """Insert an entry into the LRU and evict down to the bounds (lock held)"""
+        self._drop_lru(key)
+        self._lru[key] = entry
+        self._lru_bytes += self._entry_size(key, entry)
+        while self._lru and (len(self._lru) > self.max_entries or
+                             (self.max_bytes is not None and self._lru_bytes > self.max_bytes)):
+            self._drop_lru(next(iter(self._lru)))
+
+    def _drop_lru(self, key: str):
+        entry = self._lru.pop(key, None)
+        if entry is not None:
+            self._lru_bytes -= self._entry_size(key, entry)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the store on first use (lock held)"""
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                             f"({self.KEY_COLUMN} TEXT PRIMARY KEY, {', '.join(self.COLUMNS)})")
+            self._db.commit()
+        return self._db
+
+    @staticmethod
+    def _entry_size(key: str, entry: tuple) -> int:
+        """Bytes an entry is counted as against max_bytes"""
+        return len(key) + sum(len(value) for value in entry if isinstance(value, (str, bytes)))
+
+
+class MetadataCache(BoundedCache):
+    """Two-level cache of extracted WOOF metadata keyed by file path
+
+    Entries are validated against the file's mtime and size on every lookup.
+    When those change but the content hash still matches (for example after
+    a touch or copy with new timestamps), the entry is revalidated instead of
+    being decoded again. Negative results (no WOOF payload) are cached too.
+    """
+
+    KEY_COLUMN = 'path'
+    COLUMNS = ('mtime_ns INTEGER', 'size INTEGER', 'content_hash TEXT', 'payload TEXT')
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 4096,
+                 max_bytes: int = 64 * 1024 * 1024):
+        # Entries: path -> (mtime_ns, size, content_hash, payload JSON or None)
+        super().__init__(max_entries, max_bytes, db_path)
+        if db_path:
+            self._connect()
+
+    def get(self, path: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (found, metadata) for path; metadata is None for non-WOOF files"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            mtime_ns, size, content_hash, payload = entry
+            if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+                if size != stat.st_size or file_content_hash(key) != content_hash:
+                    self._forget(key)
+                    self.misses += 1
+                    return False, None
+                # Same content with a new timestamp: refresh the signature
+                self._store(key, (stat.st_mtime_ns, stat.st_size, content_hash, payload))
+
+            self.hits += 1
+            return True, (json.loads(payload) if payload is not None else None)
+
+    def put(self, path: str, metadata: Optional[Dict[str, Any]],
+            content_hash: Optional[str] = None, stat: Optional[os.stat_result] = None):
+        """Store the extraction result for path
+
+        Pass the stat taken before reading the file and the hash of the bytes
+        that were decoded, so a concurrent modification invalidates the entry.
+        """
+        key = os.path.abspath(path)
+        stat = stat or os.stat(key)
+        content_hash = content_hash or file_content_hash(key)
+        payload = json.dumps(metadata, separators=(',', ':')) if metadata is not None else None
+
+        with self._lock:
+            self._store(key, (stat.st_mtime_ns, stat.st_size, content_hash, payload))
+
+    def invalidate(self, path: str):
+        """Drop any cached entry for path"""
+        with self._lock:
+            self._forget(os.path.abspath(path))
+
+
+class ConversionCache(BoundedCache):
+    """Bounded cache of conversion results keyed by decoded pixel content
+
+    WOOFFormat.convert_image looks inputs up by pixel hash and converter
+    settings (see WOOFFormat._conversion_key). An entry holds the metadata,
+    the encoded WOOF file if it is at most max_output_bytes together with
+    the form of input it was written from, and the seconds the analysis and
+    the whole conversion took. Inputs of another form (a memory-mapped
+    image is written differently from a decoded one) reuse the metadata
+    only. The seconds a hit saves are added up in seconds_saved. With
+    db_path entries are also kept in SQLite, shared by batch workers and
+    later runs.
+    """
+
+    TABLE = 'conversions'
+    COLUMNS = ('metadata TEXT', 'output BLOB', 'output_form TEXT',
+               'analysis_seconds REAL', 'seconds REAL')
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024,
+                 max_output_bytes: int = 16 * 1024 * 1024, db_path: Optional[str] = None):
+        # Entries: key -> (metadata JSON, encoded output or None, output form,
+        #                  analysis seconds, conversion seconds)
+        super().__init__(max_entries, max_bytes, db_path)
+        self.max_output_bytes = max_output_bytes
+        self.seconds_saved = 0.0
+
+    def __getstate__(self):
+        return dict(super().__getstate__(), max_output_bytes=self.max_output_bytes)
+
+    def get(self, key: str, output_form: str) -> Optional[Tuple[Dict[str, Any], Optional[bytes]]]:
+        """Return (metadata, encoded output or None) for key, or None on a miss
+
+        The output is only returned if it was written from an input of
+        output_form.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            metadata, output, form, analysis_seconds, seconds = entry
+            if form != output_form:
+                output = None
+            self.hits += 1
+            self.seconds_saved += seconds if output is not None else analysis_seconds
+            return json.loads(metadata), output
+
+    def put(self, key: str, metadata: Dict[str, Any], output: Optional[bytes], output_form: str,
+            analysis_seconds: float, seconds: float):
+        """Store a conversion result; output is dropped if larger than max_output_bytes"""
+        if output is not None and len(output) > self.max_output_bytes:
+            output = None
+        with self._lock:
+            self._store(key, (json.dumps(metadata, separators=(',', ':')), output, output_form,
+                              analysis_seconds, seconds))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, estimated seconds saved and in-memory usage"""
+        lookups = self.hits + self.misses
+        return dict(super().stats(), hit_rate=self.hits / lookups if lookups else 0.0,
+                    seconds_saved=self.seconds_saved)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+WOOF Catalog
+Stream metadata out of directory trees of WOOF files, one record at a time
+"""
+
+import os
+import sys
+import glob
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Iterator, Optional, Sequence, TextIO, Tuple
+
+from woof_format import WOOFFormat
+
+# Extensions of files considered WOOF output when walking directories
+WOOF_EXTENSIONS = ('.woof', '.png')
+
+
+def iter_woof_files(sources: Iterable[str],
+                    extensions: Sequence[str] = WOOF_EXTENSIONS) -> Iterator[str]:
+    """Lazily yield files under directories, glob patterns and plain paths
+
+    Directories are walked in sorted order, one directory listing at a
+    time, so memory does not grow with the size of the tree. Unlike
+    woof_batch.collect_inputs, paths reached twice are yielded twice.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+
+    def is_woof(path):
+        return os.path.splitext(path)[1].lower() in extensions
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_woof(name):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(source):
+            for path in glob.iglob(source, recursive=True):
+                if os.path.isfile(path) and is_woof(path):
+                    yield path
+        else:
+            yield source
+
+
+def project(metadata: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    """Keep only the given dotted field paths of metadata, e.g. "features.brightness"
+
+    Fields the metadata does not have are left out.
+    """
+    result = {}
+    for field in fields:
+        keys = field.split('.')
+        value = metadata
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = result
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return result
+
+
+def _read_metadata(woof: WOOFFormat, path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """(metadata or None, None) for one file, or (None, error message) if it cannot be read"""
+    try:
+        if woof.metadata_cache is not None:
+            return woof._extract_cached(path), None
+        with open(path, 'rb') as fh:
+            return woof.extract_bytes(fh.read()), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+def iter_metadata(sources: Iterable[str], woof: Optional[WOOFFormat] = None,
+                  fields: Optional[Sequence[str]] = None, prefetch: int = 8,
+                  workers: int = 4, extensions: Sequence[str] = WOOF_EXTENSIONS,
+                  errors: bool = False) -> Iterator[tuple]:
+    """Yield (path, metadata) for every WOOF file under sources, in walk order
+
+    Files are read and decoded on a pool of workers threads, at most
+    prefetch files ahead of the consumer, so I/O overlaps decoding while
+    memory stays bounded by prefetch files. metadata is None for files
+    without WOOF metadata or that cannot be read. With errors=True the
+    records are (path, metadata, error) instead, where error is the reason
+    a file could not be read, or None. With fields, each record is reduced
+    to those dotted field paths (see project).
+    """
+    if prefetch < 1:
+        raise ValueError(f"prefetch must be at least 1, got {prefetch}")
+    woof = woof or WOOFFormat()
+    paths = iter_woof_files(sources, extensions)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, prefetch)),
+                                  thread_name_prefix='woof-catalog')
+    try:
+        for path in paths:
+            pending.append((path, executor.submit(_read_metadata, woof, path)))
+            if len(pending) >= prefetch:
+                yield _finish(*pending.popleft(), fields, errors)
+        while pending:
+            yield _finish(*pending.popleft(), fields, errors)
+    finally:
+        # The consumer may stop early: drop queued reads, wait for running ones
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _finish(path: str, future, fields: Optional[Sequence[str]], errors: bool):
+    metadata, error = future.result()
+    if metadata is not None and fields:
+        metadata = project(metadata, fields)
+    return (path, metadata, error) if errors else (path, metadata)
+
+
+def write_ndjson(records: Iterable[tuple], output: TextIO = sys.stdout) -> Dict[str, int]:
+    """Write one {"path": ..., "metadata": ...} JSON line per record
+
+    records are (path, metadata) or (path, metadata, error) tuples (see
+    iter_metadata); lines of files that could not be read get an "error"
+    field too. Lines are flushed as they are written. Returns counts of
+    files, files with metadata and files that could not be read.
+    """
+    counts = {"files": 0, "with_metadata": 0, "errors": 0}
+    for path, metadata, *rest in records:
+        record = {"path": path, "metadata": metadata}
+        if rest and rest[0] is not None:
+            record["error"] = rest[0]
+            counts["errors"] += 1
+        output.write(json.dumps(record, separators=(',', ':')) + '\n')
+        output.flush()
+        counts["files"] += 1
+        counts["with_metadata"] += metadata is not None
+    return counts
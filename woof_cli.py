@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+WOOF Command Line Entry Point
+Answers `woof FILE --extract` with the standard library alone and hands
+every other command to woof_format.main
+"""
+
+import sys
+import json
+
+
+def _extract(path: str) -> None:
+    """Same output as `woof_format.py FILE --extract`"""
+    import woof_extract
+    try:
+        metadata = woof_extract.extract_file(path)
+    except Exception as e:
+        print(f"❌ Error extracting from {path}: {str(e)}")
+        return
+    if metadata:
+        print(f"✅ Successfully extracted metadata from {path}")
+        print(json.dumps(metadata, indent=2))
+    else:
+        print(f"❌ No WOOF metadata found in {path}")
+
+
+def main():
+    """Main command-line interface"""
+    args = sys.argv[1:]
+    if len(args) == 2 and '--extract' in args:
+        path = args[1 - args.index('--extract')]
+        if not path.startswith('-'):
+            _extract(path)
+            return
+
+    import woof_format
+    woof_format.main()
+
+
+if __name__ == "__main__":
+    main()
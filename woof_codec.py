@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+WOOF Payload Codecs
+Serialization and compression of WOOF metadata into the stored payload
+"""
+
+import bz2
+import json
+import lzma
+import math
+import zlib
+import struct
+from typing import Dict, Any, Optional
+
+# Compressors with their codec ID and level range (default level first)
+CODECS = {
+    'zlib': (0x01, 9, range(0, 10)),
+    'lzma': (0x02, 6, range(0, 10)),
+    'bz2': (0x03, 9, range(1, 10)),
+}
+ENCODINGS = ('json', 'binary')
+
+# Set in the codec ID when the metadata uses the compact binary encoding
+BINARY_FLAG = 0x04
+
+# Binary encoding version, written as its first byte
+BINARY_VERSION = 1
+
+# Strings stored as an index instead of inline text. The table is part of
+# the format: only ever append to it.
+BINARY_STRINGS = (
+    "version", "features", "brightness", "contrast", "edge_density", "mean_rgb",
+    "dimensions", "attention_maps", "avg_attention", "max_attention",
+    "attention_peaks", "focus_regions", "analysis", "mode", "approximate",
+    "row_stride", "sampled_pixels", "brightness_stderr", "ai_annotations",
+    "object_classes", "bounding_boxes", "class", "bbox", "confidence",
+    "preprocessing_params", "input_size", "normalization", "imagenet",
+    "llm_context", "scene_description", "visual_elements", "suggested_tags",
+    "model_hints", "recommended_models", "complexity_score",
+    "processing_priority", "high_detail", "puppy", "background",
+    "warm_lighting", "detailed_texture", "ResNet50", "CLIP", "YOLO",
+    "soft fur", "large eyes", "playful expression", "indoor setting", "cute",
+    "pet", "portrait", "indoor", "mixed content", "natural lighting", "general",
+    "image", "An adorable light brown puppy looking directly at the viewer",
+    "A general image with various visual elements",
+)
+_STRING_INDEX = {text: index for index, text in enumerate(BINARY_STRINGS)}
+
+# Value tags of the binary encoding
+_NULL, _FALSE, _TRUE = 0x00, 0x01, 0x02
+_UINT, _NEGINT = 0x03, 0x04
+_FLOAT32, _FLOAT64 = 0x05, 0x06
+_STR, _STR_REF = 0x07, 0x08
+_LIST, _DICT = 0x09, 0x0A
+# 0x10 + scale: a float stored as zigzag varint / 10**scale
+_DECIMAL = 0x10
+_MAX_SCALE = 15
+
+
+def encode_payload(metadata: Dict[str, Any], codec: str = 'zlib',
+                   level: Optional[int] = None, encoding: str = 'json') -> bytes:
+    """Serialize and compress metadata into a stored payload
+
+    JSON compressed with zlib is stored as a bare zlib stream, which is the
+    original payload format. Every other combination starts with a codec ID
+    byte: the compressor's ID, plus BINARY_FLAG for the binary encoding.
+    A zlib stream always starts with a byte whose low nibble is 8, so the
+    two cannot be confused.
+    """
+    codec_id, default_level, _ = CODECS[codec]
+    level = default_level if level is None else level
+
+    if encoding == 'binary':
+        data = encode_binary(metadata)
+        codec_id |= BINARY_FLAG
+    else:
+        data = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+
+    if codec == 'zlib':
+        compressed = zlib.compress(data, level=level)
+    elif codec == 'lzma':
+        compressed = lzma.compress(data, format=lzma.FORMAT_ALONE, preset=level)
+    else:
+        compressed = bz2.compress(data, compresslevel=level)
+
+    if codec_id == CODECS['zlib'][0]:
+        return compressed
+    return bytes([codec_id]) + compressed
+
+
+def decode_payload(payload: bytes) -> Any:
+    """Decompress and deserialize a stored payload
+
+    Raises ValueError (or the compressor's own error) for corrupt data.
+    """
+    if not payload:
+        raise ValueError("Empty payload")
+    if payload[0] & 0x0F == 8:
+        # Bare zlib stream: the original JSON payload
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+    codec_id, data = payload[0], payload[1:]
+    compressor = codec_id & ~BINARY_FLAG
+    if compressor == CODECS['zlib'][0]:
+        data = zlib.decompress(data)
+    elif compressor == CODECS['lzma'][0]:
+        data = lzma.decompress(data, format=lzma.FORMAT_ALONE)
+    elif compressor == CODECS['bz2'][0]:
+        data = bz2.decompress(data)
+    else:
+        raise ValueError(f"Unknown payload codec 0x{codec_id:02x}")
+
+    if codec_id & BINARY_FLAG:
+        return decode_binary(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def encode_binary(obj: Any) -> bytes:
+    """Encode a JSON-compatible object in the compact binary encoding
+
+    Known key names and strings become one-byte references, integers are
+    varints, and floats use the shortest exact form: a scaled decimal
+    integer, float32 or float64. Decoding gives the same result as a JSON
+    round trip.
+    """
+    out = bytearray([BINARY_VERSION])
+    _encode_value(obj, out)
+    return bytes(out)
+
+
+def decode_binary(data: bytes) -> Any:
+    """Decode the compact binary encoding"""
+    if not data or data[0] != BINARY_VERSION:
+        raise ValueError("Unsupported binary metadata version")
+    try:
+        value, pos = _decode_value(data, 1)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Truncated or corrupt binary metadata: {e}")
+    if pos != len(data):
+        raise ValueError("Trailing bytes after binary metadata")
+    return value
+
+
+def _write_varint(value: int, out: bytearray):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _encode_string(text: str, out: bytearray):
+    index = _STRING_INDEX.get(text)
+    if index is not None:
+        out.append(_STR_REF)
+        _write_varint(index, out)
+    else:
+        encoded = text.encode('utf-8')
+        out.append(_STR)
+        _write_varint(len(encoded), out)
+        out += encoded
+
+
+def _encode_float(value: float, out: bytearray):
+    candidates = []
+    if math.isfinite(value) and not (value == 0 and math.copysign(1.0, value) < 0):
+        text = repr(value)
+        if 'e' not in text:
+            whole, _, fraction = text.partition('.')
+            fraction = fraction.rstrip('0')
+            if len(fraction) <= _MAX_SCALE:
+                scaled = int(whole + fraction)
+                if scaled / 10 ** len(fraction) == value:
+                    encoded = bytearray([_DECIMAL + len(fraction)])
+                    _write_varint(scaled * 2 if scaled >= 0 else -scaled * 2 - 1, encoded)
+                    candidates.append(encoded)
+    try:
+        single = struct.pack('<f', value)
+    except OverflowError:
+        single = None
+    if single is not None and struct.unpack('<f', single)[0] == value:
+        candidates.append(bytes([_FLOAT32]) + single)
+    else:
+        candidates.append(bytes([_FLOAT64]) + struct.pack('<d', value))
+    out += min(candidates, key=len)
+
+
+def _encode_value(value: Any, out: bytearray):
+    if value is None:
+        out.append(_NULL)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        out.append(_UINT if value >= 0 else _NEGINT)
+        _write_varint(value if value >= 0 else -value - 1, out)
+    elif isinstance(value, float):
+        _encode_float(value, out)
+    elif isinstance(value, str):
+        _encode_string(value, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(len(value), out)
+        for item in value:
+            _encode_value(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(len(value), out)
+        for key, item in value.items():
+            # Non-string keys become strings, as in JSON
+            _encode_string(key if isinstance(key, str) else json.dumps(key), out)
+            _encode_value(item, out)
+    else:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_value(data: bytes, pos: int):
+    tag = data[pos]
+    pos += 1
+    if tag == _NULL:
+        return None, pos
+    if tag in (_FALSE, _TRUE):
+        return tag == _TRUE, pos
+    if tag in (_UINT, _NEGINT):
+        value, pos = _read_varint(data, pos)
+        return (value if tag == _UINT else -value - 1), pos
+    if tag == _FLOAT32:
+        return struct.unpack_from('<f', data, pos)[0], pos + 4
+    if tag == _FLOAT64:
+        return struct.unpack_from('<d', data, pos)[0], pos + 8
+    if tag in (_STR, _STR_REF):
+        return _decode_string(data, pos - 1)
+    if tag == _LIST:
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        count, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _decode_string(data, pos)
+            result[key], pos = _decode_value(data, pos)
+        return result, pos
+    if _DECIMAL <= tag <= _DECIMAL + _MAX_SCALE:
+        zigzag, pos = _read_varint(data, pos)
+        scaled = zigzag >> 1 if not zigzag & 1 else -(zigzag >> 1) - 1
+        return scaled / 10 ** (tag - _DECIMAL), pos
+    raise ValueError(f"Unknown binary metadata tag 0x{tag:02x}")
+
+
+def _decode_string(data: bytes, pos: int):
+    tag = data[pos]
+    pos += 1
+    if tag == _STR_REF:
+        index, pos = _read_varint(data, pos)
+        if index >= len(BINARY_STRINGS):
+            raise ValueError(f"Unknown string reference {index}")
+        return BINARY_STRINGS[index], pos
+    if tag != _STR:
+        raise ValueError(f"Expected a string, found tag 0x{tag:02x}")
+    length, pos = _read_varint(data, pos)
+    if pos + length > len(data):
+        raise IndexError("string runs past the end of the data")
+    return data[pos:pos + length].decode('utf-8'), pos + length
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+WOOF Object Detection
+Detector backends for generate_ai_annotations: local CPU models run in
+batches, with results cached by pixel content
+"""
+
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from woof_cache import BoundedCache, content_hash, file_content_hash, pixel_hash
+
+# A raw detection: (class id or name, score, (x1, y1, x2, y2) relative to the image)
+RawDetection = Tuple[Any, float, Tuple[float, float, float, float]]
+
+
+class DetectionCache(BoundedCache):
+    """Bounded LRU of detector results keyed by detector and pixel hash
+
+    With db_path the results are also stored in SQLite, so they are shared
+    by batch worker processes and kept between runs.
+    """
+
+    TABLE = 'detections'
+    COLUMNS = ('detections TEXT',)
+
+    def __init__(self, max_entries: int = 65536, db_path: Optional[str] = None):
+        # Entries: key -> (detections JSON,)
+        super().__init__(max_entries, db_path=db_path)
+
+    def __getstate__(self):
+        return {"max_entries": self.max_entries, "db_path": self.db_path}
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached detections for key, or None"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(entry[0])
+
+    def put(self, key: str, detections: List[Dict[str, Any]]):
+        """Store the detections for key"""
+        with self._lock:
+            self._store(key, (json.dumps(detections, separators=(',', ':')),))
+
+
+class PreparedImage:
+    """An image ready for Detector.run: its cache key and size, and either
+    its cached detections or the model input"""
+
+    __slots__ = ('key', 'size', 'cached', 'input')
+
+    def __init__(self, key: str, size: Tuple[int, int], cached=None, model_input=None):
+        self.key = key
+        self.size = size
+        self.cached = cached
+        self.input = model_input
+
+
+def resize_rgb(pixels: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """RGB pixels resized to size (width, height) as a uint8 array
+
+    Large images are first subsampled by an integer step down to about
+    twice the target size, so only a small copy is ever made.
+    """
+    height, width = pixels.shape[:2]
+    step = max(1, min(width // (2 * size[0]), height // (2 * size[1])))
+    small = np.ascontiguousarray(pixels[::step, ::step, :3])
+    return np.asarray(Image.fromarray(small, 'RGB').resize(size, Image.Resampling.BILINEAR))
+
+
+def parse_detection_rows(rows: np.ndarray, batch: int) -> List[List[RawDetection]]:
+    """Split SSD DetectionOutput rows [image, class, score, x1, y1, x2, y2]
+    (coordinates relative to the image) into one list per image"""
+    results = [[] for _ in range(batch)]
+    for image_id, class_id, score, x1, y1, x2, y2 in np.asarray(rows, dtype=np.float64).reshape(-1, 7):
+        if 0 <= image_id < batch:
+            results[int(image_id)].append((int(class_id), float(score), (x1, y1, x2, y2)))
+    return results
+
+
+class Detector(ABC):
+    """Base class of detector backends
+
+    Subclasses must implement the abstract methods load(), returning the
+    model, preprocess(), turning an RGB array into one model input, and
+    infer(), running the model once on a list of inputs and returning a
+    list of RawDetection per input; a subclass missing one cannot be
+    instantiated.
+
+    The model is loaded on first use and kept for later calls. It is not
+    pickled, so a detector can be handed to batch worker processes, each of
+    which loads it once. Results are cached by pixel hash (see
+    DetectionCache), and images repeated within a batch are inferred once.
+    """
+
+    def __init__(self, labels: Optional[Sequence[str]] = None, score_threshold: float = 0.5,
+                 batch_size: int = 8, cache: Optional[DetectionCache] = None):
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        self.labels = list(labels) if labels else None
+        self.score_threshold = score_threshold
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else DetectionCache()
+        self.inferences = 0       # Model calls
+        self.inferred_images = 0  # Images passed to the model
+        self._model = None
+        self._lock = threading.Lock()
+        self._file_digests = {}  # path -> ((size, mtime_ns), content hash)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_model'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def identity(self) -> str:
+        """Part of the cache key that distinguishes this detector's results
+
+        Covers the class, score threshold and labels. Subclasses add their
+        model file's contents and preprocessing settings, and must include
+        anything else the results depend on.
+        """
+        return f"{type(self).__name__}:{self._digest(self.score_threshold, self.labels)}"
+
+    @staticmethod
+    def _digest(*settings) -> str:
+        """Short hash of settings' repr"""
+        return content_hash(repr(settings).encode())
+
+    @staticmethod
+    def _callable_name(func) -> Optional[str]:
+        """Stable name of a callable such as postprocess, or None"""
+        if func is None:
+            return None
+        return f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', type(func).__qualname__)}"
+
+    def _file_digest(self, path: str) -> str:
+        """Content hash of a model file, hashed again only when its size or mtime change"""
+        if not path:
+            return ''
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._file_digests.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, file_content_hash(path))
+            self._file_digests[path] = cached
+        return cached[1]
+
+    @abstractmethod
+    def load(self):
+        """Load and return the model"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def preprocess(self, pixels: np.ndarray):
+        """Model input for one (height, width, 3+) uint8 image"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def infer(self, model, inputs: List[Any]) -> List[List[RawDetection]]:
+        """Run the model once on inputs"""
+        raise NotImplementedError
+
+    @property
+    def model(self):
+        """The loaded model, loading it on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.load()
+        return self._model
+
+    def prepare(self, pixels: np.ndarray) -> PreparedImage:
+        """Hash an image and, unless its detections are cached, preprocess it"""
+        if pixels.ndim != 3 or pixels.shape[2] < 3:
+            raise ValueError(f"Cannot detect objects in an array of shape {pixels.shape}, need RGB")
+        rgb = pixels[:, :, :3]
+        key = f"{self.identity()}:{pixel_hash(rgb)}"
+        size = (pixels.shape[1], pixels.shape[0])
+        cached = self.cache.get(key)
+        if cached is not None:
+            return PreparedImage(key, size, cached=cached)
+        return PreparedImage(key, size, model_input=self.preprocess(rgb))
+
+    def run(self, prepared: Sequence[PreparedImage]) -> List[List[Dict[str, Any]]]:
+        """Detections for prepared images, in pixel coordinates
+
+        Images without cached results are inferred batch_size at a time.
+        Each detection is {"class", "bbox": [x1, y1, x2, y2], "confidence"},
+        strongest first.
+        """
+        results = [item.cached for item in prepared]
+        pending = OrderedDict()
+        for index, item in enumerate(prepared):
+            if item.cached is None:
+                pending.setdefault(item.key, []).append(index)
+
+        keys = list(pending)
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            outputs = self.infer(self.model, [prepared[pending[key][0]].input for key in batch])
+            self.inferences += 1
+            self.inferred_images += len(batch)
+            for key, raw in zip(batch, outputs):
+                detections = self._finish(raw)
+                self.cache.put(key, detections)
+                for index in pending[key]:
+                    results[index] = detections
+
+        return [self._to_pixels(detections, item.size) for detections, item in zip(results, prepared)]
+
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Detections for (height, width, 3+) uint8 arrays (see run)"""
+        return self.run([self.prepare(pixels) for pixels in images])
+
+    def _finish(self, raw: List[RawDetection]) -> List[Dict[str, Any]]:
+        """Thresholded, labelled detections with relative boxes, strongest first"""
+        detections = []
+        for class_id, score, box in raw:
+            if score < self.score_threshold:
+                continue
+            if isinstance(class_id, str):
+                name = class_id
+            elif self.labels and 0 <= class_id < len(self.labels):
+                name = self.labels[class_id]
+            else:
+                name = str(class_id)
+            detections.append({
+                "class": name,
+                "bbox": [min(max(float(v), 0.0), 1.0) for v in box],
+                "confidence": round(float(score), 4)
+            })
+        detections.sort(key=lambda detection: -detection["confidence"])
+        return detections
+
+    @staticmethod
+    def _to_pixels(detections: List[Dict[str, Any]], size: Tuple[int, int]) -> List[Dict[str, Any]]:
+        width, height = size
+        return [dict(detection, bbox=[int(round(x1 * width)), int(round(y1 * height)),
+                                      int(round(x2 * width)), int(round(y2 * height))])
+                for detection in detections
+                for x1, y1, x2, y2 in [detection["bbox"]]]
+
+
+class ONNXDetector(Detector):
+    """Detector running an ONNX model on the CPU with ONNX Runtime
+
+    The model takes a float32 NCHW batch of RGB images resized to
+    input_size, as (pixel - mean) * scale. Its first output holds detection
+    rows [image, class, score, x1, y1, x2, y2] relative to the image (the
+    SSD DetectionOutput layout). For other layouts pass postprocess, which
+    gets the raw outputs and the batch size and returns a list of
+    RawDetection per image. Models with a fixed batch dimension are run in
+    batches of that size.
+    """
+
+    def __init__(self, model_path: str, labels: Optional[Sequence[str]] = None,
+                 input_size: Tuple[int, int] = (300, 300), mean: float = 0.0,
+                 scale: float = 1 / 255, threads: int = 1, postprocess=None, **options):
+        super().__init__(labels, **options)
+        self.model_path = model_path
+        self.input_size = tuple(input_size)
+        self.mean = mean
+        self.scale = scale
+        self.threads = threads
+        self.postprocess = postprocess
+
+    def identity(self) -> str:
+        return f"onnx:{os.path.abspath(self.model_path)}:" + self._digest(
+            super().identity(), self._file_digest(self.model_path), self.input_size,
+            self.mean, self.scale, self._callable_name(self.postprocess))
+
+    def load(self):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("ONNXDetector requires onnxruntime (pip install onnxruntime)") from e
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        return onnxruntime.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+
+    def preprocess(self, pixels: np.ndarray) -> np.ndarray:
+        image = resize_rgb(pixels, self.input_size).astype(np.float32)
+        image -= self.mean
+        image *= self.scale
+        return image.transpose(2, 0, 1)
+
+    def infer(self, session, inputs: List[np.ndarray]) -> List[List[RawDetection]]:
+        model_input = session.get_inputs()[0]
+        step = model_input.shape[0] if isinstance(model_input.shape[0], int) else len(inputs)
+        results = []
+        for start in range(0, len(inputs), max(step, 1)):
+            batch = np.stack(inputs[start:start + step])
+            outputs = session.run(None, {model_input.name: batch})
+            if self.postprocess is not None:
+                results.extend(self.postprocess(outputs, len(batch)))
+            else:
+                results.extend(parse_detection_rows(outputs[0], len(batch)))
+        return results
+
+
+class OpenCVDetector(Detector):
+    """Detector running a model with OpenCV's DNN module on the CPU
+
+    model_path and config go to cv2.dnn.readNet, so Caffe, TensorFlow,
+    Darknet and ONNX files all load. Images are resized to input_size and
+    turned into a blob as (pixel - mean) * scale, swapping to BGR if
+    swap_rb is set. The network's output must be SSD DetectionOutput rows
+    (see ONNXDetector), or pass postprocess. OpenCV networks are not
+    thread-safe, so inference is serialized.
+    """
+
+    def __init__(self, model_path: str, config: str = '', labels: Optional[Sequence[str]] = None,
+                 input_size: Tuple[int, int] = (300, 300), mean: float = 0.0,
+                 scale: float = 1 / 255, swap_rb: bool = False, postprocess=None, **options):
+        super().__init__(labels, **options)
+        self.model_path = model_path
+        self.config = config
+        self.input_size = tuple(input_size)
+        self.mean = mean
+        self.scale = scale
+        self.swap_rb = swap_rb
+        self.postprocess = postprocess
+
+    def identity(self) -> str:
+        return f"opencv:{os.path.abspath(self.model_path)}:" + self._digest(
+            super().identity(), self._file_digest(self.model_path), self._file_digest(self.config),
+            self.input_size, self.mean, self.scale, self.swap_rb, self._callable_name(self.postprocess))
+
+    def load(self):
+        try:
+            import cv2
+        except ImportError as e:
+            raise ImportError("OpenCVDetector requires OpenCV (pip install opencv-python-headless)") from e
+        net = cv2.dnn.readNet(self.model_path, self.config)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+
+    def preprocess(self, pixels: np.ndarray) -> np.ndarray:
+        return resize_rgb(pixels, self.input_size)
+
+    def infer(self, net, inputs: List[np.ndarray]) -> List[List[RawDetection]]:
+        import cv2
+        blob = cv2.dnn.blobFromImages(inputs, self.scale, self.input_size,
+                                      (self.mean, self.mean, self.mean), self.swap_rb, False)
+        with self._lock:
+            net.setInput(blob)
+            outputs = net.forward()
+        if self.postprocess is not None:
+            return self.postprocess([outputs], len(inputs))
+        return parse_detection_rows(outputs, len(inputs))
+
+
+def load_detector(model_path: str, labels_path: Optional[str] = None, **options) -> Detector:
+    """Detector for a model file: ONNX Runtime for .onnx files, OpenCV DNN otherwise
+
+    labels_path names a text file with one class label per line, in class
+    id order. Other options go to the detector's constructor.
+    """
+    labels = None
+    if labels_path:
+        with open(labels_path, 'r', encoding='utf-8') as fh:
+            labels = [line.strip() for line in fh if line.strip()]
+    if os.path.splitext(model_path)[1].lower() == '.onnx':
+        return ONNXDetector(model_path, labels, **options)
+    return OpenCVDetector(model_path, labels=labels, **options)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+WOOF Lightweight Extraction
+Metadata extraction from WOOF PNGs using only the standard library, so
+that extracting never imports NumPy, PIL or the analysis code
+"""
+
+import zlib
+import lzma
+from typing import Dict, Any, Optional
+
+import woof_codec
+import woof_png
+
+# Format constants, shared with woof_format.WOOFFormat
+WOOF_HEADER = b'WOOF_STEG_V2'
+CHUNK_TYPE = b'woOF'
+CHUNK_HEADER = b'WOOF_CHUNK_V3'
+LAYOUT_HEADER = b'WOOF_STEG_V4'
+ALPHA_FLAG = 0x10
+LAYOUT_PAYLOAD_PIXEL = -(-(len(LAYOUT_HEADER) + 5) * 8 // 3)
+
+
+class _Unsupported(Exception):
+    """The PNG needs a full decoder: not 8-bit RGB(A), or interlaced"""
+
+
+class _PixelReader:
+    """Inflate and unfilter the leading rows of an 8-bit RGB(A) PNG on demand"""
+
+    def __init__(self, chunks):
+        width, height, bit_depth, color_type, interlace = woof_png.parse_ihdr(chunks)
+        if bit_depth != 8 or interlace or color_type not in woof_png.COLOR_TYPES:
+            raise _Unsupported()
+        self.width, self.height = width, height
+        self.mode, self.bpp = woof_png.COLOR_TYPES[color_type]
+        self.row_bytes = width * self.bpp
+        self._idats = (chunk.data for chunk in chunks if chunk.type == b'IDAT')
+        self._inflater = zlib.decompressobj()
+        self._filtered = bytearray()
+        self._pixels = bytearray()
+        self._prev = bytes(self.row_bytes)
+
+    def pixels(self, count: int) -> bytearray:
+        """Raw bytes of at least the first count pixels, in raster order"""
+        needed_rows = min(-(-count // self.width), self.height)
+        while len(self._pixels) < needed_rows * self.row_bytes:
+            line_size = self.row_bytes + 1
+            while len(self._filtered) < line_size:
+                data = self._inflater.unconsumed_tail or next(self._idats, None)
+                if data is None:
+                    raise ValueError("PNG image data ends early")
+                self._filtered += self._inflater.decompress(data, line_size * 16)
+            line = self._filtered[1:line_size]
+            _unfilter(self._filtered[0], line, self._prev, self.bpp)
+            del self._filtered[:line_size]
+            self._pixels += line
+            self._prev = line
+        return self._pixels
+
+    def lsb_bytes(self, start: int, count: int, bits_per_channel: int = 1,
+                  channels: int = 3, start_pixel: int = 0) -> bytes:
+        """Read count bytes at byte offset start of the LSB stream (see
+        WOOFFormat._read_lsb_bytes)"""
+        end_bit = (start + count) * 8
+        end_slot = -(-end_bit // bits_per_channel)
+        end_pixel = start_pixel + -(-end_slot // channels)
+        data = self.pixels(end_pixel)
+        mask = (1 << bits_per_channel) - 1
+        bits = []
+        for pixel in range(start_pixel, end_pixel):
+            offset = pixel * self.bpp
+            for value in data[offset:offset + channels]:
+                value &= mask
+                for shift in range(bits_per_channel - 1, -1, -1):
+                    bits.append((value >> shift) & 1)
+        bits = bits[start * 8:end_bit]
+        return int(''.join(map(str, bits)) or '0', 2).to_bytes(count, 'big')
+
+
+def _unfilter(filter_type: int, line: bytearray, prev: bytes, bpp: int) -> None:
+    """Undo the PNG filter of one scanline in place"""
+    n = len(line)
+    if filter_type == 1:
+        for i in range(bpp, n):
+            line[i] = (line[i] + line[i - bpp]) & 0xFF
+    elif filter_type == 2:
+        line[:] = bytes((a + b) & 0xFF for a, b in zip(line, prev))
+    elif filter_type == 3:
+        for i in range(n):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(n):
+            if i >= bpp:
+                a, c = line[i - bpp], prev[i - bpp]
+            else:
+                a = c = 0
+            b = prev[i]
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                line[i] = (line[i] + a) & 0xFF
+            elif pb <= pc:
+                line[i] = (line[i] + b) & 0xFF
+            else:
+                line[i] = (line[i] + c) & 0xFF
+    elif filter_type != 0:
+        raise ValueError(f"Unknown PNG filter type {filter_type}")
+
+
+def _decode(payload: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        return woof_codec.decode_payload(payload)
+    except (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError):
+        return None
+
+
+def _extract_png(data: bytes) -> Optional[Dict[str, Any]]:
+    """Decode the payload of a PNG; raises _Unsupported when pixels need PIL"""
+    chunks = woof_png.read_chunks(data)
+    for chunk in chunks:
+        if chunk.type == CHUNK_TYPE and chunk.data.startswith(CHUNK_HEADER):
+            return _decode(chunk.data[len(CHUNK_HEADER):])
+
+    reader = _PixelReader(chunks)
+    capacity = reader.width * reader.height * 3 // 8
+    size_start = len(WOOF_HEADER)
+    data_start = size_start + 4
+    if capacity < data_start + 1:
+        return None
+
+    header = reader.lsb_bytes(0, data_start + 1)
+    if header[:size_start] == WOOF_HEADER:
+        data_size = int.from_bytes(header[size_start:data_start], 'big')
+        if data_start + data_size > capacity:
+            return None
+        return _decode(reader.lsb_bytes(data_start, data_size))
+    if header[:size_start] != LAYOUT_HEADER:
+        return None
+
+    # V4 layout: layout byte and size in 1-bit RGB, then the payload
+    layout = header[size_start]
+    bits_per_channel = layout & 0x0F
+    channels = 4 if layout & ALPHA_FLAG else 3
+    if not 1 <= bits_per_channel <= 4 or (channels == 4 and reader.mode != 'RGBA'):
+        return None
+    data_size = int.from_bytes(reader.lsb_bytes(size_start + 1, 4), 'big')
+    slots = -(-data_size * 8 // bits_per_channel)
+    if LAYOUT_PAYLOAD_PIXEL + -(-slots // channels) > reader.width * reader.height:
+        return None
+    return _decode(reader.lsb_bytes(0, data_size, bits_per_channel, channels, LAYOUT_PAYLOAD_PIXEL))
+
+
+def extract_bytes(data: bytes) -> Optional[Dict[str, Any]]:
+    """Extract WOOF metadata from file contents, or None if there is none
+
+    8-bit RGB and RGBA PNGs are read here with the standard library alone;
+    anything else is handed to WOOFFormat.extract_bytes, importing the full
+    implementation only then. Errors are raised to the caller.
+    """
+    if data.startswith(woof_png.PNG_SIGNATURE):
+        try:
+            return _extract_png(data)
+        except _Unsupported:
+            pass
+    from woof_format import WOOFFormat
+    return WOOFFormat().extract_bytes(data)
+
+
+def extract_file(path: str) -> Optional[Dict[str, Any]]:
+    """Extract WOOF metadata from a file (see extract_bytes)"""
+    with open(path, 'rb') as fh:
+        return extract_bytes(fh.read())
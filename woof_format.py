@@ -4,85 +4,756 @@ WOOF Format Implementation
 Web Optimized Object Format - A steganographic image format for AI workflows
 """
 
+import io
 import os
+import copy
 import sys
 import json
+import time
+import lzma
 import zlib
 import numpy as np
-from PIL import Image
-import argparse
-from typing import Dict, Any, Tuple, Optional
+from PIL import Image, PngImagePlugin
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple, Optional, Callable, List
+import woof_codec
+import woof_extract
+import woof_png
+import woof_raw
+
+class _NullStage:
+    """Shared no-op stage used when no stage hooks are registered"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+    
+    def set(self, **info):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """Times one pipeline stage and reports it to the stage hooks on exit"""
+    
+    def __init__(self, hooks: List[Callable[[Dict[str, Any]], None]], name: str, info: Dict[str, Any]):
+        self.hooks = hooks
+        self.info = info
+        self.info["stage"] = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.info["seconds"] = time.perf_counter() - self.start
+        self.info["ok"] = exc_type is None
+        for hook in self.hooks:
+            hook(self.info)
+        return False
+    
+    def set(self, **info):
+        """Attach sizes or other details to the stage event"""
+        self.info.update(info)
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a JSON merge patch (RFC 7396) and return the result
+    
+    Objects are merged recursively and a None value removes the key; any
+    other value replaces the original. The target is not modified.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def _as_bytes(source) -> bytes:
+    """Contents of a bytes-like object or binary file object, copying only if needed"""
+    if hasattr(source, 'read'):
+        return source.read()
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, memoryview) and isinstance(source.obj, bytes) and source.nbytes == len(source.obj):
+        return source.obj
+    return bytes(source)
+
+
+class ImageContext:
+    """A decoded image shared by the analysis and embedding stages
+    
+    array is the only full-size copy of the pixels, made on first use and
+    filled strip by strip from the image; memory-mapped RawImage pixels are
+    used as they are. The RGB view, the gray plane and the pixel statistics
+    are derived from it once and cached, as is the pixel hash used to find
+    duplicate inputs. allocated_bytes counts the pixel planes the context
+    has allocated.
+    """
+    
+    # Pixels copied out of a PIL image per step
+    COPY_STRIP_PIXELS = 1 << 18
+    
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self.size = image.size
+        self.mode = image.mode
+        self.allocated_bytes = 0
+        self._array = None
+        self._gray = None
+        self._stats = {}
+        self._pixel_hash = None
+    
+    def release(self, image: bool = False) -> None:
+        """Drop the pixel array and gray plane, and with image=True the image
+        too; cached statistics and the pixel hash are kept"""
+        self._array = None
+        self._gray = None
+        if image:
+            self.image = None
+    
+    @classmethod
+    def of(cls, image) -> 'ImageContext':
+        """image itself if it already is a context, otherwise a new context for it"""
+        return image if isinstance(image, cls) else cls(image)
+    
+    def allocate(self, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        """Uninitialized array counted in allocated_bytes"""
+        plane = np.empty(shape, dtype=dtype)
+        self.allocated_bytes += plane.nbytes
+        return plane
+    
+    @property
+    def array(self) -> np.ndarray:
+        """The pixels as a uint8 array of shape (height, width[, channels])"""
+        if self._array is None:
+            if isinstance(self.image, woof_raw.RawImage):
+                self._array = np.asarray(self.image)
+            elif self.mode in ('L', 'RGB', 'RGBA'):
+                # Strip by strip, so no second full-size buffer is ever needed
+                width, height = self.size
+                bands = len(self.mode)
+                pixels = self.allocate((height, width) + ((bands,) if bands > 1 else ()), np.uint8)
+                rows = max(1, self.COPY_STRIP_PIXELS // max(width, 1))
+                for top in range(0, height, rows):
+                    bottom = min(top + rows, height)
+                    pixels[top:bottom] = np.asarray(self.image.crop((0, top, width, bottom)))
+                self._array = pixels
+            else:
+                self._array = np.asarray(self.image)
+                self.allocated_bytes += self._array.nbytes
+        return self._array
+    
+    @property
+    def rgb(self) -> np.ndarray:
+        """View of the red, green and blue channels of array"""
+        return self.array[:, :, :3]
+    
+    @property
+    def gray(self) -> np.ndarray:
+        """Float32 plane of the mean of the RGB channels"""
+        if self._gray is None:
+            rgb = self.rgb
+            gray = self.allocate(rgb.shape[:2])
+            rows = max(1, self.COPY_STRIP_PIXELS // max(self.size[0], 1))
+            for top in range(0, gray.shape[0], rows):
+                strip = gray[top:top + rows]
+                np.sum(rgb[top:top + rows], axis=2, dtype=np.float32, out=strip)
+                strip /= 3
+            self._gray = gray
+        return self._gray
+    
+    def pixel_hash(self) -> str:
+        """BLAKE2b digest of array as RGBA (see woof_cache.pixel_hash), computed
+        once; a mapped RGB image and its decoded RGBA form hash the same"""
+        if self._pixel_hash is None:
+            from woof_cache import pixel_hash
+            self._pixel_hash = pixel_hash(self.array, as_rgba=True)
+        return self._pixel_hash
+
 
 class WOOFFormat:
     """Main WOOF format handler with steganographic capabilities"""
     
-    WOOF_HEADER = b'WOOF_STEG_V2'
+    WOOF_HEADER = woof_extract.WOOF_HEADER
     VERSION = 2
     
-    def __init__(self):
-        self.supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']
+    # V3 storage: payload in a private, unsafe-to-copy PNG ancillary chunk
+    CHUNK_TYPE = woof_extract.CHUNK_TYPE
+    CHUNK_HEADER = woof_extract.CHUNK_HEADER
+    STORAGE_MODES = ('lsb', 'chunk', 'both')
+    
+    # V4 LSB layout: header, layout byte (bits per channel | alpha flag) and
+    # size in 1-bit RGB, then the payload from LAYOUT_PAYLOAD_PIXEL onwards
+    LAYOUT_HEADER = woof_extract.LAYOUT_HEADER
+    ALPHA_FLAG = woof_extract.ALPHA_FLAG
+    LAYOUT_PAYLOAD_PIXEL = woof_extract.LAYOUT_PAYLOAD_PIXEL
+    
+    # Files written with reserve_bytes record the number of rewritable head
+    # rows in this private chunk (see update_woof)
+    RESERVE_CHUNK_TYPE = b'woRS'
     
-    def analyze_image_features(self, image: Image.Image) -> Dict[str, Any]:
-        """Extract AI-relevant features from the image"""
-        img_array = np.array(image)
+    # Focus region selection: first hits in raster order, or strongest peaks
+    FOCUS_MODES = ('raster', 'peaks')
+    FOCUS_STRIP_PIXELS = 1 << 18  # Attention values thresholded per step
+    FOCUS_MAX_BLOCKS = 4096       # Block grid size for peak selection
+    FOCUS_MIN_BLOCK = 8
+    
+    # Pixels per strip of the strip-wise pixel statistics
+    ANALYSIS_STRIP_PIXELS = 1 << 18
+    # Approximate mode samples at least this many row (and column) pairs;
+    # smaller budgets analyze every pixel. Pair offsets are seeded, so the
+    # same image always gives the same statistics.
+    ANALYSIS_MIN_PAIRS = 32
+    ANALYSIS_SEED = 0
+    
+    # PNG encoder settings per profile: zlib level, zlib strategy and PIL's
+    # optimize flag (a slower, more thorough choice of row filters)
+    PNG_PROFILES = {
+        'fast': (1, zlib.Z_RLE, False),
+        'balanced': (6, zlib.Z_FILTERED, False),
+        'smallest': (9, zlib.Z_FILTERED, True),
+    }
+    
+    def __init__(self, analysis_budget: Optional[int] = None, metadata_cache=None,
+                 storage: str = 'lsb', bits_per_channel: int = 1, use_alpha: bool = False,
+                 stage_hooks: Optional[List[Callable[[Dict[str, Any]], None]]] = None,
+                 codec: str = 'zlib', compression_level: Optional[int] = None,
+                 encoding: str = 'json', reserve_bytes: int = 0,
+                 focus_mode: str = 'raster', max_focus_regions: int = 10,
+                 memory_map: bool = True, analysis_threads: Optional[int] = 1,
+                 png_profile: str = 'balanced', detector=None, conversion_cache=None):
+        if storage not in self.STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode {storage!r}, expected one of {self.STORAGE_MODES}")
+        if not 1 <= bits_per_channel <= 4:
+            raise ValueError(f"bits_per_channel must be between 1 and 4, got {bits_per_channel}")
+        if codec not in woof_codec.CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {tuple(woof_codec.CODECS)}")
+        levels = woof_codec.CODECS[codec][2]
+        if compression_level is not None and compression_level not in levels:
+            raise ValueError(f"{codec} compression level must be between {levels[0]} and "
+                             f"{levels[-1]}, got {compression_level}")
+        if encoding not in woof_codec.ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}, expected one of {woof_codec.ENCODINGS}")
+        if reserve_bytes < 0:
+            raise ValueError(f"reserve_bytes must not be negative, got {reserve_bytes}")
+        if focus_mode not in self.FOCUS_MODES:
+            raise ValueError(f"Unknown focus mode {focus_mode!r}, expected one of {self.FOCUS_MODES}")
+        if max_focus_regions < 1:
+            raise ValueError(f"max_focus_regions must be at least 1, got {max_focus_regions}")
+        if png_profile not in self.PNG_PROFILES:
+            raise ValueError(f"Unknown PNG profile {png_profile!r}, expected one of {tuple(self.PNG_PROFILES)}")
+        if analysis_budget is not None and analysis_budget <= 0:
+            raise ValueError(f"analysis_budget must be positive, got {analysis_budget}")
+        if analysis_threads is not None and analysis_threads < 1:
+            raise ValueError(f"analysis_threads must be at least 1, got {analysis_threads}")
+        self.supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.npy']
+        # Where save_woof puts the payload: pixel LSBs (V2), a woOF chunk (V3) or both
+        self.storage = storage
+        # LSB layout: anything but 1 bit per RGB channel is written as V4
+        self.bits_per_channel = bits_per_channel
+        self.use_alpha = use_alpha
+        # Maximum number of pixels analyzed per image; larger images are
+        # sampled in row and column pairs (approximate mode). None means exact.
+        self.analysis_budget = analysis_budget
+        # Optional woof_cache.MetadataCache consulted by extract_from_woof
+        self.metadata_cache = metadata_cache
+        # Callables receiving one event dict per timed pipeline stage
+        self.stage_hooks = list(stage_hooks or [])
+        # Payload codec (see woof_codec); extraction detects it from the payload
+        self.codec = codec
+        self.compression_level = compression_level
+        self.encoding = encoding
+        # Spare payload bytes kept in the separately compressed head rows of
+        # LSB files, so update_woof can rewrite them without re-encoding
+        self.reserve_bytes = reserve_bytes
+        # How many focus regions to report and how to pick them
+        self.focus_mode = focus_mode
+        self.max_focus_regions = max_focus_regions
+        # Map uncompressed BMP, TIFF and NPY inputs instead of decoding them
+        # (see woof_raw)
+        self.memory_map = memory_map
+        # Threads computing pixel statistics strip by strip; None means one
+        # per CPU. The result does not depend on the thread count.
+        self.analysis_threads = analysis_threads or os.cpu_count() or 1
+        # PNG encoding speed/size trade-off of written files (see PNG_PROFILES)
+        self.png_profile = png_profile
+        # Object detector (a woof_detect.Detector) behind object_classes and
+        # bounding_boxes; None keeps the built-in heuristic annotations
+        self.detector = detector
+        # Optional woof_cache.ConversionCache: convert_image reuses the
+        # metadata and output of pixel-identical inputs instead of analyzing
+        self.conversion_cache = conversion_cache
+    
+    def add_stage_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        """Register a callable that receives an event dict after each pipeline stage
         
-        # Basic image statistics
-        mean_rgb = np.mean(img_array[:, :, :3], axis=(0, 1))
-        brightness = np.mean(img_array[:, :, :3])
-        contrast = np.std(img_array[:, :, :3])
+        Events carry "stage", "seconds", "ok" and stage-specific sizes such as
+        "pixels", "metadata_bytes", "allocated_bytes" (pixel planes allocated
+        by create_metadata), "payload_bytes" or "output_bytes".
+        """
+        self.stage_hooks.append(hook)
+    
+    def remove_stage_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        """Unregister a stage hook"""
+        self.stage_hooks.remove(hook)
+    
+    def _stage(self, name: str, **info):
+        """Context manager timing a pipeline stage; free when no hooks are set"""
+        if not self.stage_hooks:
+            return _NULL_STAGE
+        return _Stage(self.stage_hooks, name, info)
+    
+    def _analysis_strides(self, width: int, height: int) -> Tuple[int, int]:
+        """Row and column pair sampling strides that keep the analyzed pixels
+        within budget; 1 means that axis is not sampled
         
-        # Edge density approximation
-        gray = np.mean(img_array[:, :, :3], axis=2)
-        edges = np.abs(np.diff(gray, axis=0)) + np.abs(np.diff(gray, axis=1))
-        edge_density = np.mean(edges)
+        Whole row pairs are sampled while the budget allows at least
+        ANALYSIS_MIN_PAIRS of them, otherwise ANALYSIS_MIN_PAIRS row pairs
+        and as many column pairs as fit. Images too short for that many row
+        pairs, and budgets too small for that many column pairs, are
+        analyzed in full: so few samples give no useful estimate or error
+        bound.
+        """
+        budget = self.analysis_budget
+        if not budget or width * height <= budget:
+            return 1, 1
+        min_pairs = self.ANALYSIS_MIN_PAIRS
+        # Two rows (columns) are analyzed out of every stride rows (columns)
+        row_pairs = budget // (2 * width)
+        if row_pairs >= min_pairs:
+            row_stride = -(-height // row_pairs)
+            if height // row_stride >= min_pairs:
+                return row_stride, 1
+        if height < 4 * min_pairs:
+            return 1, 1
+        row_stride = height // min_pairs
+        column_stride = -(-width // max(budget // (4 * (height // row_stride)), 1))
+        if width // column_stride < min_pairs:
+            return 1, 1
+        return row_stride, column_stride
+    
+    def _pair_index(self, length: int, stride: int) -> Optional[np.ndarray]:
+        """Indices of one pair of adjacent rows (columns) out of every stride,
+        or None for stride 1
         
-        # Attention map simulation
-        attention_map = self._generate_attention_map(img_array)
+        The axis is split into length // stride nearly equal blocks and each
+        block contributes the pair at a random offset within it, so every
+        row is equally likely to be sampled and the estimates are unbiased.
+        """
+        if stride <= 1:
+            return None
+        edges = np.linspace(0, length, length // stride + 1).round().astype(np.intp)
+        rng = np.random.default_rng([self.ANALYSIS_SEED, length, stride])
+        starts = edges[:-1] + rng.integers(0, edges[1:] - edges[:-1] - 1)
+        return np.stack([starts, starts + 1], axis=1).reshape(-1)
+    
+    def compute_pixel_stats(self, image: Image.Image,
+                            strides: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Compute every pixel statistic used by the metadata in a single pass
         
-        return {
+        image is a PIL image or an ImageContext; the statistics are cached in
+        the context, whose pixel array is the only copy of the image made.
+        All work happens in one float32 gray plane, processed in row strips
+        (see _strip_stats) on up to analysis_threads threads; NumPy releases
+        the GIL for the heavy loops. The result feeds analyze_image_features
+        and generate_ai_annotations.
+        
+        strides is (row stride, column stride), by default derived from
+        analysis_budget (see _analysis_strides). A stride above 1 analyzes
+        one pair of adjacent rows (columns) at a random offset in each block
+        of that many (see _pair_index); pairs keep both gradient directions
+        unbiased. Columns are only sampled along with rows. Focus regions
+        and peak counts are mapped back to full-resolution coordinates, and
+        the standard errors of brightness, contrast and edge density are
+        estimated treating row pairs as clusters.
+        """
+        context = ImageContext.of(image)
+        full_width, full_height = context.size
+        if strides is None:
+            strides = self._analysis_strides(full_width, full_height)
+        key = (strides, self.focus_mode, self.max_focus_regions)
+        if key in context._stats:
+            return context._stats[key]
+        
+        img_array = context.array
+        if img_array.ndim != 3 or img_array.shape[2] < 3:
+            raise ValueError(f"Cannot analyze {context.mode} image, convert to RGBA first")
+        
+        stride, column_stride = strides
+        row_index = column_index = None
+        if stride > 1 and full_height >= 2 * stride:
+            row_index = self._pair_index(full_height, stride)
+            if column_stride > 1 and full_width >= 2 * column_stride:
+                column_index = self._pair_index(full_width, column_stride)
+        if row_index is None:
+            stride = 1
+        elif column_index is None:
+            img_array = img_array[row_index]
+        else:
+            img_array = img_array[np.ix_(row_index, column_index)]
+        if column_index is None:
+            column_stride = 1
+        height, width, channels = img_array.shape
+        num_pixels = height * width
+        paired = row_index is not None
+        # Columns of the left pixel of each horizontal edge
+        edge_columns = slice(0, None, 2) if column_index is not None else slice(0, -1)
+        edge_count = width // 2 if column_index is not None else width - 1
+        
+        # The gray plane is filled strip by strip, on analysis_threads threads.
+        # Every partial result is either exact (integer sums, histograms) or
+        # kept per row and reduced in row order afterwards, so the result is
+        # the same for any number of threads. A full-resolution plane is kept
+        # as the context's gray plane.
+        if paired:
+            gray = context.allocate((height, width))
+        else:
+            gray = context._gray if context._gray is not None else context.allocate((height, width))
+        strip_rows = max(2, self.ANALYSIS_STRIP_PIXELS // max(width, 1)) & ~1
+        strips = [(top, min(top + strip_rows, height)) for top in range(0, height, strip_rows)]
+        executor = None
+        if self.analysis_threads > 1 and len(strips) > 1:
+            executor = ThreadPoolExecutor(max_workers=min(self.analysis_threads, len(strips)))
+        run = executor.map if executor else map
+        try:
+            partials = list(run(lambda strip: self._strip_stats(img_array, gray, *strip, paired,
+                                                                column_index is not None), strips))
+            
+            sums = np.sum([part[0] for part in partials], axis=0)
+            sums_sq = np.sum([part[1] for part in partials], axis=0)
+            row_means = np.concatenate([part[2] for part in partials])
+            edge_dx = np.concatenate([part[3] for part in partials])
+            edge_dy = np.concatenate([part[4] for part in partials])
+            histogram = np.sum([part[5] for part in partials], axis=0)
+            if channels == 3 and context.mode == 'RGBA':
+                # Mapped raw pixels lack the opaque alpha channel the output will have
+                sums = np.append(sums, 255.0 * num_pixels)
+                sums_sq = np.append(sums_sq, 255.0 ** 2 * num_pixels)
+                channels = 4
+            
+            mean_rgb = sums[:3] / num_pixels
+            brightness = sums[:3].sum() / (3 * num_pixels)
+            contrast = np.sqrt(max(sums_sq[:3].sum() / (3 * num_pixels) - brightness ** 2, 0.0))
+            mean_all = sums.sum() / (channels * num_pixels)
+            std_all = np.sqrt(max(sums_sq.sum() / (channels * num_pixels) - mean_all ** 2, 0.0))
+            
+            brightness_stderr = contrast_stderr = edge_density_stderr = 0.0
+            if paired:
+                brightness_stderr, contrast_stderr, edge_density_stderr = self._sampling_stderrs(
+                    img_array, gray, brightness, contrast, column_index is not None,
+                    (height / full_height, width / full_width))
+            
+            # Edge density: mean of |dy| + |dx| over the (H-1) x (W-1) overlap,
+            # or over the top row (left column) of each sampled pair. Vertical
+            # differences across strip boundaries need both strips, so they
+            # come last.
+            edge_density = 0.0
+            if height > 1 and width > 1:
+                if not paired:
+                    boundaries = [top - 1 for top, _ in strips[1:]]
+                    edge_dy[boundaries] = np.abs(gray[boundaries, edge_columns] -
+                                                 gray[[b + 1 for b in boundaries], edge_columns]
+                                                 ).sum(axis=1, dtype=np.float64)
+                edge_density = (edge_dy.sum() + edge_dx.sum()) / (edge_dx.size * edge_count)
+            
+            # Attention: distance of each gray value from the mean. Gray values
+            # are sums of three 8-bit channels over 3, so the histogram of those
+            # sums gives the exact attention distribution.
+            levels = np.arange(histogram.size, dtype=np.float32)
+            levels /= 3
+            level_attention = np.abs(np.subtract(levels, brightness, out=levels), out=levels)
+            level_attention /= 255.0
+            present = histogram > 0
+            threshold = self._histogram_percentile(level_attention[present], histogram[present], 90)
+            peak_count = int(histogram[level_attention > threshold].sum())
+        finally:
+            if executor:
+                executor.shutdown()
+        if not paired:
+            context._gray = gray
+        # Focus regions are located on attention computed from gray per strip
+        _, focus_regions = self._select_focus_regions(gray, threshold, row_index, peak_count,
+                                                      center=brightness, column_index=column_index)
+        
+        stats = context._stats[key] = {
+            "width": full_width,
+            "height": full_height,
+            "stride": stride,
+            "column_stride": column_stride,
+            "sampled_pixels": num_pixels,
+            "mean_rgb": mean_rgb,
             "brightness": float(brightness),
+            "brightness_stderr": float(brightness_stderr),
             "contrast": float(contrast),
+            "contrast_stderr": float(contrast_stderr),
+            "std_all": float(std_all),
             "edge_density": float(edge_density),
-            "mean_rgb": mean_rgb.tolist(),
-            "dimensions": list(image.size),
-            "attention_maps": attention_map
+            "edge_density_stderr": float(edge_density_stderr),
+            "avg_attention": float(np.dot(histogram, level_attention.astype(np.float64)) / num_pixels),
+            "max_attention": float(level_attention[present].max()),
+            "attention_peaks": int(round(peak_count * full_height * full_width / num_pixels)),
+            "focus_regions": focus_regions
         }
+        return stats
     
-    def _generate_attention_map(self, img_array: np.ndarray) -> Dict[str, Any]:
-        """Generate simulated attention maps for AI processing"""
-        height, width = img_array.shape[:2]
+    def _select_focus_regions(self, attention: np.ndarray, threshold: float,
+                              row_index: Optional[np.ndarray] = None,
+                              peak_count: Optional[int] = None,
+                              center: Optional[float] = None,
+                              column_index: Optional[np.ndarray] = None) -> Tuple[int, list]:
+        """Count the pixels above threshold and pick up to max_focus_regions as [x, y]
         
-        # Simulate attention based on brightness and contrast
-        gray = np.mean(img_array[:, :, :3], axis=2)
-        attention = np.abs(gray - np.mean(gray)) / 255.0
+        The attention plane is thresholded in row strips, so apart from the
+        result only one strip mask is allocated. In "raster" mode the first
+        hits in raster order are kept, in "peaks" mode the strongest ones.
+        If peak_count is already known, the scan stops once it has them.
+        With center given, attention is a gray plane and each strip's
+        attention is |gray - center| / 255 (see _attention_rows). row_index
+        and column_index map sampled rows and columns back to the image.
+        """
+        height, width = attention.shape
+        k = self.max_focus_regions
+        strip_rows = max(1, self.FOCUS_STRIP_PIXELS // width)
+        count_hits = peak_count is None
+        peak_count = peak_count or 0
+        regions = []
+        for top in range(0, height, strip_rows):
+            if not count_hits and (self.focus_mode == 'peaks' or len(regions) >= k):
+                break
+            mask = self._attention_rows(attention, top, top + strip_rows, center) > threshold
+            if count_hits:
+                peak_count += int(np.count_nonzero(mask))
+            if self.focus_mode == 'raster' and len(regions) < k:
+                hits = np.flatnonzero(mask)[:k - len(regions)]
+                regions.extend([int(i % width), top + int(i // width)] for i in hits)
         
-        # Find focus regions (high attention areas)
-        threshold = np.percentile(attention, 90)
-        focus_regions = np.where(attention > threshold)
+        if self.focus_mode == 'peaks':
+            regions = self._peak_regions(attention, threshold, k, center)
+        if row_index is not None:
+            regions = [[x, int(row_index[y])] for x, y in regions]
+        if column_index is not None:
+            regions = [[int(column_index[x]), y] for x, y in regions]
+        return peak_count, regions
+    
+    @staticmethod
+    def _attention_rows(plane: np.ndarray, top: int, bottom: int,
+                        center: Optional[float] = None) -> np.ndarray:
+        """Attention of rows top..bottom: the rows themselves, or with center
+        given, the distance of the gray rows from center over 255"""
+        rows = plane[top:bottom]
+        if center is None:
+            return rows
+        attention = np.empty(rows.shape, dtype=np.float32)
+        np.abs(np.subtract(rows, center, out=attention), out=attention)
+        attention /= 255.0
+        return attention
+    
+    def _strip_stats(self, img_array: np.ndarray, gray: np.ndarray, top: int, bottom: int,
+                     paired: bool, paired_columns: bool = False) -> Tuple[np.ndarray, ...]:
+        """Partial pixel statistics of rows top..bottom, filling those gray rows
         
+        Returns per-channel sums and sums of squares, per-row gray means,
+        per-row horizontal and vertical edge sums, and a histogram of the
+        per-pixel sums of the three colour channels. Edge rows are the top
+        row of each sampled pair when paired, otherwise every row but the
+        last; the vertical edge of a strip's last row is left at zero. Edges
+        are measured at the left column of each pair with paired_columns,
+        otherwise at every column but the last.
+        """
+        rows = img_array[top:bottom]
+        strip = gray[top:bottom]
+        scratch = np.empty(strip.shape, dtype=np.float32)
+        channels = rows.shape[2]
+        sums = np.empty(channels)
+        sums_sq = np.empty(channels)
+        strip.fill(0)
+        for c in range(channels):
+            np.copyto(scratch, rows[:, :, c])
+            sums[c] = scratch.sum(dtype=np.float64)
+            if c < 3:
+                strip += scratch
+            np.square(scratch, out=scratch)
+            sums_sq[c] = scratch.sum(dtype=np.float64)
+
+        histogram = np.bincount(strip.astype(np.int16).reshape(-1), minlength=3 * 255 + 1)
+        strip /= 3
+        row_means = strip.mean(axis=1, dtype=np.float64)
+        
+        # Edge rows in this strip and the rows below them
+        if paired:
+            upper, lower = strip[0::2], strip[1::2]
+        else:
+            upper, lower = strip[:min(bottom, gray.shape[0] - 1) - top], strip[1:]
+        left, right = (slice(0, None, 2), slice(1, None, 2)) if paired_columns else (slice(0, -1), slice(1, None))
+        edge_dx = np.zeros(upper.shape[0])
+        edge_dy = np.zeros(upper.shape[0])
+        if gray.shape[1] > 1:
+            edges = scratch[:upper.shape[0], :upper[:, left].shape[1]]
+            np.subtract(upper[:, right], upper[:, left], out=edges)
+            edge_dx = np.abs(edges, out=edges).sum(axis=1, dtype=np.float64)
+            edges = edges[:lower.shape[0]]
+            np.subtract(lower[:, left], upper[:lower.shape[0], left], out=edges)
+            edge_dy[:lower.shape[0]] = np.abs(edges, out=edges).sum(axis=1, dtype=np.float64)
+        return sums, sums_sq, row_means, edge_dx, edge_dy, histogram
+    
+    @staticmethod
+    def _sampling_stderrs(img_array: np.ndarray, gray: np.ndarray, brightness: float,
+                          contrast: float, paired_columns: bool,
+                          coverage: Tuple[float, float]) -> Tuple[float, float, float]:
+        """Standard errors of brightness, contrast and edge density estimated
+        from sampled row pairs (and column pairs)
+        
+        gray is the sampled gray plane and coverage the sampled fraction of
+        rows and columns. Each sampled axis contributes the variance between
+        its pair means, the pairs being clusters, with a finite population
+        correction; the contributions of both axes add up. Contrast is
+        linearized by the delta method. The sample is at most the pixel
+        budget, so the planes below are small.
+        """
+        height, width = gray.shape
+        squares = np.zeros(gray.shape, dtype=np.float32)
+        scratch = np.empty(gray.shape, dtype=np.float32)
+        for c in range(3):
+            np.copyto(scratch, img_array[:, :, c])
+            squares += np.square(scratch, out=scratch)
+        squares /= 3
+        upper, lower = gray[0::2], gray[1::2]
+        left, right = (slice(0, None, 2), slice(1, None, 2)) if paired_columns else (slice(0, -1), slice(1, None))
+        edges = np.abs(upper[:, right] - upper[:, left]) + np.abs(lower[:, left] - upper[:, left])
+        
+        variances = np.zeros(3)
+        axes = [(0, height // 2, lambda plane: plane.reshape(height // 2, -1).mean(axis=1), edges.mean(axis=1))]
+        if paired_columns:
+            axes.append((1, width // 2, lambda plane: plane.reshape(height, -1, 2).mean(axis=(0, 2)),
+                         edges.mean(axis=0)))
+        for axis, pairs, pair_means, edge_means in axes:
+            means = pair_means(gray)
+            linear = (pair_means(squares) - 2 * brightness * means) / (2 * contrast) if contrast > 0 else means * 0
+            scale = (1 - coverage[axis]) / pairs
+            variances += scale * np.array([means.var(ddof=1), linear.var(ddof=1),
+                                           edge_means.var(ddof=1) if edge_means.size > 1 else 0.0])
+        return tuple(float(error) for error in np.sqrt(variances))
+    
+    @staticmethod
+    def _histogram_percentile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+        """q-th percentile of a sample given as distinct values and their counts,
+        interpolated linearly between order statistics like np.percentile"""
+        order = np.argsort(values)
+        values, ends = values[order], np.cumsum(counts[order])
+        rank = q / 100 * (ends[-1] - 1)
+        below = int(np.floor(rank))
+        lower = float(values[np.searchsorted(ends, below, side='right')])
+        upper = float(values[np.searchsorted(ends, min(below + 1, ends[-1] - 1), side='right')])
+        gamma = rank - below
+        if gamma >= 0.5:
+            return upper - (upper - lower) * (1 - gamma)
+        return lower + (upper - lower) * gamma
+    
+    def _peak_regions(self, attention: np.ndarray, threshold: float, k: int,
+                      center: Optional[float] = None) -> list:
+        """Strongest above-threshold pixel of each of the k highest-scoring blocks
+        
+        A block-max reduction over a grid of at most about FOCUS_MAX_BLOCKS
+        blocks keeps the peaks spread over distinct regions; argpartition
+        then selects the top k blocks. Results are ordered strongest first.
+        """
+        height, width = attention.shape
+        if k <= 0 or attention.size == 0:
+            return []
+        block = max(self.FOCUS_MIN_BLOCK,
+                    int(np.ceil(np.sqrt(height * width / self.FOCUS_MAX_BLOCKS))))
+        col_starts = np.arange(0, width, block)
+        block_max = np.empty((-(-height // block), len(col_starts)), dtype=attention.dtype)
+        for i, top in enumerate(range(0, height, block)):
+            rows = self._attention_rows(attention, top, top + block, center)
+            block_max[i] = np.maximum.reduceat(rows.max(axis=0), col_starts)
+        
+        scores = block_max.reshape(-1)
+        k = min(k, scores.size)
+        best = np.argpartition(scores, scores.size - k)[scores.size - k:]
+        best = best[scores[best] > threshold]
+        best = best[np.lexsort((best, -scores[best]))]  # Strongest first, raster order on ties
+        
+        regions = []
+        for index in best:
+            top, left = divmod(int(index), block_max.shape[1])
+            top, left = top * block, left * block
+            tile = self._attention_rows(attention, top, top + block, center)[:, left:left + block]
+            y, x = np.unravel_index(np.argmax(tile), tile.shape)
+            regions.append([left + int(x), top + int(y)])
+        return regions
+    
+    def analyze_image_features(self, image: Image.Image,
+                               stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Extract AI-relevant features from the image or its ImageContext"""
+        if stats is None:
+            stats = self.compute_pixel_stats(image)
+        
+        features = {
+            "brightness": stats["brightness"],
+            "contrast": stats["contrast"],
+            "edge_density": stats["edge_density"],
+            "mean_rgb": stats["mean_rgb"].tolist(),
+            "dimensions": list(image.size),
+            "attention_maps": self._generate_attention_map(stats)
+        }
+        
+        if stats["stride"] > 1 or stats["column_stride"] > 1:
+            # Record how the statistics were sampled and how precise they are
+            features["analysis"] = {
+                "mode": "approximate",
+                "row_stride": stats["stride"],
+                "column_stride": stats["column_stride"],
+                "sampled_pixels": stats["sampled_pixels"],
+                "brightness_stderr": stats["brightness_stderr"],
+                "contrast_stderr": stats["contrast_stderr"],
+                "edge_density_stderr": stats["edge_density_stderr"],
+                # Estimated from the sample too, but without an error bound
+                "unbounded": ["attention_maps"]
+            }
+        
+        return features
+    
+    def _generate_attention_map(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate simulated attention maps for AI processing"""
         return {
-            "avg_attention": float(np.mean(attention)),
-            "max_attention": float(np.max(attention)),
-            "attention_peaks": len(focus_regions[0]),
-            "focus_regions": [
-                [int(focus_regions[1][i]), int(focus_regions[0][i])] 
-                for i in range(min(10, len(focus_regions[0])))
-            ]
+            "avg_attention": stats["avg_attention"],
+            "max_attention": stats["max_attention"],
+            "attention_peaks": stats["attention_peaks"],
+            "focus_regions": stats["focus_regions"]
         }
     
-    def generate_ai_annotations(self, image: Image.Image) -> Dict[str, Any]:
-        """Generate AI annotations and context for the image"""
-        # Simulate object detection results
-        img_array = np.array(image)
-        height, width = img_array.shape[:2]
+    def generate_ai_annotations(self, image: Image.Image,
+                                stats: Optional[Dict[str, Any]] = None,
+                                detections: Optional[list] = None) -> Dict[str, Any]:
+        """Generate AI annotations and context for the image or its ImageContext
         
-        # Simple object detection simulation
-        # In a real implementation, this would use actual AI models
-        objects = self._detect_objects_simulation(img_array)
+        Objects come from detections if given (see detect_objects), else
+        from the detector, else from a heuristic simulation.
+        """
+        if stats is None:
+            stats = self.compute_pixel_stats(image)
+        
+        if detections is None and self.detector is not None:
+            detections = self.detect_objects([image])[0]
+        if detections is not None:
+            objects = list(dict.fromkeys(detection["class"] for detection in detections))
+            boxes = detections
+        else:
+            # Simple object detection simulation
+            objects = self._detect_objects_simulation(stats)
+            boxes = self._generate_bounding_boxes(stats, objects)
         
         return {
             "object_classes": objects,
-            "bounding_boxes": self._generate_bounding_boxes(img_array, objects),
+            "bounding_boxes": boxes,
             "preprocessing_params": {
                 "mean_rgb": [0.485, 0.456, 0.406],
                 "input_size": [224, 224],
@@ -91,23 +762,61 @@ class WOOFFormat:
             "llm_context": self._generate_llm_context(image, objects)
         }
     
-    def _detect_objects_simulation(self, img_array: np.ndarray) -> list:
+    def detect_objects(self, images: List[Any], release: bool = False) -> List[list]:
+        """Run the detector on several images as one inference batch
+        
+        images are PIL images, RawImages or ImageContexts. Returns one list
+        of {"class", "bbox", "confidence"} detections per image. With
+        release=True, each context's pixel statistics are computed and its
+        pixel planes released as soon as its detector input is prepared, so
+        only one full-size array exists at a time.
+        """
+        return self.run_detection([self.prepare_detection(image, release) for image in images])
+    
+    def prepare_detection(self, image, release: bool = False):
+        """The small detector input of one image, for run_detection
+        
+        image is a PIL image, RawImage or ImageContext; release works as in
+        detect_objects.
+        """
+        if self.detector is None:
+            raise ValueError("No detector configured")
+        context = ImageContext.of(image)
+        if release:
+            self.compute_pixel_stats(context)
+        prepared = self.detector.prepare(context.array)
+        if release:
+            if self.conversion_cache is not None:
+                context.pixel_hash()  # Needed by convert_image, after the release
+            context.release()
+        return prepared
+    
+    def run_detection(self, prepared: List[Any]) -> List[list]:
+        """Detections for images from prepare_detection, as one inference batch"""
+        if self.detector is None:
+            raise ValueError("No detector configured")
+        with self._stage('detect', images=len(prepared)) as stage:
+            detections = self.detector.run(prepared)
+            stage.set(cached=sum(item.cached is not None for item in prepared))
+        return detections
+    
+    def _detect_objects_simulation(self, stats: Dict[str, Any]) -> list:
         """Simulate object detection - in real implementation, use actual AI models"""
         # This is a simplified simulation
         # Real implementation would use YOLO, Faster R-CNN, etc.
         objects = ["puppy", "background"]
         
         # Add more objects based on image characteristics
-        if np.mean(img_array[:, :, 0]) > 150:  # High red channel
+        if stats["mean_rgb"][0] > 150:  # High red channel
             objects.append("warm_lighting")
-        if np.std(img_array) > 50:  # High contrast
+        if stats["std_all"] > 50:  # High contrast
             objects.append("detailed_texture")
             
         return objects
     
-    def _generate_bounding_boxes(self, img_array: np.ndarray, objects: list) -> list:
+    def _generate_bounding_boxes(self, stats: Dict[str, Any], objects: list) -> list:
         """Generate simulated bounding boxes for detected objects"""
-        height, width = img_array.shape[:2]
+        width, height = stats["width"], stats["height"]
         boxes = []
         
         for obj in objects:
@@ -132,6 +841,10 @@ class WOOFFormat:
             scene_desc = "An adorable light brown puppy looking directly at the viewer"
             visual_elements = ["soft fur", "large eyes", "playful expression", "indoor setting"]
             suggested_tags = ["puppy", "cute", "pet", "portrait", "indoor"]
+        elif objects:
+            scene_desc = f"An image containing {', '.join(objects)}"
+            visual_elements = list(objects)
+            suggested_tags = list(objects)
         else:
             scene_desc = "A general image with various visual elements"
             visual_elements = ["mixed content", "natural lighting"]
@@ -143,10 +856,18 @@ class WOOFFormat:
             "suggested_tags": suggested_tags
         }
     
-    def create_metadata(self, image: Image.Image) -> Dict[str, Any]:
-        """Create complete WOOF metadata structure"""
-        features = self.analyze_image_features(image)
-        ai_annotations = self.generate_ai_annotations(image)
+    def create_metadata(self, image: Image.Image,
+                        detections: Optional[list] = None) -> Dict[str, Any]:
+        """Create complete WOOF metadata structure
+        
+        image is a PIL image or an ImageContext; every stage reads the
+        same context, so the pixels are copied into an array only once.
+        detections, if given, are the detector's results for the image.
+        """
+        context = ImageContext.of(image)
+        stats = self.compute_pixel_stats(context)
+        features = self.analyze_image_features(context, stats)
+        ai_annotations = self.generate_ai_annotations(context, stats, detections)
         
         return {
             "version": self.VERSION,
@@ -159,107 +880,519 @@ class WOOFFormat:
             }
         }
     
-    def embed_data(self, image: Image.Image, metadata: Dict[str, Any]) -> Image.Image:
-        """Embed metadata into image using LSB steganography"""
-        # Convert metadata to compressed bytes
-        metadata_json = json.dumps(metadata, separators=(',', ':'))
-        compressed_data = zlib.compress(metadata_json.encode('utf-8'), level=9)
+    def embed_data(self, image: Image.Image, metadata: Dict[str, Any],
+                   in_place: bool = False) -> Image.Image:
+        """Embed metadata into image using LSB steganography
+        
+        Only the pixel rows that hold the payload are converted to an array and
+        written back. With in_place=True the given image is modified and
+        returned instead of a copy, which keeps peak memory at one image.
+        image may be an ImageContext, whose image is then used.
+        """
+        if isinstance(image, ImageContext):
+            image = image.image
+        compressed_data = self._compress_metadata(metadata)
+        return self._embed_payload(image, compressed_data, in_place)
+    
+    def _compress_metadata(self, metadata: Dict[str, Any]) -> bytes:
+        """Serialize and compress metadata into the stored payload"""
+        return woof_codec.encode_payload(metadata, self.codec, self.compression_level, self.encoding)
+    
+    def _decompress_metadata(self, compressed_data: bytes) -> Optional[Dict[str, Any]]:
+        """Decode a stored payload with whichever codec wrote it, or None if it is corrupt"""
+        try:
+            return woof_codec.decode_payload(compressed_data)
+        except (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError):
+            return None
+    
+    def _embed_payload(self, image: Image.Image, compressed_data: bytes,
+                       in_place: bool = False) -> Image.Image:
+        """Write a compressed payload into the pixel LSBs
+        
+        The default layout (1 bit per RGB channel) is V2. Any other
+        bits_per_channel/use_alpha setting writes the V4 layout: the V4
+        header, a layout byte and the size in 1-bit RGB, followed by the
+        payload using the configured bits and channels.
+        """
+        if image.mode not in ('RGB', 'RGBA'):
+            raise ValueError(f"Cannot embed data in {image.mode} image, convert to RGBA first")
+        if self.use_alpha and image.mode != 'RGBA':
+            raise ValueError("Alpha-plane embedding requires an RGBA image")
         
-        # Prepare header and size information
-        header = self.WOOF_HEADER
+        width, height = image.size
         size_bytes = len(compressed_data).to_bytes(4, 'big')
-        full_data = header + size_bytes + compressed_data
+        channels = 4 if self.use_alpha else 3
         
-        # Convert to binary
-        data_bits = ''.join(format(byte, '08b') for byte in full_data)
+        if self.bits_per_channel == 1 and channels == 3:
+            # Prepare header and size information (V2)
+            header_bits = np.unpackbits(np.frombuffer(self.WOOF_HEADER + size_bytes, dtype=np.uint8))
+            payload_start = None
+        else:
+            layout = bytes([self.bits_per_channel | (self.ALPHA_FLAG if self.use_alpha else 0)])
+            header_bits = np.unpackbits(np.frombuffer(self.LAYOUT_HEADER + layout + size_bytes,
+                                                      dtype=np.uint8))
+            payload_start = self.LAYOUT_PAYLOAD_PIXEL
         
-        # Embed in image
-        img_array = np.array(image)
-        height, width = img_array.shape[:2]
+        # Convert to binary (MSB first, one bit per array element)
+        data_bits = np.unpackbits(np.frombuffer(compressed_data, dtype=np.uint8))
         
         # Check if image is large enough
-        max_bits = height * width * 3 * 2  # 2 LSBs per RGB channel
-        if len(data_bits) > max_bits:
-            raise ValueError(f"Image too small to embed data. Need {len(data_bits)} bits, have {max_bits}")
-        
-        # Embed data in LSBs
-        bit_index = 0
-        for y in range(height):
-            for x in range(width):
-                for c in range(3):  # RGB channels only
-                    if bit_index < len(data_bits):
-                        # Clear LSB and set new bit
-                        img_array[y, x, c] = (img_array[y, x, c] & 0xFE) | int(data_bits[bit_index])
-                        bit_index += 1
-                    else:
-                        break
-                if bit_index >= len(data_bits):
-                    break
-            if bit_index >= len(data_bits):
-                break
+        end_pixel = self._payload_end_pixel(len(compressed_data))
+        if payload_start is None:
+            data_bits = np.concatenate([header_bits, data_bits])
+            max_bits = height * width * 3  # 1 LSB per RGB channel
+        else:
+            max_bits = len(header_bits) + (height * width - payload_start) * channels * self.bits_per_channel
+        if end_pixel > width * height:
+            needed = len(data_bits) + (len(header_bits) if payload_start is not None else 0)
+            raise ValueError(f"Image too small to embed data. Need {needed} bits, have {max(max_bits, 0)}")
+        
+        # Embed data in the LSBs of the leading rows only
+        payload_rows = -(-end_pixel // width)
+        strip = np.array(image.crop((0, 0, width, payload_rows)))
+        if payload_start is None:
+            self._write_lsb_bits(strip, data_bits)
+        else:
+            self._write_lsb_bits(strip, header_bits)
+            self._write_lsb_bits(strip, data_bits, self.bits_per_channel, channels, payload_start)
+        
+        woof_image = image if in_place else image.copy()
+        woof_image.paste(Image.fromarray(strip), (0, 0))
+        return woof_image
+    
+    def _payload_end_pixel(self, payload_size: int) -> int:
+        """Number of leading pixels taken by the header and a payload of payload_size bytes"""
+        if self.bits_per_channel == 1 and not self.use_alpha:
+            return -(-(len(self.WOOF_HEADER) + 4 + payload_size) * 8 // 3)
+        slots = -(-payload_size * 8 // self.bits_per_channel)
+        return self.LAYOUT_PAYLOAD_PIXEL + -(-slots // (4 if self.use_alpha else 3))
+    
+    def _with_layout(self, layout: Tuple[int, bool]) -> 'WOOFFormat':
+        """Copy of this handler using the given (bits_per_channel, use_alpha) layout"""
+        writer = copy.copy(self)
+        writer.bits_per_channel, writer.use_alpha = layout
+        return writer
+    
+    def _write_lsb_bits(self, img_array: np.ndarray, data_bits: np.ndarray,
+                        bits_per_channel: int = 1, channels: int = 3,
+                        start_pixel: int = 0) -> None:
+        """Write bits into the low bits of img_array in place, in raster order
+        
+        Each channel slot takes bits_per_channel bits, most significant first;
+        a partially filled final slot is padded with zeros.
+        """
+        # (pixels, channels) view so the planes can be addressed without a copy
+        pixels = img_array.reshape(-1, img_array.shape[2])[:, :channels]
+        num_slots = -(-len(data_bits) // bits_per_channel)
+        num_pixels = -(-num_slots // channels)
+        region = pixels[start_pixel:start_pixel + num_pixels]
+        
+        if bits_per_channel == 1:
+            values = data_bits
+        else:
+            padded = np.zeros(num_slots * bits_per_channel, dtype=np.uint8)
+            padded[:len(data_bits)] = data_bits
+            values = np.packbits(padded.reshape(-1, bits_per_channel), axis=1)[:, 0]
+            values >>= 8 - bits_per_channel
+        
+        # Keep the existing low bits of the channels after the last payload slot
+        low_mask = (1 << bits_per_channel) - 1
+        lsbs = (region & low_mask).reshape(-1)
+        lsbs[:num_slots] = values
+        
+        region &= 0xFF ^ low_mask
+        region |= lsbs.reshape(region.shape)
+    
+    def _payload_chunk(self, compressed_data: bytes) -> PngImagePlugin.PngInfo:
+        """Build PNG save info carrying the payload in a woOF chunk before IDAT"""
+        pnginfo = PngImagePlugin.PngInfo()
+        pnginfo.add(self.CHUNK_TYPE, self.CHUNK_HEADER + compressed_data)
+        return pnginfo
+    
+    def _find_payload_chunk(self, chunks: List[woof_png.PNGChunk]) -> Optional[woof_png.PNGChunk]:
+        """The woOF payload chunk among a PNG's chunks, if it has one"""
+        return next((chunk for chunk in chunks if chunk.type == self.CHUNK_TYPE
+                     and chunk.data.startswith(self.CHUNK_HEADER)), None)
+    
+    def _read_chunk_payload(self, image: Image.Image) -> Optional[bytes]:
+        """Return the compressed payload from a woOF chunk, if the PNG has one
+        
+        PIL collects private chunks while reading the header, so this never
+        decodes image data.
+        """
+        for chunk in getattr(image, 'private_chunks', ()):
+            chunk_type, data = chunk[0], chunk[1]
+            if chunk_type == self.CHUNK_TYPE and data.startswith(self.CHUNK_HEADER):
+                return data[len(self.CHUNK_HEADER):]
+        return None
+    
+    def save_woof(self, image: Image.Image, metadata: Dict[str, Any], output,
+                  in_place: bool = False) -> None:
+        """Store metadata according to self.storage and write the result as PNG
+        
+        image may be an ImageContext, whose image is then written.
+        """
+        if isinstance(image, ImageContext):
+            image = image.image
+        with self._stage('compress') as stage:
+            compressed_data = self._compress_metadata(metadata)
+            stage.set(payload_bytes=len(compressed_data))
+        self._save_payload(image, compressed_data, output, self.storage, in_place)
+    
+    def _save_payload(self, image: Image.Image, compressed_data: bytes, output,
+                      storage: str, in_place: bool = False) -> None:
+        """Store an already compressed payload in the given storage mode and write the PNG"""
+        level, strategy, optimize = self.PNG_PROFILES[self.png_profile]
+        save_options = {'compress_level': level, 'compress_type': strategy, 'optimize': optimize}
+        raw = isinstance(image, woof_raw.RawImage)
+        head_rows = self._head_rows(image.size, len(compressed_data)) if storage != 'chunk' else 0
+        head = None
+        
+        if storage in ('lsb', 'both'):
+            with self._stage('embed', payload_bytes=len(compressed_data), storage=storage):
+                if raw:
+                    # Only the rows holding the payload are copied out of the mapping
+                    head = image.crop((0, 0, image.size[0], head_rows))
+                    self._embed_payload(head, compressed_data, in_place=True)
+                else:
+                    image = self._embed_payload(image, compressed_data, in_place)
+        if storage in ('chunk', 'both'):
+            save_options['pnginfo'] = self._payload_chunk(compressed_data)
+        
+        with self._stage('png_save', pixels=image.size[0] * image.size[1]) as stage:
+            start = output.tell() if hasattr(output, 'tell') else 0
+            if raw or (self.reserve_bytes and storage != 'chunk'
+                       and image.mode in woof_png.MODE_COLOR_TYPES):
+                self._save_segmented(image, head_rows, output, save_options, head)
+            else:
+                image.save(output, 'PNG', **save_options)
+            if self.stage_hooks:
+                end = output.tell() if hasattr(output, 'tell') else os.path.getsize(output)
+                stage.set(output_bytes=end - start)
+    
+    def _head_rows(self, size: Tuple[int, int], payload_size: int) -> int:
+        """Rows holding an LSB payload plus reserve_bytes of headroom"""
+        width, height = size
+        return min(height, -(-self._payload_end_pixel(payload_size + self.reserve_bytes) // width))
+    
+    def _save_segmented(self, image: Image.Image, head_rows: int, output,
+                        save_options: Dict[str, Any], head: Optional[Image.Image] = None) -> None:
+        """Write the PNG strip by strip, with the first head_rows rows in their
+        own IDAT segment recorded in a woRS chunk; head replaces those rows"""
+        before, after = woof_png.ancillary_chunks(image, pnginfo=save_options.get('pnginfo'))
+        level, strategy, optimize = self.PNG_PROFILES[self.png_profile]
+        if head_rows:
+            before.append(woof_png.make_chunk(self.RESERVE_CHUNK_TYPE, head_rows.to_bytes(4, 'big')))
+        
+        if hasattr(output, 'write'):
+            woof_png.write_segmented_png(image, output, head_rows, level, before, after, head,
+                                         strategy, optimize)
+        else:
+            with open(output, 'wb') as fh:
+                woof_png.write_segmented_png(image, fh, head_rows, level, before, after, head,
+                                             strategy, optimize)
+    
+    def _read_lsb_bytes(self, image: Image.Image, start: int, count: int,
+                        bits_per_channel: int = 1, channels: int = 3,
+                        start_pixel: int = 0) -> bytes:
+        """Read count bytes starting at byte offset start from the pixel low bits"""
+        width = image.size[0]
+        first_bit, end_bit = start * 8, (start + count) * 8
+        first_slot = first_bit // bits_per_channel
+        end_slot = -(-end_bit // bits_per_channel)
+        first_pixel = start_pixel + first_slot // channels
+        end_pixel = start_pixel + -(-end_slot // channels)
+        first_row, end_row = first_pixel // width, -(-end_pixel // width)
         
-        return Image.fromarray(img_array)
+        # Only convert the rows that hold the requested bits
+        rows = np.asarray(image.crop((0, first_row, width, end_row)))
+        pixels = rows.reshape(-1, rows.shape[2])[:, :channels]
+        pixel_offset = first_pixel - first_row * width
+        low_mask = (1 << bits_per_channel) - 1
+        slots = (pixels[pixel_offset:pixel_offset + end_pixel - first_pixel] & low_mask).reshape(-1)
+        
+        slot_offset = first_slot - (first_pixel - start_pixel) * channels
+        slots = slots[slot_offset:slot_offset + end_slot - first_slot]
+        if bits_per_channel == 1:
+            bits = slots
+        else:
+            bits = np.unpackbits(slots[:, np.newaxis], axis=1)[:, 8 - bits_per_channel:].reshape(-1)
+        
+        bit_offset = first_bit - first_slot * bits_per_channel
+        return np.packbits(bits[bit_offset:bit_offset + end_bit - first_bit]).tobytes()
     
     def extract_data(self, image: Image.Image) -> Optional[Dict[str, Any]]:
         """Extract embedded metadata from image"""
-        img_array = np.array(image)
-        height, width = img_array.shape[:2]
-        
-        # Extract LSBs
-        extracted_bits = ""
-        for y in range(height):
-            for x in range(width):
-                for c in range(3):
-                    extracted_bits += str(img_array[y, x, c] & 1)
-        
-        # Convert bits to bytes
-        extracted_bytes = bytearray()
-        for i in range(0, len(extracted_bits), 8):
-            if i + 8 <= len(extracted_bits):
-                byte_bits = extracted_bits[i:i+8]
-                extracted_bytes.append(int(byte_bits, 2))
-        
-        # Check for WOOF header
-        if len(extracted_bytes) < len(self.WOOF_HEADER):
+        with self._stage('extract', pixels=image.size[0] * image.size[1]) as stage:
+            metadata = self._extract_payload(image)
+            stage.set(found=metadata is not None)
+        return metadata
+    
+    def _extract_payload(self, image: Image.Image) -> Optional[Dict[str, Any]]:
+        """Decode the payload from a woOF chunk or from the pixel LSBs"""
+        # V3 chunk storage needs no pixel decoding at all
+        compressed_data = self._read_chunk_payload(image)
+        if compressed_data is not None:
+            return self._decompress_metadata(compressed_data)
+        
+        if image.mode not in ('RGB', 'RGBA'):
+            return None
+        
+        width, height = image.size
+        capacity = width * height * 3 // 8
+        
+        # Check for WOOF header before decoding anything else
+        size_start = len(self.WOOF_HEADER)
+        data_start = size_start + 4
+        if capacity < data_start + 1:
             return None
         
-        if extracted_bytes[:len(self.WOOF_HEADER)] != self.WOOF_HEADER:
+        header = self._read_lsb_bytes(image, 0, data_start + 1)
+        if header[:size_start] == self.LAYOUT_HEADER:
+            return self._extract_layout_payload(image, header[size_start])
+        if header[:size_start] != self.WOOF_HEADER:
             return None
         
         # Extract size and data
-        size_start = len(self.WOOF_HEADER)
-        size_bytes = extracted_bytes[size_start:size_start+4]
-        data_size = int.from_bytes(size_bytes, 'big')
+        data_size = int.from_bytes(header[size_start:data_start], 'big')
+        if data_start + data_size > capacity:
+            return None
         
-        data_start = size_start + 4
-        compressed_data = extracted_bytes[data_start:data_start+data_size]
+        compressed_data = self._read_lsb_bytes(image, data_start, data_size)
+        return self._decompress_metadata(compressed_data)
+    
+    def _lsb_layout(self, image: Image.Image) -> Optional[Tuple[int, bool]]:
+        """Return (bits_per_channel, use_alpha) of the image's LSB payload, or None"""
+        if image.mode not in ('RGB', 'RGBA') or image.size[0] * image.size[1] < self.LAYOUT_PAYLOAD_PIXEL:
+            return None
+        header = self._read_lsb_bytes(image, 0, len(self.WOOF_HEADER) + 1)
+        if header[:-1] == self.WOOF_HEADER:
+            return 1, False
+        if header[:-1] == self.LAYOUT_HEADER:
+            bits_per_channel, use_alpha = header[-1] & 0x0F, bool(header[-1] & self.ALPHA_FLAG)
+            if 1 <= bits_per_channel <= 4 and (not use_alpha or image.mode == 'RGBA'):
+                return bits_per_channel, use_alpha
+        return None
+    
+    def _extract_layout_payload(self, image: Image.Image, layout: int) -> Optional[Dict[str, Any]]:
+        """Decode a V4 payload whose layout byte has already been read"""
+        bits_per_channel = layout & 0x0F
+        channels = 4 if layout & self.ALPHA_FLAG else 3
+        if not 1 <= bits_per_channel <= 4 or (channels == 4 and image.mode != 'RGBA'):
+            return None
         
-        # Decompress and parse
-        try:
-            decompressed_data = zlib.decompress(bytes(compressed_data))
-            metadata = json.loads(decompressed_data.decode('utf-8'))
-            return metadata
-        except (zlib.error, json.JSONDecodeError):
+        size_start = len(self.LAYOUT_HEADER) + 1
+        data_size = int.from_bytes(self._read_lsb_bytes(image, size_start, 4), 'big')
+        
+        width, height = image.size
+        slots = -(-data_size * 8 // bits_per_channel)
+        if self.LAYOUT_PAYLOAD_PIXEL + -(-slots // channels) > width * height:
             return None
+        
+        compressed_data = self._read_lsb_bytes(image, 0, data_size, bits_per_channel,
+                                               channels, self.LAYOUT_PAYLOAD_PIXEL)
+        return self._decompress_metadata(compressed_data)
+    
+    def decode_image(self, image: Image.Image) -> Image.Image:
+        """Decode an opened image and convert it to RGBA if needed; mapped
+        raw images are returned as is"""
+        raw = isinstance(image, woof_raw.RawImage)
+        with self._stage('decode', pixels=image.size[0] * image.size[1], mode=image.mode, mapped=raw):
+            if not raw:
+                image.load()
+                if image.mode != 'RGBA':
+                    image = image.convert('RGBA')
+        return image
     
-    def convert_to_woof(self, input_path: str, output_path: str) -> bool:
-        """Convert any image to WOOF format"""
+    def convert_image(self, image: Image.Image, output,
+                      detections: Optional[list] = None) -> Dict[str, Any]:
+        """Analyze an opened image and write it as WOOF to a path or file object
+        
+        image may also be an ImageContext of an image already passed through
+        decode_image, and detections the detector's results for it (see
+        detect_objects). Returns the embedded metadata. The image may be
+        modified in place.
+        
+        With a conversion_cache, inputs whose decoded pixels and relevant
+        settings match an earlier conversion skip the analysis: its metadata
+        is reused, and its output bytes are written as they are if they
+        were small enough to be cached and written from the same form of
+        input (see _output_form).
+        """
+        if isinstance(image, ImageContext):
+            context = image
+        else:
+            context = ImageContext(self.decode_image(image))
+        
+        cache = self.conversion_cache
+        if cache is not None:
+            with self._stage('dedup') as stage:
+                key = self._conversion_key(context)
+                form = self._output_form(context)
+                cached = cache.get(key, form)
+                stage.set(hit=cached is not None)
+            if cached is not None:
+                metadata, data = cached
+                context.release()
+                self._write_cached(context, metadata, data, output)
+                return metadata
+            start_time = time.perf_counter()
+            start = output.tell() if hasattr(output, 'tell') else 0
+        
+        # Create metadata; all analysis stages share one context, so the
+        # pixels are copied into an array once
+        with self._stage('create_metadata') as stage:
+            metadata = self.create_metadata(context, detections)
+            if self.stage_hooks:
+                stage.set(metadata_bytes=len(json.dumps(metadata, separators=(',', ':'))),
+                          allocated_bytes=context.allocated_bytes)
+        if cache is not None:
+            analysis_seconds = time.perf_counter() - start_time
+        context.release()  # Free the array and gray plane before encoding
+        
+        # Embed metadata and save as PNG (WOOF files are valid PNGs);
+        # the decoded image is ours, so it is modified in place
+        self.save_woof(context.image, metadata, output, in_place=True)
+        
+        if cache is not None:
+            seconds = time.perf_counter() - start_time
+            data = self._written_output(output, start, cache.max_output_bytes)
+            cache.put(key, metadata, data, form, analysis_seconds, seconds)
+        return metadata
+    
+    def _conversion_key(self, context: ImageContext) -> str:
+        """Conversion cache key: the pixel hash plus everything else that shapes
+        the metadata or the written file"""
+        from woof_cache import content_hash
+        image = context.image
+        settings = self._output_settings() + (
+            # Ancillary chunks PIL copies into the PNG
+            [image.info.get(name) for name in ('icc_profile', 'transparency', 'exif')],
+        )
+        return f"{context.pixel_hash()}:{content_hash(repr(settings).encode())}"
+    
+    def _output_settings(self) -> tuple:
+        """The settings that shape the metadata and encoding of converted files"""
+        return (
+            self.VERSION, self.analysis_budget, self.focus_mode, self.max_focus_regions,
+            self.detector.identity() if self.detector is not None else None,
+            self.storage, self.bits_per_channel, self.use_alpha, self.codec,
+            self.compression_level, self.encoding, self.reserve_bytes, self.png_profile,
+        )
+    
+    def settings_digest(self) -> str:
+        """Hash of every setting that shapes converted files, including
+        memory_map (mapped inputs are written in their own channel layout);
+        batch checkpoints only reuse outputs written with the same digest"""
+        from woof_cache import content_hash
+        return content_hash(repr(self._output_settings() + (self.memory_map,)).encode())
+    
+    @staticmethod
+    def _output_form(context: ImageContext) -> str:
+        """How the input is written, which decides whether cached output bytes
+        can stand in for it: mapped raw pixels are written in their own
+        channel layout, decoded images as RGBA"""
+        if isinstance(context.image, woof_raw.RawImage):
+            return f"mapped:{context.image.pixels.shape[2]}"
+        return 'decoded'
+    
+    def _write_cached(self, context: ImageContext, metadata: Dict[str, Any],
+                      data: Optional[bytes], output) -> None:
+        """Write a conversion cache hit: the cached file, or the image with the cached metadata"""
+        if data is None:
+            self.save_woof(context.image, metadata, output, in_place=True)
+        elif hasattr(output, 'write'):
+            output.write(data)
+        else:
+            with open(output, 'wb') as fh:
+                fh.write(data)
+    
+    @staticmethod
+    def _written_output(output, start: int, limit: int) -> Optional[bytes]:
+        """The file convert_image just wrote, if it can be read back and is at most limit bytes"""
+        if isinstance(output, (str, os.PathLike)):
+            if os.path.getsize(output) > limit:
+                return None
+            with open(output, 'rb') as fh:
+                return fh.read()
+        if hasattr(output, 'getbuffer'):
+            with output.getbuffer() as view:
+                return bytes(view[start:]) if len(view) - start <= limit else None
+        return None
+    
+    def convert_bytes(self, source) -> Tuple[bytes, Dict[str, Any]]:
+        """Convert an encoded image held in memory to WOOF
+        
+        source is bytes, a bytearray or memoryview, or a binary file object.
+        Returns (WOOF PNG bytes, embedded metadata). Unlike convert_to_woof,
+        errors are raised to the caller.
+        """
+        stream = source if hasattr(source, 'read') else io.BytesIO(_as_bytes(source))
+        output = io.BytesIO()
+        metadata = self.convert_image(Image.open(stream), output)
+        return output.getvalue(), metadata
+    
+    def extract_bytes(self, source) -> Optional[Dict[str, Any]]:
+        """Extract metadata from a WOOF file held in memory, or None if it has none
+        
+        source is bytes, a bytearray or memoryview, or a binary file object.
+        PNG data is read chunk by chunk: a woOF chunk needs no pixel data,
+        and for an LSB payload only the rows holding it are inflated. Other
+        data is decoded with PIL. Errors are raised to the caller.
+        """
+        data = _as_bytes(source)
+        with self._stage('extract', input_bytes=len(data)) as stage:
+            if data.startswith(woof_png.PNG_SIGNATURE):
+                metadata = self._extract_png_bytes(data)
+            else:
+                metadata = self._extract_payload(Image.open(io.BytesIO(data)))
+            stage.set(found=metadata is not None)
+        return metadata
+    
+    def _extract_png_bytes(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """Decode the payload of a PNG file, inflating only the payload rows"""
+        chunks = woof_png.read_chunks(data)
+        payload_chunk = self._find_payload_chunk(chunks)
+        if payload_chunk is not None:
+            return self._decompress_metadata(payload_chunk.data[len(self.CHUNK_HEADER):])
+        
+        # The first LAYOUT_PAYLOAD_PIXEL pixels hold the header and payload size
+        width, height = woof_png.parse_ihdr(chunks)[:2]
+        head_rows = -(-self.LAYOUT_PAYLOAD_PIXEL // width)
+        head = woof_png.decode_rows(chunks, head_rows)
+        if head is None:
+            # Not 8-bit RGB(A), or interlaced
+            return self._extract_payload(Image.open(io.BytesIO(data)))
+        if head_rows < height:
+            layout = self._lsb_layout(head)
+            if layout is None:
+                return None
+            size_start = len(self.WOOF_HEADER) if layout == (1, False) else len(self.LAYOUT_HEADER) + 1
+            payload_size = int.from_bytes(self._read_lsb_bytes(head, size_start, 4), 'big')
+            rows = -(-self._with_layout(layout)._payload_end_pixel(payload_size) // width)
+            if rows > height:
+                return None
+            if rows > head_rows:
+                head = woof_png.decode_rows(chunks, rows)
+                if head is None:
+                    return None
+        return self._extract_payload(head)
+    
+    def open_image(self, input_path: str) -> Image.Image:
+        """Open an input for convert_image: memory-mapped if memory_map allows, else with PIL"""
+        image = woof_raw.open_raw(input_path) if self.memory_map else None
+        return image or Image.open(input_path)
+    
+    def convert_to_woof(self, input_path: str, output_path: str, image=None,
+                        detections: Optional[list] = None) -> bool:
+        """Convert any image to WOOF format
+        
+        image, if given, is input_path already opened or its ImageContext,
+        and detections its detector results (see convert_image).
+        """
         try:
-            # Load image
-            image = Image.open(input_path)
-            
-            # Convert to RGBA if needed
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-            
-            # Create metadata
-            metadata = self.create_metadata(image)
-            
-            # Embed metadata
-            woof_image = self.embed_data(image, metadata)
-            
-            # Save as PNG (WOOF files are valid PNGs)
-            woof_image.save(output_path, 'PNG')
+            metadata = self.convert_image(image if image is not None else self.open_image(input_path),
+                                          output_path, detections)
             
             print(f"✅ Successfully converted {input_path} to {output_path}")
             print(f"📊 Embedded {len(json.dumps(metadata))} bytes of AI metadata")
@@ -271,10 +1404,17 @@ class WOOFFormat:
             return False
     
     def extract_from_woof(self, input_path: str) -> Optional[Dict[str, Any]]:
-        """Extract metadata from WOOF file"""
+        """Extract metadata from WOOF file
+        
+        The file is read through extract_bytes, so PNGs are never fully
+        decoded: only the rows holding an LSB payload are inflated.
+        """
         try:
-            image = Image.open(input_path)
-            metadata = self.extract_data(image)
+            if self.metadata_cache is not None:
+                metadata = self._extract_cached(input_path)
+            else:
+                with open(input_path, 'rb') as fh:
+                    metadata = self.extract_bytes(fh.read())
             
             if metadata:
                 print(f"✅ Successfully extracted metadata from {input_path}")
@@ -286,19 +1426,370 @@ class WOOFFormat:
         except Exception as e:
             print(f"❌ Error extracting from {input_path}: {str(e)}")
             return None
+    
+    def _extract_cached(self, input_path: str) -> Optional[Dict[str, Any]]:
+        """Extract metadata through metadata_cache, decoding only on a miss"""
+        found, metadata = self.metadata_cache.get(input_path)
+        if found:
+            return metadata
+        
+        # Hash exactly the bytes that get decoded
+        stat = os.stat(input_path)
+        with open(input_path, 'rb') as fh:
+            data = fh.read()
+        metadata = self.extract_bytes(data)
+        
+        from woof_cache import content_hash
+        self.metadata_cache.put(input_path, metadata, content_hash(data), stat)
+        return metadata
+    
+    def update_woof(self, input_path: str, patch: Dict[str, Any],
+                    output_path: Optional[str] = None) -> bool:
+        """Apply a JSON merge patch to the metadata of a WOOF file
+        
+        The image is never re-analyzed. A woOF chunk is rewritten while the
+        rest of the file is copied as is. LSB payloads in files written with
+        reserve_bytes are rewritten by re-encoding only their head rows, as
+        long as the new payload fits the reserved capacity. Other LSB files
+        are decoded and re-encoded once, with the configured reserve_bytes.
+        The file's storage mode and LSB layout are kept; the payload is
+        written with this handler's codec. Writes to input_path when no
+        output_path is given.
+        """
+        import tempfile
+        try:
+            with open(input_path, 'rb') as fh:
+                data = fh.read()
+            
+            with self._stage('update', input_bytes=len(data)) as stage:
+                result = self._update_png(data, patch)
+                if result is not None:
+                    stage.set(method=result[1], output_bytes=len(result[0]))
+            if result is None:
+                print(f"❌ No WOOF metadata found in {input_path}")
+                return False
+            
+            output_path = output_path or input_path
+            # Written to a uniquely named file beside the output and moved
+            # into place, so concurrent updates never share a temporary file
+            # and a failure leaves the output untouched
+            existing = output_path if os.path.exists(output_path) else input_path
+            temp = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(output_path)),
+                                               prefix=os.path.basename(output_path) + '.',
+                                               suffix='.tmp', delete=False)
+            try:
+                with temp:
+                    temp.write(result[0])
+                # Keep the permissions of the file being replaced
+                os.chmod(temp.name, os.stat(existing).st_mode & 0o7777)
+                os.replace(temp.name, output_path)
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+            if self.metadata_cache is not None:
+                self.metadata_cache.invalidate(output_path)
+            
+            print(f"✅ Updated metadata in {output_path} ({result[1]} rewrite)")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error updating {input_path}: {str(e)}")
+            return False
+    
+    def _update_png(self, data: bytes, patch: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+        """Return (patched file contents, rewrite method), or None without WOOF metadata
+        
+        The method is "chunk" (woOF chunk only), "head" (reserved head rows)
+        or "full" (whole image re-encoded).
+        """
+        chunks = woof_png.read_chunks(data)
+        width, height = woof_png.parse_ihdr(chunks)[:2]
+        payload_chunk = self._find_payload_chunk(chunks)
+        reserve_chunk = next((chunk for chunk in chunks if chunk.type == self.RESERVE_CHUNK_TYPE), None)
+        
+        if reserve_chunk is not None:
+            head_rows = min(height, int.from_bytes(reserve_chunk.data[:4], 'big'))
+        else:
+            head_rows = -(-self.LAYOUT_PAYLOAD_PIXEL // width)
+        head = woof_png.decode_rows(chunks, head_rows)
+        if head is None:
+            return self._update_full(data, patch)
+        
+        layout = self._lsb_layout(head)
+        if layout is not None and reserve_chunk is None:
+            return self._update_full(data, patch)
+        if payload_chunk is not None:
+            metadata = self._decompress_metadata(payload_chunk.data[len(self.CHUNK_HEADER):])
+        elif layout is not None:
+            metadata = self._extract_payload(head)
+        else:
+            return None
+        if metadata is None:
+            return None
+        
+        compressed_data = self._compress_metadata(merge_patch(metadata, patch))
+        replacements = {}
+        if payload_chunk is not None:
+            replacements[payload_chunk.start] = woof_png.make_chunk(
+                self.CHUNK_TYPE, self.CHUNK_HEADER + compressed_data)
+        
+        method = 'chunk'
+        if layout is not None:
+            head_chunks = self._rewrite_head(chunks, head, head_rows, compressed_data, layout)
+            if head_chunks is None:
+                # Outgrew the reserved rows, or the file was rewritten by another tool
+                return self._update_full(data, patch)
+            replacements.update(head_chunks)
+            method = 'head'
+        
+        parts = [woof_png.PNG_SIGNATURE]
+        for chunk in chunks:
+            parts.append(replacements.get(chunk.start, chunk.raw))
+        return b''.join(parts), method
+    
+    def _rewrite_head(self, chunks: List[woof_png.PNGChunk], head: Image.Image, head_rows: int,
+                      compressed_data: bytes, layout: Tuple[int, bool]) -> Optional[Dict[int, bytes]]:
+        """Embed the payload in the head rows and return the replacement IDAT chunks
+        
+        Returns None if the payload does not fit the head rows or the IDAT
+        chunks are not laid out as _save_segmented writes them.
+        """
+        idats = [chunk for chunk in chunks if chunk.type == b'IDAT']
+        if len(idats) < 2 or len(idats[-1].data) != 4:
+            return None
+        width, height = head.size[0], woof_png.parse_ihdr(chunks)[1]
+        row_bytes = width * len(head.mode) + 1
+        
+        # The head segment must hold exactly the head rows and end in a flush
+        inflater = zlib.decompressobj()
+        old_rows = inflater.decompress(idats[0].data)
+        if len(old_rows) != head_rows * row_bytes or inflater.eof or inflater.unconsumed_tail:
+            return None
+        
+        try:
+            self._with_layout(layout)._embed_payload(head, compressed_data, in_place=True)
+        except ValueError:
+            return None
+        
+        level, strategy, optimize = self.PNG_PROFILES[self.png_profile]
+        new_rows = woof_png.filtered_rows(head, 0, head_rows, optimize=optimize)
+        compressor = woof_png.new_compressor(level, strategy)
+        head_data = compressor.compress(new_rows) + compressor.flush(zlib.Z_FULL_FLUSH)
+        checksum = woof_png.adler32_replace_prefix(
+            int.from_bytes(idats[-1].data, 'big'), zlib.adler32(old_rows), zlib.adler32(new_rows),
+            (height - head_rows) * row_bytes)
+        return {
+            idats[0].start: woof_png.make_chunk(b'IDAT', head_data),
+            idats[-1].start: woof_png.make_chunk(b'IDAT', checksum.to_bytes(4, 'big')),
+        }
+    
+    def _update_full(self, data: bytes, patch: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+        """Patch the metadata by decoding the image and writing it again"""
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        has_chunk = self._read_chunk_payload(image) is not None
+        layout = self._lsb_layout(image)
+        metadata = self._extract_payload(image)
+        if metadata is None or not (has_chunk or layout):
+            return None
+        
+        storage = ('both' if layout else 'chunk') if has_chunk else 'lsb'
+        writer = self._with_layout(layout or (self.bits_per_channel, self.use_alpha))
+        output = io.BytesIO()
+        writer._save_payload(image, writer._compress_metadata(merge_patch(metadata, patch)),
+                             output, storage, in_place=True)
+        return output.getvalue(), 'full'
+
 
 def main():
     """Main command-line interface"""
+    import argparse
+    
     parser = argparse.ArgumentParser(description='WOOF Format Converter')
-    parser.add_argument('input', help='Input image file')
-    parser.add_argument('output', help='Output WOOF file')
+    parser.add_argument('input', nargs='?', help='Input image file')
+    parser.add_argument('output', nargs='?', help='Output WOOF file')
     parser.add_argument('--extract', action='store_true', help='Extract metadata from WOOF file')
+    parser.add_argument('--update', metavar='PATCH',
+                        help='Apply a JSON merge patch (inline JSON or @file) to the metadata of a WOOF '
+                             'file, writing to output or in place')
+    parser.add_argument('--storage', choices=WOOFFormat.STORAGE_MODES, default='lsb',
+                        help='Store metadata in pixel LSBs (V2), a PNG woOF chunk (V3) or both')
+    parser.add_argument('--bits-per-channel', type=int, choices=range(1, 5), default=1,
+                        help='LSBs used per channel for the payload (1 keeps the V2 layout)')
+    parser.add_argument('--use-alpha', action='store_true',
+                        help='Also embed payload bits in the alpha channel')
+    parser.add_argument('--codec', choices=list(woof_codec.CODECS), default='zlib',
+                        help='Compressor for the metadata payload')
+    parser.add_argument('--compression-level', type=int, default=None, metavar='LEVEL',
+                        help='Compression level (default: 9 for zlib and bz2, 6 for lzma)')
+    parser.add_argument('--encoding', choices=woof_codec.ENCODINGS, default='json',
+                        help='Serialize metadata as JSON or the compact binary encoding')
+    parser.add_argument('--reserve-bytes', type=int, default=0, metavar='BYTES',
+                        help='Spare LSB payload capacity kept rewritable for later --update runs')
+    parser.add_argument('--cache', metavar='DB',
+                        help='SQLite metadata cache used by --extract to skip re-decoding files')
+    parser.add_argument('--analysis-budget', type=int, default=None, metavar='PIXELS',
+                        help='Analyze at most this many sampled pixels per image (approximate mode)')
+    parser.add_argument('--png-profile', choices=list(WOOFFormat.PNG_PROFILES), default='balanced',
+                        help='PNG encoding trade-off: fast (zlib level 1, RLE), balanced (level 6) '
+                             'or smallest (level 9 with optimized filters)')
+    parser.add_argument('--analysis-threads', type=int, default=1, metavar='N',
+                        help='Threads computing pixel statistics of one image (0: one per CPU)')
+    parser.add_argument('--focus-mode', choices=WOOFFormat.FOCUS_MODES, default='raster',
+                        help='Report the first focus regions in raster order or the strongest peaks')
+    parser.add_argument('--no-mmap', action='store_true',
+                        help='Always decode inputs with PIL instead of memory-mapping raw BMP/TIFF/NPY pixels')
+    parser.add_argument('--profile', choices=['log', 'prometheus'],
+                        help='Report per-stage timings on stderr as JSON log lines or Prometheus text')
+    
+    detection = parser.add_argument_group('object detection')
+    detection.add_argument('--detector', metavar='MODEL',
+                           help='Detect objects with a local model: .onnx via ONNX Runtime, '
+                                'other files via OpenCV DNN')
+    detection.add_argument('--detector-labels', metavar='FILE', help='Class labels, one per line')
+    detection.add_argument('--detector-size', default='300x300', metavar='WxH',
+                           help='Model input size (default: 300x300)')
+    detection.add_argument('--detector-threshold', type=float, default=0.5, metavar='SCORE',
+                           help='Minimum detection confidence (default: 0.5)')
+    detection.add_argument('--detect-batch', type=int, default=8, metavar='N',
+                           help='Images per inference call in batch conversion (default: 8)')
+    detection.add_argument('--detector-cache', metavar='DB',
+                           help='SQLite file caching detections by pixel hash across workers and runs')
+    
+    dedup = parser.add_argument_group('deduplication')
+    dedup.add_argument('--dedup', action='store_true',
+                       help='Reuse the metadata and output of pixel-identical inputs instead of '
+                            'analyzing them again')
+    dedup.add_argument('--dedup-cache', metavar='DB',
+                       help='SQLite file sharing --dedup results across workers and runs '
+                            '(implies --dedup)')
+    
+    batch = parser.add_argument_group('batch conversion')
+    batch.add_argument('--batch', nargs='+', metavar='SOURCE',
+                       help='Directories, glob patterns or files to convert')
+    batch.add_argument('--manifest', help='File listing one input path per line')
+    batch.add_argument('--output-dir', help='Directory for batch WOOF output')
+    batch.add_argument('--workers', type=int, default=None,
+                       help='Number of worker processes (default: CPU count)')
+    batch.add_argument('--checkpoint', help='Checkpoint file used to resume interrupted batches')
+    
+    catalog = parser.add_argument_group('catalog extraction')
+    catalog.add_argument('--catalog', nargs='+', metavar='SOURCE',
+                         help='Directories, glob patterns or files whose metadata is written as NDJSON')
+    catalog.add_argument('--fields', metavar='FIELD[,FIELD...]',
+                         help='Only output these dotted metadata fields, e.g. features.brightness')
+    catalog.add_argument('--prefetch', type=int, default=8,
+                         help='Files read ahead of the output (default: 8)')
+    catalog.add_argument('--ndjson', metavar='PATH', help='Write records to PATH instead of stdout')
     
     args = parser.parse_args()
     
-    woof = WOOFFormat()
+    stage_hooks = []
+    exporter = None
+    if args.profile == 'log':
+        import logging
+        from woof_metrics import StructuredLogExporter
+        logging.basicConfig(stream=sys.stderr, format='%(message)s', level=logging.INFO)
+        stage_hooks.append(StructuredLogExporter())
+    elif args.profile == 'prometheus':
+        from woof_metrics import PrometheusExporter
+        exporter = PrometheusExporter()
+        stage_hooks.append(exporter)
+    
+    woof_options = {
+        "analysis_budget": args.analysis_budget,
+        "storage": args.storage,
+        "bits_per_channel": args.bits_per_channel,
+        "use_alpha": args.use_alpha,
+        "stage_hooks": stage_hooks,
+        "codec": args.codec,
+        "compression_level": args.compression_level,
+        "encoding": args.encoding,
+        "reserve_bytes": args.reserve_bytes,
+        "focus_mode": args.focus_mode,
+        "analysis_threads": args.analysis_threads or None,
+        "png_profile": args.png_profile,
+        "memory_map": not args.no_mmap,
+    }
+    if args.detector:
+        from woof_detect import DetectionCache, load_detector
+        try:
+            input_size = tuple(int(v) for v in args.detector_size.lower().split('x'))
+            if len(input_size) != 2:
+                raise ValueError
+        except ValueError:
+            parser.error(f'invalid --detector-size {args.detector_size!r}, expected WxH')
+        try:
+            woof_options["detector"] = load_detector(
+                args.detector, args.detector_labels, input_size=input_size,
+                score_threshold=args.detector_threshold, batch_size=args.detect_batch,
+                cache=DetectionCache(db_path=args.detector_cache))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    if args.dedup or args.dedup_cache:
+        from woof_cache import ConversionCache
+        woof_options["conversion_cache"] = ConversionCache(db_path=args.dedup_cache)
+    try:
+        woof = WOOFFormat(**woof_options)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.batch or args.manifest:
+        if not args.output_dir:
+            parser.error('--output-dir is required for batch conversion')
+        if exporter is not None:
+            parser.error('--profile prometheus cannot aggregate across batch workers, use --profile log')
+        from woof_batch import BatchConverter, collect_inputs, print_summary
+        
+        inputs = collect_inputs(args.batch or [], args.manifest)
+        converter = BatchConverter(args.output_dir, workers=args.workers,
+                                   checkpoint_path=args.checkpoint,
+                                   woof_options=woof_options)
+        summary = converter.run(inputs)
+        print_summary(summary)
+        sys.exit(1 if summary["failed"] else 0)
+    
+    if args.cache:
+        from woof_cache import MetadataCache
+        woof.metadata_cache = MetadataCache(args.cache)
     
-    if args.extract:
+    if args.catalog:
+        if args.prefetch < 1:
+            parser.error('--prefetch must be at least 1')
+        from woof_catalog import iter_metadata, write_ndjson
+        
+        fields = [field.strip() for field in args.fields.split(',') if field.strip()] if args.fields else None
+        records = iter_metadata(args.catalog, woof, fields=fields, prefetch=args.prefetch, errors=True)
+        output = open(args.ndjson, 'w', encoding='utf-8') if args.ndjson else sys.stdout
+        try:
+            counts = write_ndjson(records, output)
+        finally:
+            if args.ndjson:
+                output.close()
+        print(f"📚 Cataloged {counts['files']:,} files, {counts['with_metadata']:,} with WOOF metadata",
+              file=sys.stderr)
+        if counts["errors"]:
+            print(f"❌ {counts['errors']:,} files could not be read (see their \"error\" field)",
+                  file=sys.stderr)
+        if exporter is not None:
+            sys.stderr.write(exporter.render())
+        sys.exit(0)
+    
+    if not args.input or (not args.extract and not args.update and not args.output):
+        parser.error('input and output are required unless --batch, --manifest or --catalog is given')
+    
+    if args.update:
+        try:
+            if args.update.startswith('@'):
+                with open(args.update[1:], 'r', encoding='utf-8') as fh:
+                    patch = json.load(fh)
+            else:
+                patch = json.loads(args.update)
+        except (OSError, json.JSONDecodeError) as e:
+            parser.error(f'invalid --update patch: {e}')
+        if not woof.update_woof(args.input, patch, args.output):
+            sys.exit(1)
+    elif args.extract:
         metadata = woof.extract_from_woof(args.input)
         if metadata:
             print(json.dumps(metadata, indent=2))
@@ -306,6 +1797,9 @@ def main():
         success = woof.convert_to_woof(args.input, args.output)
         if success:
             print("🎉 WOOF conversion completed successfully!")
+    
+    if exporter is not None:
+        sys.stderr.write(exporter.render())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
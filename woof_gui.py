@@ -6,12 +6,90 @@ A user-friendly interface for WOOF format operations
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+import io
 import json
 import os
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 from woof_format import WOOFFormat
 import threading
 
+# Preview size; reducing_gap lets PIL shrink with Image.reduce before the
+# final LANCZOS pass
+THUMBNAIL_SIZE = (300, 300)
+THUMBNAIL_REDUCING_GAP = 2.0
+
+# Pipeline stages of each kind of job, in order, for the progress bar
+CONVERT_STAGES = ('decode', 'dedup', 'create_metadata', 'compress', 'embed', 'png_save')
+LOAD_IMAGE_STAGES = ('thumbnail',)
+LOAD_WOOF_STAGES = ('extract', 'thumbnail')
+
+
+def make_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    """Open an image (a path or file object) and return (preview, (original size, mode, format))
+    
+    JPEGs are decoded at a reduced scale (Image.draft) and everything is
+    box-reduced before resampling, so large files preview quickly.
+    """
+    image = Image.open(file_path)
+    info = (image.size, image.mode, image.format)
+    image.draft(image.mode, size)
+    image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=THUMBNAIL_REDUCING_GAP)
+    return image, info
+
+
+class JobCancelled(Exception):
+    """Raised inside a background job once it has been cancelled"""
+
+
+class GUIJob:
+    """A cancellable background job of the GUI
+    
+    Cancellation is cooperative: the job stops at its next check, which
+    WOOFFormat stage hooks perform after every pipeline stage. Once the job
+    has finished (see finish), it can no longer be cancelled.
+    """
+    
+    def __init__(self, gui, label, stages):
+        self.gui = gui
+        self.label = label
+        self.stages = stages
+        self.cancelled = threading.Event()
+        self.finished = False
+        self._lock = threading.Lock()
+    
+    def check(self):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.cancelled.is_set():
+            raise JobCancelled()
+    
+    def cancel(self):
+        """Cancel the job unless it has finished; return whether it was cancelled"""
+        with self._lock:
+            if not self.finished:
+                self.cancelled.set()
+            return not self.finished
+    
+    def finish(self):
+        """Raise JobCancelled if the job has been cancelled, otherwise mark it
+        finished so that later cancels are refused"""
+        with self._lock:
+            self.check()
+            self.finished = True
+    
+    def advance(self, stage):
+        """Report that a stage has finished, then stop if cancelled"""
+        self.check()
+        if stage in self.stages:
+            fraction = (self.stages.index(stage) + 1) / len(self.stages)
+            self.gui.post(self.gui.show_progress, self, fraction, stage)
+    
+    def stage_hook(self, event):
+        """WOOFFormat stage hook driving the progress bar"""
+        self.advance(event["stage"])
+
+
 class WOOFGUI:
     """Main GUI application for WOOF format operations"""
     
@@ -25,7 +103,14 @@ class WOOFGUI:
         self.current_image_path = None
         self.current_woof_path = None
         
+        # Decoding, analysis and encoding run here, never on the Tk thread;
+        # results come back through post
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.current_job = None
+        self.closed = False
+        
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         
     def setup_ui(self):
         """Setup the user interface"""
@@ -110,6 +195,21 @@ class WOOFGUI:
         )
         load_woof_btn.pack(pady=5)
         
+        # Cancel button, enabled while a job runs
+        self.cancel_btn = tk.Button(
+            buttons_frame,
+            text="⏹ Cancel",
+            command=self.cancel_job,
+            bg='#95a5a6',
+            fg='white',
+            font=("Arial", 10, "bold"),
+            relief=tk.FLAT,
+            padx=20,
+            pady=5,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(pady=5)
+        
         # Right panel - Metadata display
         right_panel = tk.Frame(main_frame, bg='#ffffff', relief=tk.RAISED, bd=2)
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
@@ -149,6 +249,82 @@ class WOOFGUI:
         )
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Progress of the running job, driven by its pipeline stages
+        self.progress_var = tk.DoubleVar()
+        progress_bar = ttk.Progressbar(self.root, variable=self.progress_var, maximum=100)
+        progress_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=(0, 5))
+    
+    def run_job(self, label, stages, work, on_success, on_error):
+        """Run work(job) on the worker pool, cancelling any job still running
+        
+        on_success(result) or on_error(message) is then called on the Tk
+        thread, unless the job was cancelled or replaced in the meantime.
+        """
+        self.cancel_job()
+        job = GUIJob(self, label, stages)
+        self.current_job = job
+        self.progress_var.set(0)
+        self.status_var.set(f"{label}...")
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.executor.submit(self._run_job, job, work, on_success, on_error)
+        return job
+    
+    def _run_job(self, job, work, on_success, on_error):
+        """Worker side of run_job"""
+        try:
+            result = work(job)
+            job.finish()
+        except JobCancelled:
+            return
+        except Exception as e:
+            self.post(self._finish_job, job, on_error, str(e))
+        else:
+            self.post(self._finish_job, job, on_success, result)
+    
+    def post(self, callback, *args):
+        """Call callback(*args) on the Tk thread; dropped once the window is closed"""
+        if self.closed:
+            return
+        try:
+            self.root.after(0, callback, *args)
+        except (tk.TclError, RuntimeError):
+            # Closed while scheduling
+            if not self.closed:
+                raise
+    
+    def _finish_job(self, job, callback, value):
+        """Hand a job's outcome to its callback if the job is still current"""
+        if job is not self.current_job:
+            return
+        self.current_job = None
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.progress_var.set(100)
+        callback(value)
+    
+    def show_progress(self, job, fraction, stage):
+        """Update the progress bar and status for a stage of the current job"""
+        if job is self.current_job:
+            self.progress_var.set(fraction * 100)
+            self.status_var.set(f"{job.label}: {stage.replace('_', ' ')} done")
+    
+    def cancel_job(self):
+        """Cancel the running job, if any; it stops after its current stage.
+        A job that has already finished delivers its result instead."""
+        job = self.current_job
+        if job is None or not job.cancel():
+            return
+        self.current_job = None
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+        self.status_var.set(f"{job.label} cancelled")
+    
+    def close(self):
+        """Cancel pending work and close the window"""
+        self.cancel_job()
+        # Workers still running drop their callbacks from now on
+        self.closed = True
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
     def load_image(self):
         """Load an image file"""
         file_path = filedialog.askopenfilename(
@@ -160,38 +336,47 @@ class WOOFGUI:
         )
         
         if file_path:
-            try:
-                # Load and display image
-                image = Image.open(file_path)
-                
-                # Resize for display (max 300x300)
-                display_size = (300, 300)
-                image.thumbnail(display_size, Image.Resampling.LANCZOS)
-                
-                # Convert to PhotoImage for tkinter
-                photo = ImageTk.PhotoImage(image)
-                
-                self.image_label.configure(image=photo, text="")
-                self.image_label.image = photo  # Keep a reference
-                
-                self.current_image_path = file_path
-                self.convert_btn.config(state=tk.NORMAL)
-                
-                self.status_var.set(f"Loaded: {os.path.basename(file_path)}")
-                
-                # Show basic image info
-                self.show_basic_info(image)
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load image: {str(e)}")
-                self.status_var.set("Error loading image")
+            # Decode and resize for display (max 300x300) in the background
+            def work(job):
+                thumbnail = make_thumbnail(file_path)
+                job.advance('thumbnail')
+                return thumbnail
+            
+            self.run_job(f"Loading {os.path.basename(file_path)}", LOAD_IMAGE_STAGES, work,
+                         lambda result: self.image_loaded(file_path, *result),
+                         self.image_load_error)
+    
+    def image_loaded(self, file_path, thumbnail, info):
+        """Show a loaded image and enable conversion"""
+        self.show_thumbnail(thumbnail)
+        
+        self.current_image_path = file_path
+        self.convert_btn.config(state=tk.NORMAL)
+        
+        self.status_var.set(f"Loaded: {os.path.basename(file_path)}")
+        
+        # Show basic image info
+        self.show_basic_info(*info)
+    
+    def image_load_error(self, error_msg):
+        """Handle an image that failed to load"""
+        messagebox.showerror("Error", f"Failed to load image: {error_msg}")
+        self.status_var.set("Error loading image")
+    
+    def show_thumbnail(self, thumbnail):
+        """Display a preview image"""
+        # Convert to PhotoImage for tkinter
+        photo = ImageTk.PhotoImage(thumbnail)
+        
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo  # Keep a reference
     
-    def show_basic_info(self, image):
+    def show_basic_info(self, size, mode, image_format):
         """Show basic image information"""
         info = f"Image Information:\n"
-        info += f"Size: {image.size[0]} x {image.size[1]} pixels\n"
-        info += f"Mode: {image.mode}\n"
-        info += f"Format: {image.format}\n"
+        info += f"Size: {size[0]} x {size[1]} pixels\n"
+        info += f"Mode: {mode}\n"
+        info += f"Format: {image_format}\n"
         
         self.metadata_text.delete(1.0, tk.END)
         self.metadata_text.insert(tk.END, info)
@@ -210,40 +395,48 @@ class WOOFGUI:
         )
         
         if output_path:
-            self.status_var.set("Converting to WOOF...")
+            input_path = self.current_image_path
             
-            # Run conversion in separate thread
-            def convert_thread():
+            # Run conversion on the worker pool
+            def work(job):
+                # A converter of its own, reporting this job's stages
+                woof = copy.copy(self.woof)
+                written = []
+                
+                def stage_hook(event):
+                    if event["stage"] == 'png_save':
+                        written.append(output_path)
+                    job.stage_hook(event)
+                
+                woof.stage_hooks = [stage_hook]
+                # convert_image returns the metadata it embedded, so the
+                # new file does not have to be read back to show it
                 try:
-                    success = self.woof.convert_to_woof(self.current_image_path, output_path)
-                    
-                    if success:
-                        self.root.after(0, lambda: self.conversion_success(output_path))
-                    else:
-                        self.root.after(0, lambda: self.conversion_failed())
-                        
-                except Exception as e:
-                    self.root.after(0, lambda: self.conversion_error(str(e)))
+                    metadata = woof.convert_image(woof.open_image(input_path), output_path)
+                    written.append(output_path)
+                    job.finish()
+                except JobCancelled:
+                    # Cancelled once the file was written: leave no output behind
+                    if written and os.path.exists(output_path):
+                        os.remove(output_path)
+                    raise
+                return metadata
             
-            threading.Thread(target=convert_thread, daemon=True).start()
+            self.run_job("Converting to WOOF", CONVERT_STAGES, work,
+                         lambda metadata: self.conversion_success(output_path, metadata),
+                         self.conversion_error)
     
-    def conversion_success(self, output_path):
+    def conversion_success(self, output_path, metadata):
         """Handle successful conversion"""
         self.current_woof_path = output_path
         self.status_var.set(f"Successfully created: {os.path.basename(output_path)}")
         
-        # Extract and display metadata
-        metadata = self.woof.extract_from_woof(output_path)
+        # Display the embedded metadata
         if metadata:
             self.display_metadata(metadata)
         
         messagebox.showinfo("Success", f"Image converted to WOOF format!\nSaved as: {output_path}")
     
-    def conversion_failed(self):
-        """Handle conversion failure"""
-        self.status_var.set("Conversion failed")
-        messagebox.showerror("Error", "Failed to convert image to WOOF format")
-    
     def conversion_error(self, error_msg):
         """Handle conversion error"""
         self.status_var.set("Conversion error")
@@ -261,30 +454,42 @@ class WOOFGUI:
         )
         
         if file_path:
-            try:
-                # Try to extract metadata
-                metadata = self.woof.extract_from_woof(file_path)
-                
-                if metadata:
-                    self.current_woof_path = file_path
-                    self.display_metadata(metadata)
-                    self.status_var.set(f"Loaded WOOF file: {os.path.basename(file_path)}")
-                    
-                    # Also display the image
-                    image = Image.open(file_path)
-                    display_size = (300, 300)
-                    image.thumbnail(display_size, Image.Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(image)
-                    self.image_label.configure(image=photo, text="")
-                    self.image_label.image = photo
-                    
-                else:
-                    messagebox.showwarning("Warning", "No WOOF metadata found in this file")
-                    self.status_var.set("No WOOF metadata found")
-                    
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load WOOF file: {str(e)}")
-                self.status_var.set("Error loading WOOF file")
+            # Extract the metadata, then make the preview, in the background.
+            # extract_bytes inflates only the rows holding the payload.
+            def work(job):
+                woof = copy.copy(self.woof)
+                woof.stage_hooks = [job.stage_hook]
+                with open(file_path, 'rb') as fh:
+                    data = fh.read()
+                metadata = woof.extract_bytes(data)
+                if not metadata:
+                    return None, None
+                thumbnail, _ = make_thumbnail(io.BytesIO(data))
+                job.advance('thumbnail')
+                return metadata, thumbnail
+            
+            self.run_job(f"Loading {os.path.basename(file_path)}", LOAD_WOOF_STAGES, work,
+                         lambda result: self.woof_loaded(file_path, *result),
+                         self.woof_load_error)
+    
+    def woof_loaded(self, file_path, metadata, thumbnail):
+        """Show the metadata and image of a loaded WOOF file"""
+        if metadata:
+            self.current_woof_path = file_path
+            self.display_metadata(metadata)
+            self.status_var.set(f"Loaded WOOF file: {os.path.basename(file_path)}")
+            
+            # Also display the image
+            self.show_thumbnail(thumbnail)
+            
+        else:
+            messagebox.showwarning("Warning", "No WOOF metadata found in this file")
+            self.status_var.set("No WOOF metadata found")
+    
+    def woof_load_error(self, error_msg):
+        """Handle a WOOF file that failed to load"""
+        messagebox.showerror("Error", f"Failed to load WOOF file: {error_msg}")
+        self.status_var.set("Error loading WOOF file")
     
     def display_metadata(self, metadata):
         """Display metadata in the text area"""
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+WOOF Stage Metrics
+Exporters for the per-stage events emitted by WOOFFormat stage hooks
+"""
+
+import json
+import logging
+import threading
+from typing import Dict, Any
+
+
+class PrometheusExporter:
+    """Aggregate stage events and render them in Prometheus text format
+
+    Register with woof.add_stage_hook(exporter) and serve render() from a
+    /metrics endpoint, or write it to a node-exporter textfile.
+    """
+
+    # Event fields exported as byte counters
+    BYTE_FIELDS = ("metadata_bytes", "allocated_bytes", "payload_bytes", "output_bytes")
+
+    def __init__(self, prefix: str = 'woof'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._seconds = {}
+        self._counts = {}
+        self._failures = {}
+        self._bytes = {}
+
+    def __call__(self, event: Dict[str, Any]):
+        stage = event["stage"]
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + event["seconds"]
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            if not event.get("ok", True):
+                self._failures[stage] = self._failures.get(stage, 0) + 1
+            for field in self.BYTE_FIELDS:
+                if field in event:
+                    key = (stage, field[:-len("_bytes")])
+                    self._bytes[key] = self._bytes.get(key, 0) + event[field]
+
+    def render(self) -> str:
+        """Return the current totals in Prometheus exposition format"""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent in each WOOF pipeline stage",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage in sorted(self._counts):
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {self._seconds[stage]:.9f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {self._counts[stage]}')
+            lines.append(f"# HELP {p}_stage_failures_total Stages that raised an exception")
+            lines.append(f"# TYPE {p}_stage_failures_total counter")
+            for stage in sorted(self._counts):
+                lines.append(f'{p}_stage_failures_total{{stage="{stage}"}} {self._failures.get(stage, 0)}')
+            lines.append(f"# HELP {p}_stage_bytes_total Bytes handled by each stage")
+            lines.append(f"# TYPE {p}_stage_bytes_total counter")
+            for (stage, kind), total in sorted(self._bytes.items()):
+                lines.append(f'{p}_stage_bytes_total{{stage="{stage}",kind="{kind}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+
+class StructuredLogExporter:
+    """Log each stage event as one JSON object per line"""
+
+    def __init__(self, logger_name: str = 'woof.stages', level: int = logging.INFO):
+        self.logger_name = logger_name
+        self.level = level
+
+    def __call__(self, event: Dict[str, Any]):
+        logging.getLogger(self.logger_name).log(
+            self.level, json.dumps(event, separators=(',', ':'), default=str))
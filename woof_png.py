@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+WOOF PNG Segments
+Chunk-level PNG reading and writing used to update WOOF payloads without
+decoding or re-encoding the whole image
+"""
+
+import io
+import zlib
+import struct
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL is imported by the functions that need it, so reading chunks stays
+# standard-library only (see woof_extract)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG colour types WOOF writes itself, with their PIL mode and bytes per pixel
+COLOR_TYPES = {2: ('RGB', 3), 6: ('RGBA', 4)}
+MODE_COLOR_TYPES = {'RGB': 2, 'RGBA': 6}
+
+# Rows filtered and compressed per step when writing
+STRIP_ROWS = 256
+
+# Adler-32 modulus
+_ADLER_BASE = 65521
+
+
+class PNGChunk:
+    """A chunk of a PNG file, referencing the file's bytes"""
+
+    __slots__ = ('type', 'start', 'end', 'source')
+
+    def __init__(self, chunk_type: bytes, start: int, end: int, source: bytes):
+        self.type = chunk_type
+        self.start = start  # Offset of the length field
+        self.end = end      # Offset just past the CRC
+        self.source = source
+
+    @property
+    def data(self) -> bytes:
+        return self.source[self.start + 8:self.end - 4]
+
+    @property
+    def raw(self) -> memoryview:
+        """The complete chunk (length, type, data, CRC), without copying"""
+        return memoryview(self.source)[self.start:self.end]
+
+
+def read_chunks(data: bytes) -> List[PNGChunk]:
+    """Split PNG file contents into chunks; raises ValueError if it is not a PNG"""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        end = pos + 12 + length
+        if end > len(data):
+            raise ValueError(f"Truncated {chunk_type!r} chunk")
+        chunks.append(PNGChunk(chunk_type, pos, end, data))
+        pos = end
+        if chunk_type == b'IEND':
+            break
+    return chunks
+
+
+def make_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Serialize one PNG chunk with its length and CRC"""
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def parse_ihdr(chunks: List[PNGChunk]) -> Tuple[int, int, int, int, int]:
+    """Return (width, height, bit depth, colour type, interlace method)"""
+    if not chunks or chunks[0].type != b'IHDR':
+        raise ValueError("PNG does not start with IHDR")
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunks[0].data)
+    return width, height, bit_depth, color_type, interlace
+
+
+def decode_rows(chunks: List[PNGChunk], rows: int) -> Optional['Image.Image']:
+    """Decode only the first rows of an 8-bit, non-interlaced RGB or RGBA PNG
+
+    Returns None for PNGs of any other kind. Only as much of the IDAT
+    stream as the rows need is inflated.
+    """
+    width, height, bit_depth, color_type, interlace = parse_ihdr(chunks)
+    if bit_depth != 8 or interlace or color_type not in COLOR_TYPES:
+        return None
+    mode = COLOR_TYPES[color_type][0]
+    rows = min(rows, height)
+
+    # Feed IDAT data until the decoder has enough of the stream
+    stream = bytearray()
+    needed = rows * (width * COLOR_TYPES[color_type][1] + 1)
+    inflater = zlib.decompressobj()
+    inflated = 0
+    for chunk in chunks:
+        if chunk.type != b'IDAT':
+            continue
+        data = chunk.data
+        stream += data
+        inflated += len(inflater.decompress(data, needed - inflated))
+        if inflated >= needed:
+            from PIL import Image
+            return Image.frombytes(mode, (width, rows), bytes(stream), 'zip', mode)
+    return None
+
+
+def new_compressor(level: int, strategy: int = zlib.Z_FILTERED):
+    """zlib compressor with the settings PIL uses for PNG image data"""
+    return zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+
+
+def filtered_rows(image: 'Image.Image', start: int, stop: int,
+                  independent: bool = False, optimize: bool = False) -> bytes:
+    """PNG-filtered scanlines (filter byte plus data) for rows start..stop
+
+    PIL picks the filter of each row, with its more thorough heuristic if
+    optimize is set. Rows are filtered against their real predecessor,
+    except that with independent=True the first row is stored unfiltered
+    so it decodes the same whatever row precedes it.
+    """
+    width = image.size[0]
+    mode = image.mode
+    lead = 1 if start > 0 and not independent else 0
+    strip = image.crop((0, start - lead, width, stop))
+    # Level 0 stores the filtered rows verbatim, so inflating is a copy. PIL
+    # always compresses fully when optimizing; Huffman-only is the cheapest.
+    if optimize:
+        filtered = zlib.decompress(strip.tobytes('zip', mode, 1, 0, zlib.Z_HUFFMAN_ONLY))
+    else:
+        filtered = zlib.decompress(strip.tobytes('zip', mode, 0, 0))
+    row_bytes = width * COLOR_TYPES[MODE_COLOR_TYPES[mode]][1] + 1
+    if lead:
+        return filtered[row_bytes:]
+    if independent and start > 0:
+        first_row = image.crop((0, start, width, start + 1)).tobytes()
+        return b'\x00' + first_row + filtered[row_bytes:]
+    return filtered
+
+
+def write_segmented_png(image: 'Image.Image', output, head_rows: int, level: int,
+                        pre_chunks: List[bytes], post_chunks: List[bytes],
+                        head: Optional['Image.Image'] = None,
+                        strategy: int = zlib.Z_FILTERED, optimize: bool = False) -> None:
+    """Write image as a PNG whose first head_rows rows can be replaced later
+
+    The first IDAT chunk holds the zlib header and the head rows, ending in
+    a full flush, so no later data refers back to it. The first row after
+    the head is stored unfiltered. The Adler-32 checksum gets an IDAT chunk
+    of its own. pre_chunks and post_chunks are serialized chunks written
+    before and after the image data.
+
+    image only needs size, mode and a crop() that returns PIL images; it is
+    read one strip at a time. If head is given, the first head_rows rows
+    are taken from it instead. With head_rows 0 there is no head segment.
+    level, strategy and optimize are the zlib level and strategy and PIL's
+    filter heuristic, as in Image.save.
+    """
+    width, height = image.size
+    color_type = MODE_COLOR_TYPES[image.mode]
+    compressor = new_compressor(level, strategy)
+
+    write = output.write
+    write(PNG_SIGNATURE)
+    write(make_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+    for chunk in pre_chunks:
+        write(chunk)
+
+    if head_rows:
+        rows = filtered_rows(head if head is not None else image, 0, head_rows, optimize=optimize)
+        write(make_chunk(b'IDAT', compressor.compress(rows) + compressor.flush(zlib.Z_FULL_FLUSH)))
+
+    for start in range(head_rows, height, STRIP_ROWS):
+        stop = min(start + STRIP_ROWS, height)
+        data = compressor.compress(filtered_rows(image, start, stop, optimize=optimize,
+                                                 independent=start == head_rows > 0))
+        if data:
+            write(make_chunk(b'IDAT', data))
+
+    final = compressor.flush()
+    if len(final) > 4:
+        write(make_chunk(b'IDAT', final[:-4]))
+    write(make_chunk(b'IDAT', final[-4:]))
+
+    for chunk in post_chunks:
+        write(chunk)
+    write(make_chunk(b'IEND', b''))
+
+
+def ancillary_chunks(image: 'Image.Image', **save_options) -> Tuple[List[bytes], List[bytes]]:
+    """Serialized chunks PIL would write for image besides IHDR, IDAT and IEND
+
+    Returned as (chunks before the image data, chunks after it), so ICC
+    profiles, text and the like survive writing the image data separately.
+    """
+    from PIL import Image
+
+    probe = Image.new(image.mode, (1, 1))
+    probe.info = dict(image.info)
+    buffer = io.BytesIO()
+    probe.save(buffer, 'PNG', **save_options)
+
+    before, after = [], []
+    seen_idat = False
+    for chunk in read_chunks(buffer.getvalue()):
+        if chunk.type == b'IDAT':
+            seen_idat = True
+        elif chunk.type not in (b'IHDR', b'IEND'):
+            (after if seen_idat else before).append(bytes(chunk.raw))
+    return before, after
+
+
+def adler32_replace_prefix(total: int, old_prefix: int, new_prefix: int, suffix_length: int) -> int:
+    """Adler-32 of a stream after swapping its prefix for one of equal length
+
+    total is the checksum of prefix + suffix and old_prefix/new_prefix the
+    checksums of the two prefixes; the suffix itself is never read.
+    """
+    a_total, b_total = total & 0xFFFF, total >> 16
+    a_old, b_old = old_prefix & 0xFFFF, old_prefix >> 16
+    a_new, b_new = new_prefix & 0xFFFF, new_prefix >> 16
+    a = (a_total + a_new - a_old) % _ADLER_BASE
+    b = (b_total + b_new - b_old + suffix_length * (a_new - a_old)) % _ADLER_BASE
+    return (b << 16) | a
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+WOOF Raw Input
+Memory-mapped pixel access for uncompressed BMP, TIFF and NPY sources
+"""
+
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Raw pixel layouts that map onto RGB(A) planes without copying:
+# rawmode -> (bytes per pixel, channel slice giving R, G, B[, A])
+RAWMODES = {
+    'RGB': (3, slice(0, 3)),
+    'BGR': (3, slice(2, None, -1)),
+    'RGBX': (4, slice(0, 3)),
+    'BGRX': (4, slice(2, None, -1)),
+    'RGBA': (4, slice(0, 4)),
+    'L': (1, slice(0, 1)),
+}
+
+RAW_EXTENSIONS = ('.npy', '.bmp', '.tif', '.tiff')
+
+
+class RawImage:
+    """Read-only image backed by a memory-mapped pixel array
+
+    Provides the parts of the PIL Image interface the WOOF pipeline uses:
+    size, mode, info, crop() and conversion to a NumPy array. The array
+    holds the colour channels only; mode is 'RGBA' either way, because that
+    is what the WOOF output will be, and a missing alpha channel is opaque.
+    """
+
+    def __init__(self, pixels: np.ndarray, path: Optional[str] = None):
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, np.newaxis]
+        if pixels.dtype != np.uint8 or pixels.ndim != 3 or pixels.shape[2] not in (1, 3, 4):
+            raise ValueError(f"Unsupported raw pixel array {pixels.dtype} {pixels.shape}")
+        if pixels.shape[2] == 1:
+            # Gray: the same plane read as R, G and B
+            pixels = np.broadcast_to(pixels, pixels.shape[:2] + (3,))
+        self.pixels = pixels
+        self.path = path
+        self.mode = 'RGBA'
+        self.size = (pixels.shape[1], pixels.shape[0])
+        self.info = {}
+
+    def __array__(self, dtype=None, copy=None):
+        return self.pixels if dtype is None else self.pixels.astype(dtype)
+
+    def crop(self, box: Tuple[int, int, int, int]) -> Image.Image:
+        """Copy a region into an RGBA PIL image"""
+        left, top, right, bottom = box
+        region = Image.fromarray(np.ascontiguousarray(self.pixels[top:bottom, left:right]))
+        return region if region.mode == 'RGBA' else region.convert('RGBA')
+
+
+def open_raw(path: str) -> Optional[RawImage]:
+    """Memory-map an uncompressed image file, or return None if it cannot be
+
+    Handles .npy arrays of shape (H, W), (H, W, 3) or (H, W, 4) with dtype
+    uint8, and BMP or TIFF files whose pixels are stored uncompressed and
+    contiguously as 8-bit gray, RGB, BGR(X) or RGBA.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in RAW_EXTENSIONS:
+        return None
+
+    if extension == '.npy':
+        try:
+            pixels = np.load(path, mmap_mode='r', allow_pickle=False)
+            return RawImage(pixels, path)
+        except ValueError:
+            return None
+
+    with Image.open(path) as image:
+        if image.mode not in ('L', 'RGB', 'RGBA') or not image.tile:
+            return None
+        width, height = image.size
+        tiles = sorted(image.tile, key=lambda tile: tile[1][1])
+        codec, _, offset, args = tiles[0]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        if codec != 'raw' or rawmode not in RAWMODES:
+            return None
+        pixel_bytes, channels = RAWMODES[rawmode]
+        stride = (args[1] if isinstance(args, tuple) and len(args) > 1 else 0) or width * pixel_bytes
+        orientation = args[2] if isinstance(args, tuple) and len(args) > 2 else 1
+
+        # Strips must cover full rows and follow each other in the file
+        for codec_i, extents, offset_i, args_i in tiles:
+            if (codec_i != 'raw' or args_i != args or extents[0] != 0 or extents[2] != width
+                    or offset_i != offset + extents[1] * stride):
+                return None
+        if tiles[-1][1][3] != height or os.path.getsize(path) < offset + stride * height:
+            return None
+
+    rows = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(height, stride))
+    pixels = rows[:, :width * pixel_bytes].reshape(height, width, pixel_bytes)
+    if orientation < 0:
+        pixels = pixels[::-1]  # Bottom-up rows
+    return RawImage(pixels[:, :, channels], path)